@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 import dj_database_url
 from dotenv import load_dotenv
@@ -98,6 +99,11 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+
+# Set when DATABASE_URL points at a transaction-mode pooler (PgBouncer,
+# Supabase's port 6543): consecutive queries may run on different backends.
+if os.getenv("DATABASE_TRANSACTION_POOLING", "false").lower() == "true":
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
     
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
@@ -154,8 +160,176 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SPITCH_API_KEY = os.getenv("SPITCH_API_KEY")
 SPITCH_BASE_URL = "https://api.spitch.ai/v1"
 
+# Spitch client (core/spitch_client.py): shared connection pool, per-call
+# timeouts (seconds), retries with jittered exponential backoff on
+# connection errors/429/5xx, and a circuit breaker per (operation, language)
+# that opens after SPITCH_BREAKER_THRESHOLD consecutive failures.
+SPITCH_MAX_CONNECTIONS = int(os.getenv("SPITCH_MAX_CONNECTIONS", "20"))
+SPITCH_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SPITCH_MAX_KEEPALIVE_CONNECTIONS", "10"))
+SPITCH_KEEPALIVE_EXPIRY = float(os.getenv("SPITCH_KEEPALIVE_EXPIRY", "30"))
+SPITCH_CONNECT_TIMEOUT = float(os.getenv("SPITCH_CONNECT_TIMEOUT", "5"))
+SPITCH_TRANSLATE_TIMEOUT = float(os.getenv("SPITCH_TRANSLATE_TIMEOUT", "10"))
+SPITCH_GENERATE_TIMEOUT = float(os.getenv("SPITCH_GENERATE_TIMEOUT", "20"))
+SPITCH_TRANSCRIBE_TIMEOUT = float(os.getenv("SPITCH_TRANSCRIBE_TIMEOUT", "30"))
+SPITCH_MAX_RETRIES = int(os.getenv("SPITCH_MAX_RETRIES", "2"))
+SPITCH_RETRY_BACKOFF = float(os.getenv("SPITCH_RETRY_BACKOFF", "0.5"))
+SPITCH_RETRY_BACKOFF_MAX = float(os.getenv("SPITCH_RETRY_BACKOFF_MAX", "4"))
+SPITCH_BREAKER_THRESHOLD = int(os.getenv("SPITCH_BREAKER_THRESHOLD", "5"))
+SPITCH_BREAKER_RESET = float(os.getenv("SPITCH_BREAKER_RESET", "30"))
+
+# Announcement pipeline: how many languages are processed at once per request,
+# and how long (seconds) a single language may spend in translate/TTS/upload.
+ANNOUNCEMENT_MAX_CONCURRENCY = int(os.getenv("ANNOUNCEMENT_MAX_CONCURRENCY", "4"))
+ANNOUNCEMENT_LANGUAGE_TIMEOUT = float(os.getenv("ANNOUNCEMENT_LANGUAGE_TIMEOUT", "30"))
+
+# Serve /api/announce/, /api/transcribe/ and /api/history/ with the async
+# views in core/async_views.py. Only worth it under an ASGI server
+# (gunicorn_asgi.conf.py turns it on); under WSGI every request would get an
+# event loop, and a Spitch connection pool, of its own.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "false").lower() == "true"
+
+# Identical concurrent announcements share one translate/TTS/upload run per
+# language. Set SINGLE_FLIGHT_DB_LOCK to also coordinate worker processes
+# through PostgreSQL advisory locks (waiting up to SINGLE_FLIGHT_LOCK_TIMEOUT).
+# The locks are session-level, so they need a direct connection and stay off
+# with DATABASE_TRANSACTION_POOLING.
+SINGLE_FLIGHT_DB_LOCK = os.getenv("SINGLE_FLIGHT_DB_LOCK", "false").lower() == "true"
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", "30"))
+
+# Admission control for Spitch calls: a token bucket per operation as
+# (calls per second, burst). "local" keeps buckets per process, "db" shares
+# them across workers. Routine requests get a 503 once ADMISSION_MAX_QUEUE
+# calls are waiting for an operation, and any call waiting longer than
+# ADMISSION_MAX_WAIT seconds is dropped.
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "local")
+ADMISSION_BUCKETS = {
+    "translate": (float(os.getenv("ADMISSION_TRANSLATE_RATE", "10")), int(os.getenv("ADMISSION_TRANSLATE_BURST", "20"))),
+    "generate": (float(os.getenv("ADMISSION_GENERATE_RATE", "5")), int(os.getenv("ADMISSION_GENERATE_BURST", "10"))),
+    "transcribe": (float(os.getenv("ADMISSION_TRANSCRIBE_RATE", "2")), int(os.getenv("ADMISSION_TRANSCRIBE_BURST", "5"))),
+}
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+
+# Largest batch accepted by /api/announce/batch/.
+ANNOUNCEMENT_BATCH_MAX_ITEMS = int(os.getenv("ANNOUNCEMENT_BATCH_MAX_ITEMS", "50"))
+
+# Translation/audio cache: a DB table shared by all workers, fronted by a
+# per-process LRU capped at ANNOUNCEMENT_CACHE_MAX_BYTES.
+ANNOUNCEMENT_CACHE_ENABLED = os.getenv("ANNOUNCEMENT_CACHE_ENABLED", "true").lower() == "true"
+ANNOUNCEMENT_CACHE_MAX_BYTES = int(os.getenv("ANNOUNCEMENT_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Phrase templates: cached PCM segments per process, and how segments are
+# blended when stitched (crossfade length and loudness target).
+PHRASE_SEGMENT_CACHE_MAX_BYTES = int(os.getenv("PHRASE_SEGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TEMPLATE_CROSSFADE_MS = int(os.getenv("TEMPLATE_CROSSFADE_MS", "15"))
+TEMPLATE_TARGET_DBFS = float(os.getenv("TEMPLATE_TARGET_DBFS", "-20"))
+
+# Convert /api/transcribe/ uploads without temp files: WAV (and Ogg/FLAC
+# with soundfile installed) in-process, anything else piped through ffmpeg
+# as it arrives when ffmpeg is on PATH.
+TRANSCRIBE_STREAMING_CONVERSION = os.getenv("TRANSCRIBE_STREAMING_CONVERSION", "true").lower() == "true"
+
+# Recordings longer than TRANSCRIBE_LONG_AUDIO_SECONDS are split at pauses
+# (frames below TRANSCRIBE_SILENCE_DBFS) into segments of at most
+# TRANSCRIBE_SEGMENT_SECONDS, transcribed TRANSCRIBE_MAX_CONCURRENCY at a
+# time and translated segment by segment as the text arrives.
+TRANSCRIBE_LONG_AUDIO_SECONDS = float(os.getenv("TRANSCRIBE_LONG_AUDIO_SECONDS", "45"))
+TRANSCRIBE_SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "20"))
+TRANSCRIBE_MAX_CONCURRENCY = int(os.getenv("TRANSCRIBE_MAX_CONCURRENCY", "4"))
+TRANSCRIBE_SILENCE_DBFS = float(os.getenv("TRANSCRIBE_SILENCE_DBFS", "-40"))
+
+# Live interpretation at ws://<host>/ws/interpret/ (core/live.py, ASGI only).
+# Streamed audio is cut into sentences at LIVE_PAUSE_MS pauses, or every
+# LIVE_MAX_SENTENCE_SECONDS without one; each session interprets at most
+# LIVE_MAX_SENTENCES_IN_FLIGHT sentences at a time.
+LIVE_PAUSE_MS = int(os.getenv("LIVE_PAUSE_MS", "500"))
+LIVE_MAX_SENTENCE_SECONDS = float(os.getenv("LIVE_MAX_SENTENCE_SECONDS", "12"))
+LIVE_MAX_SENTENCES_IN_FLIGHT = int(os.getenv("LIVE_MAX_SENTENCES_IN_FLIGHT", "2"))
+
+# Stored announcement audio: "mp3", "ogg" (Opus) or "wav". Needs ffmpeg or
+# soundfile for the compressed formats, otherwise WAV is stored. Leading and
+# trailing silence below AUDIO_SILENCE_THRESHOLD_DBFS is trimmed first.
+# AUDIO_OUTPUT_BITRATE is passed to ffmpeg; soundfile uses its default quality.
+AUDIO_OUTPUT_FORMAT = os.getenv("AUDIO_OUTPUT_FORMAT", "mp3")
+AUDIO_OUTPUT_BITRATE = os.getenv("AUDIO_OUTPUT_BITRATE", "32k")
+AUDIO_TRIM_SILENCE = os.getenv("AUDIO_TRIM_SILENCE", "true").lower() == "true"
+AUDIO_SILENCE_THRESHOLD_DBFS = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DBFS", "-45"))
+
+# Combined broadcast track (``broadcast: true``): every language in request
+# order at BROADCAST_SAMPLE_RATE, each normalized to BROADCAST_TARGET_DBFS
+# and separated by BROADCAST_GAP_MS of silence, after a chime if enabled.
+BROADCAST_SAMPLE_RATE = int(os.getenv("BROADCAST_SAMPLE_RATE", "24000"))
+BROADCAST_GAP_MS = int(os.getenv("BROADCAST_GAP_MS", "700"))
+BROADCAST_CHIME = os.getenv("BROADCAST_CHIME", "true").lower() == "true"
+BROADCAST_TARGET_DBFS = float(os.getenv("BROADCAST_TARGET_DBFS", "-20"))
+
+# Local copies of stored audio for /api/announce/<id>/audio/<language>/: an
+# on-disk LRU in AUDIO_CACHE_DIR of at most AUDIO_CACHE_MAX_BYTES per
+# worker, written as audio is uploaded and filled from storage on a miss.
+AUDIO_CACHE_ENABLED = os.getenv("AUDIO_CACHE_ENABLED", "true").lower() == "true"
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "voicebridge-audio"))
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Generated audio retention, swept by ``manage.py sweep_storage`` every
+# RETENTION_SWEEP_INTERVAL seconds (see core/retention.py). Audio no
+# announcement refers to is deleted once RETENTION_ORPHAN_GRACE_SECONDS old;
+# RETENTION_MAX_AGE_DAYS and RETENTION_MAX_BYTES (0 for no limit) also expire
+# the oldest audio, leaving its announcements without audio.
+RETENTION_ORPHAN_GRACE_SECONDS = int(os.getenv("RETENTION_ORPHAN_GRACE_SECONDS", "3600"))
+RETENTION_MAX_AGE_DAYS = int(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MAX_BYTES = int(os.getenv("RETENTION_MAX_BYTES", "0"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_SWEEP_INTERVAL = float(os.getenv("RETENTION_SWEEP_INTERVAL", "3600"))
+
+# Base URL for building absolute audio URLs outside a request (job workers).
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "")
+
+# Async announcement jobs (manage.py run_announcement_workers). Workers
+# record a heartbeat every ANNOUNCEMENT_JOB_HEARTBEAT seconds while a job
+# runs; a running job whose worker has been silent for
+# ANNOUNCEMENT_JOB_STALE_AFTER seconds is retried, up to
+# ANNOUNCEMENT_JOB_MAX_ATTEMPTS times.
+ANNOUNCEMENT_WORKER_PROCESSES = int(os.getenv("ANNOUNCEMENT_WORKER_PROCESSES", "2"))
+ANNOUNCEMENT_JOB_HEARTBEAT = float(os.getenv("ANNOUNCEMENT_JOB_HEARTBEAT", "30"))
+ANNOUNCEMENT_JOB_STALE_AFTER = int(os.getenv("ANNOUNCEMENT_JOB_STALE_AFTER", "600"))
+ANNOUNCEMENT_JOB_MAX_ATTEMPTS = int(os.getenv("ANNOUNCEMENT_JOB_MAX_ATTEMPTS", "3"))
+
+# Scheduled announcements (manage.py run_scheduler) are precomputed once
+# their scheduled_for is ANNOUNCEMENT_SCHEDULE_LEAD seconds away, by
+# ANNOUNCEMENT_SCHEDULER_PROCESSES worker processes.
+ANNOUNCEMENT_SCHEDULE_LEAD = float(os.getenv("ANNOUNCEMENT_SCHEDULE_LEAD", "900"))
+ANNOUNCEMENT_SCHEDULER_PROCESSES = int(os.getenv("ANNOUNCEMENT_SCHEDULER_PROCESSES", "2"))
+
+# Logging: LOG_LEVEL=WARNING (or CRITICAL) quiets the per-request info logs
+# in production; LOG_FORMAT=json emits one JSON object per line. Records are
+# written from a background thread.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "text": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+        "json": {"()": "core.log.JsonFormatter"},
+    },
+    "handlers": {
+        "console": {"()": "core.log.QueuedStreamHandler", "formatter": LOG_FORMAT},
+    },
+    "loggers": {
+        "core": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
+
+# Prometheus metrics at /api/metrics/. Set METRICS_TOKEN to require
+# "Authorization: Bearer <token>" on scrapes.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite dev server
     "http://127.0.0.1:5173",
     "https://voice-bridge-rho.vercel.app"
-]
\ No newline at end of file
+]
+
+# Let the frontend read history paging and caching headers.
+CORS_EXPOSE_HEADERS = ["Link", "ETag", "Last-Modified"]
\ No newline at end of file
@@ -1,3 +1,75 @@
 from django.contrib import admin
 
-# Register your models here.
+from . import cache as announcement_cache
+from .models import (
+    Announcement,
+    AnnouncementJob,
+    AnnouncementLanguage,
+    CacheCounter,
+    CachedTranslation,
+    PhraseSegment,
+    StoredAudio,
+)
+
+
+class AnnouncementLanguageInline(admin.TabularInline):
+    model = AnnouncementLanguage
+    extra = 0
+    fields = ("language", "voice", "status", "translated_text", "audio_url", "byte_size", "cached", "timings", "error")
+    readonly_fields = fields
+
+
+@admin.register(Announcement)
+class AnnouncementAdmin(admin.ModelAdmin):
+    list_display = ("id", "text", "tone", "priority", "scheduled_for", "created_at")
+    list_filter = ("priority",)
+    search_fields = ("text",)
+    inlines = [AnnouncementLanguageInline]
+
+
+@admin.register(AnnouncementLanguage)
+class AnnouncementLanguageAdmin(admin.ModelAdmin):
+    list_display = ("announcement", "language", "status", "byte_size", "cached", "created_at")
+    list_filter = ("language", "status", "cached")
+    search_fields = ("translated_text",)
+
+
+@admin.register(AnnouncementJob)
+class AnnouncementJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "announcement", "state", "attempts", "worker", "created_at", "finished_at")
+    list_filter = ("state",)
+    exclude = ("audio",)
+
+
+@admin.register(CachedTranslation)
+class CachedTranslationAdmin(admin.ModelAdmin):
+    list_display = ("text", "target", "voice", "tone", "hit_count", "audio_size", "created_at", "last_hit_at")
+    list_filter = ("target", "voice", "tone")
+    search_fields = ("text", "translated_text")
+    readonly_fields = ("key", "hit_count", "created_at", "last_hit_at")
+    actions = ["invalidate"]
+
+    @admin.action(description="Invalidate selected cache entries")
+    def invalidate(self, request, queryset):
+        deleted = announcement_cache.invalidate(queryset)
+        self.message_user(request, f"Invalidated {deleted} cache entries.")
+
+
+@admin.register(CacheCounter)
+class CacheCounterAdmin(admin.ModelAdmin):
+    list_display = ("name", "value")
+
+
+@admin.register(PhraseSegment)
+class PhraseSegmentAdmin(admin.ModelAdmin):
+    list_display = ("phrase", "target", "voice", "tone", "sample_rate", "created_at")
+    list_filter = ("target", "voice", "tone")
+    search_fields = ("phrase", "translated_text")
+    exclude = ("pcm",)
+
+
+@admin.register(StoredAudio)
+class StoredAudioAdmin(admin.ModelAdmin):
+    list_display = ("name", "announcement", "language", "size", "created_at")
+    list_filter = ("language",)
+    search_fields = ("name", "url")
@@ -0,0 +1,227 @@
+"""Admission control in front of every Spitch call.
+
+Each operation (translate, generate, transcribe) has a token bucket; a call
+takes one token before it goes upstream. Callers that find the bucket empty
+queue up, urgent ones ahead of routine ones, and callers that have queued
+longer than ``ADMISSION_MAX_WAIT`` give up with ``Overloaded``.
+
+Buckets live in this process by default. With ``ADMISSION_BACKEND = "db"``
+their state is kept in the ``AdmissionBucket`` table so every worker
+process draws from the same budget; the wait queue (and so the priority
+order and queue depth) is still per process.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .models import AdmissionBucket, Announcement
+
+URGENT = Announcement.URGENT
+ROUTINE = Announcement.ROUTINE
+
+_priority = contextvars.ContextVar("admission_priority", default=ROUTINE)
+
+# How often a coroutine behind others in the queue checks whether it's next.
+ASYNC_POLL_INTERVAL = 0.01
+
+
+class Overloaded(Exception):
+    """Raised when a call can't be admitted in time. ``retry_after`` is a
+    hint, in seconds, for when capacity is likely to be back."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def priority(value):
+    """Run the block's Spitch calls at ``value`` (``URGENT`` or ``ROUTINE``)."""
+    token = _priority.set(value)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class LocalBucket:
+    """A token bucket held in this process."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token. Returns 0 on success, or how long until one is due."""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class DBBucket:
+    """A token bucket stored in ``AdmissionBucket``, shared by all workers."""
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    def take(self):
+        now = time.time()
+        with transaction.atomic():
+            bucket, _ = AdmissionBucket.objects.select_for_update().get_or_create(
+                name=self.name, defaults={"tokens": self.burst, "updated_at": now}
+            )
+            tokens = min(self.burst, bucket.tokens + max(0.0, now - bucket.updated_at) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            AdmissionBucket.objects.filter(name=self.name).update(tokens=tokens, updated_at=now)
+        return wait
+
+
+class AdmissionController:
+    def __init__(self, buckets, max_queue, max_wait):
+        self.buckets = buckets
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._waiting = {name: [] for name in buckets}
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+
+    def depth(self, operation=None):
+        with self._cond:
+            if operation is not None:
+                return len(self._waiting[operation])
+            return max((len(queue) for queue in self._waiting.values()), default=0)
+
+    def retry_after(self, operation):
+        """A rough estimate of how long the current queue takes to drain."""
+        return max(1.0, (self.depth(operation) + 1) / self.buckets[operation].rate)
+
+    def check(self, value=None):
+        """Shed a new routine request up front when any queue is full."""
+        if (current_priority() if value is None else value) == URGENT:
+            return
+        for operation in self.buckets:
+            if self.depth(operation) >= self.max_queue:
+                raise Overloaded(
+                    f"Too many queued {operation} requests",
+                    self.retry_after(operation),
+                )
+
+    def acquire(self, operation, value=None):
+        """Block until ``operation`` may call upstream, in priority order.
+
+        Raises ``Overloaded`` when a routine caller finds the queue full, or
+        when any caller has waited longer than ``max_wait``.
+        """
+        value = current_priority() if value is None else value
+        bucket = self.buckets[operation]
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            queue = self._waiting[operation]
+            if value != URGENT and len(queue) >= self.max_queue:
+                raise Overloaded(f"Too many queued {operation} requests", self.retry_after(operation))
+            entry = (value, next(self._order))
+            heapq.heappush(queue, entry)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                with self._cond:
+                    first = queue[0] == entry
+                wait = remaining
+                if first:
+                    # Outside the lock: a DB bucket's take() is a row-locking
+                    # transaction, and every other caller needs the lock.
+                    wait = bucket.take()
+                    if not wait:
+                        return
+                if remaining <= 0:
+                    raise Overloaded(
+                        f"Waited more than {self.max_wait}s for {operation} capacity",
+                        self.retry_after(operation),
+                    )
+                with self._cond:
+                    # The head may have left while the lock was released.
+                    if first or queue[0] != entry:
+                        self._cond.wait(min(wait, remaining))
+        finally:
+            with self._cond:
+                queue.remove(entry)
+                heapq.heapify(queue)
+                self._cond.notify_all()
+
+    async def acquire_async(self, operation, value=None):
+        """``acquire`` for coroutines: waits on the event loop instead of
+        blocking the thread. Shares the queue (and so the priority order)
+        with threads calling ``acquire``."""
+        value = current_priority() if value is None else value
+        bucket = self.buckets[operation]
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            queue = self._waiting[operation]
+            if value != URGENT and len(queue) >= self.max_queue:
+                raise Overloaded(f"Too many queued {operation} requests", self.retry_after(operation))
+            entry = (value, next(self._order))
+            heapq.heappush(queue, entry)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                with self._cond:
+                    first = queue[0] == entry
+                wait = ASYNC_POLL_INTERVAL
+                if first:
+                    if isinstance(bucket, DBBucket):
+                        wait = await sync_to_async(bucket.take)()
+                    else:
+                        wait = bucket.take()
+                    if not wait:
+                        return
+                if remaining <= 0:
+                    raise Overloaded(
+                        f"Waited more than {self.max_wait}s for {operation} capacity",
+                        self.retry_after(operation),
+                    )
+                await asyncio.sleep(min(wait, remaining))
+        finally:
+            with self._cond:
+                queue.remove(entry)
+                heapq.heapify(queue)
+                self._cond.notify_all()
+
+
+def build_controller():
+    buckets = {}
+    for operation, (rate, burst) in settings.ADMISSION_BUCKETS.items():
+        if settings.ADMISSION_BACKEND == "db":
+            buckets[operation] = DBBucket(operation, rate, burst)
+        else:
+            buckets[operation] = LocalBucket(rate, burst)
+    return AdmissionController(buckets, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_MAX_WAIT)
+
+
+controller = build_controller()
@@ -0,0 +1,199 @@
+"""Request validation and response bodies shared by the DRF views
+(``views.py``) and the async views (``async_views.py``).
+
+Both sets of views parse requests, pick between queueing and processing and
+build their responses here, so they only differ in how they wait on the
+pipeline, the ORM and storage.
+"""
+import json
+import logging
+from math import ceil
+
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, urlencode
+
+from . import history, metrics, phrases
+from .models import Announcement
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidRequest(Exception):
+    """A request the views answer with 400 and this message."""
+
+
+def flag(data, name):
+    """A boolean request option; form fields arrive as strings."""
+    value = data.get(name, False)
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def wants_async(data):
+    return flag(data, "async")
+
+
+def scheduled_time(data):
+    """The ``scheduled_for`` broadcast time, or ``None``; raises
+    ``ValueError`` if it isn't an ISO 8601 datetime. Naive times are taken
+    to be in ``TIME_ZONE``."""
+    value = data.get("scheduled_for")
+    if not value:
+        return None
+    when = parse_datetime(str(value))
+    if when is None:
+        raise ValueError("scheduled_for must be an ISO 8601 datetime.")
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+def request_priority(data):
+    """``priority: "urgent"`` (or an urgent tone) jumps the Spitch queue."""
+    value = data.get("priority") or data.get("tone")
+    return Announcement.URGENT if value == "urgent" else Announcement.ROUTINE
+
+
+class AnnouncementRequest:
+    """A validated create or transcribe request.
+
+    ``parts`` and ``slots`` are set in template mode. ``queued`` requests
+    (scheduled, or ``async``) go to the job workers instead of being
+    processed in the request.
+    """
+
+    def __init__(self, data, text, languages, tone, scheduled_for, template=None, parts=None, slots=None):
+        self.text = text
+        self.languages = languages
+        self.tone = tone
+        self.scheduled_for = scheduled_for
+        self.template = template
+        self.parts = parts
+        self.slots = slots
+        self.priority = request_priority(data)
+        self.broadcast = flag(data, "broadcast")
+        self.queued = bool(scheduled_for) or wants_async(data)
+
+    def create_kwargs(self):
+        """Fields for the new ``Announcement``."""
+        return {
+            "text": self.text,
+            "languages": self.languages,
+            "translations": {},
+            "tone": self.tone,
+            "audio_files": {},
+            "priority": self.priority,
+            "scheduled_for": self.scheduled_for,
+            "broadcast": self.broadcast,
+        }
+
+    def job_params(self):
+        if self.template:
+            return {"template": self.template, "slots": self.slots}
+        return None
+
+
+def parse_announcement(data):
+    """Validate a create request body; raises ``InvalidRequest``."""
+    text = data.get("text")
+    languages = data.get("languages", [])
+    tone = data.get("tone", "neutral")
+    template = data.get("template")
+    try:
+        scheduled_for = scheduled_time(data)
+    except ValueError as e:
+        raise InvalidRequest(str(e))
+
+    if template:
+        slots = data.get("slots", {})
+        if not isinstance(slots, dict) or not isinstance(languages, list) or not languages:
+            raise InvalidRequest("Template mode needs a slots object and a list of languages.")
+        try:
+            parts = phrases.parse_template(template)
+            text = phrases.render(parts, slots)
+        except phrases.TemplateError as e:
+            raise InvalidRequest(str(e))
+        return AnnouncementRequest(data, text, languages, tone, scheduled_for, template, parts, slots)
+
+    if not text or not languages:
+        raise InvalidRequest("Text and languages are required.")
+    if not isinstance(languages, list):
+        raise InvalidRequest("Languages must be a list.")
+    return AnnouncementRequest(data, text, languages, tone, scheduled_for)
+
+
+def parse_transcription(data, audio_file):
+    """Validate a transcribe request (form fields plus the ``audio``
+    upload); raises ``InvalidRequest``. The text is filled in once the
+    recording is transcribed."""
+    if not audio_file:
+        raise InvalidRequest("Audio file is required.")
+    try:
+        languages = json.loads(data.get("languages", "[]"))
+    except json.JSONDecodeError as e:
+        logger.info("JSON decode error: %s", e)
+        raise InvalidRequest("Invalid JSON format for languages.")
+    if not isinstance(languages, list):
+        raise InvalidRequest("Languages must be a JSON array.")
+    if not languages:
+        raise InvalidRequest("At least one language is required.")
+    try:
+        scheduled_for = scheduled_time(data)
+    except ValueError as e:
+        raise InvalidRequest(str(e))
+    return AnnouncementRequest(data, "", languages, data.get("tone", "neutral"), scheduled_for)
+
+
+def queued(request, announcement, job):
+    """``(body, status_url)`` of the 202 for a queued announcement."""
+    status_url = request.build_absolute_uri(reverse("announce-status", args=[announcement.id]))
+    body = {"id": announcement.id, "state": job.state, "status_url": status_url}
+    if announcement.scheduled_for:
+        body["scheduled_for"] = announcement.scheduled_for
+    return body, status_url
+
+
+def shed(e):
+    """``(body, headers)`` of the 503 for an ``admission.Overloaded``."""
+    metrics.spitch_events.inc(operation="request", event="shed")
+    logger.warning("Shedding request: %s", e)
+    return (
+        {"error": f"Service is busy, please retry later. ({e})"},
+        {"Retry-After": str(ceil(e.retry_after))},
+    )
+
+
+def history_query(params):
+    """``(queryset, cursor, limit, fields)`` for a history request; raises
+    ``history.HistoryQueryError``."""
+    limit = history.parse_limit(params.get("limit"))
+    fields = history.parse_fields(params.get("fields"))
+    return history.filtered(params), params.get("cursor"), limit, fields
+
+
+def history_not_modified(request, rows, fields, params, deleted_at):
+    """``(etag, timestamp, response)``; ``response`` is the 304 when the
+    client's copy of the page is current (nothing on it updated and no
+    announcement deleted since), else ``None``."""
+    etag, last_modified = history.validators(rows, fields, params.dict(), deleted_at)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def history_headers(request, response, etag, timestamp, announcements=None):
+    """Add the validators and, when ``announcements`` is given (there is a
+    next page), the ``Link`` to the page after it."""
+    response["ETag"] = etag
+    if timestamp is not None:
+        response["Last-Modified"] = http_date(timestamp)
+    # Let clients cache the page but revalidate every time.
+    response["Cache-Control"] = "no-cache"
+    if announcements:
+        query = {**request.GET.dict(), "cursor": history.encode_cursor(announcements[-1])}
+        next_url = request.build_absolute_uri(f"{request.path}?{urlencode(query)}")
+        response["Link"] = f'<{next_url}>; rel="next"'
+    return response
@@ -0,0 +1,207 @@
+"""The announcement pipeline for the async (ASGI) views.
+
+``AsyncAnnouncementPipeline.aprocess`` does what ``process`` does without
+tying up a thread per request: languages run as tasks on the event loop,
+Spitch is called through ``AsyncResilientSpitch`` and rows are written with
+the async ORM. Work that has no async interface (audio encoding, Django's
+storage API, the multi-query cache helpers) runs in a worker thread.
+"""
+import asyncio
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import admission, metrics, singleflight
+from . import cache as announcement_cache
+from .models import AnnouncementLanguage, StoredAudio
+from .pipeline import AUDIO, FAILED, RESULT_FIELDS, TRANSLATED, VOICE_MAP, AnnouncementPipeline
+from .spitch_client import AsyncResilientSpitch
+
+logger = logging.getLogger(__name__)
+
+# One client (and connection pool) per event loop; an ASGI worker has one.
+_clients = weakref.WeakKeyDictionary()
+
+
+def async_spitch():
+    """The async Spitch client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncResilientSpitch(api_key=settings.SPITCH_API_KEY)
+    return client
+
+
+class AsyncAnnouncementPipeline(AnnouncementPipeline):
+    async def aprocess(self, announcement, translations=None):
+        """``process`` for coroutines: run the pipeline and save the results."""
+        self._open_uploads()
+        try:
+            return await self._aprocess(announcement, translations)
+        finally:
+            await sync_to_async(self._close_uploads)()
+
+    async def _aprocess(self, announcement, translations=None):
+        translations = translations or {}
+        text, tone = announcement.text, announcement.tone
+        voices = {lang: VOICE_MAP.get(lang, "john") for lang in dict.fromkeys(announcement.languages)}
+        self.priority = announcement.priority
+        rows = await self._astart_results(announcement, voices)
+
+        lookup = sync_to_async(announcement_cache.lookup_many)
+        cached = await lookup(text, "en", tone, voices, self.audio_format)
+        pending = {}
+        for lang in voices:
+            translated_text, audio_url, _, _ = cached.get(lang, (None, "", 0, None))
+            if not audio_url:
+                pending[lang] = translated_text or translations.get(lang)
+        logger.info(
+            "Cache hits: %s, pending: %s", sorted(set(voices) - set(pending)), sorted(pending),
+            extra={"announcement": announcement.id},
+        )
+
+        flight_keys = {
+            lang: announcement_cache.cache_key(text, "en", lang, voices[lang], tone) for lang in pending
+        }
+        async with singleflight.async_held_locks(list(flight_keys.values())) as contended:
+            if contended:
+                waited = {lang: voices[lang] for lang in pending if flight_keys[lang] in contended}
+                for lang, hit in (await lookup(text, "en", tone, waited, self.audio_format)).items():
+                    cached[lang] = hit
+                    if hit[1]:
+                        del pending[lang]
+                    else:
+                        pending[lang] = hit[0]
+
+            async def task(lang, translated_text):
+                return await self._aprocess_shared(flight_keys[lang], announcement, text, lang, translated_text)
+
+            results = await self._arun_languages(task, pending)
+            await sync_to_async(announcement_cache.store_many)(text, "en", tone, {
+                lang: (voices[lang], *result) for lang, result in results.items()
+            })
+
+        await self._afinish(announcement, rows, self._outcomes(voices, results, cached, pending))
+        return announcement
+
+    async def _astart_results(self, announcement, voices):
+        existing = {row.language: row async for row in announcement.results.all()}
+        new_rows = self._reset_results(announcement, voices, existing)
+        await AnnouncementLanguage.objects.abulk_update(list(existing.values()), ["voice", "status", "error"])
+        await AnnouncementLanguage.objects.abulk_create(new_rows)
+        return {row.language: row for row in [*existing.values(), *new_rows]}
+
+    async def _afinish(self, announcement, rows, outcomes):
+        self._apply_outcomes(announcement, rows, outcomes)
+        await sync_to_async(self.render_broadcast)(announcement)
+        with metrics.timer("db_save"):
+            await AnnouncementLanguage.objects.abulk_update(list(rows.values()), RESULT_FIELDS)
+            await announcement.asave()
+            await StoredAudio.objects.abulk_create(self._stored_rows(), ignore_conflicts=True)
+
+    async def _arun_languages(self, task, languages):
+        """``_run_languages`` as tasks on the event loop.
+
+        At most ``ANNOUNCEMENT_MAX_CONCURRENCY`` languages run at once, with
+        the same per-language isolation and deadline. Languages still
+        running at the deadline are cancelled, which also cancels their
+        upstream requests.
+        """
+        results = {}
+        if not languages:
+            return results
+        limit = max(1, min(settings.ANNOUNCEMENT_MAX_CONCURRENCY, len(languages)))
+        rounds = -(-len(languages) // limit)
+        deadline = settings.ANNOUNCEMENT_LANGUAGE_TIMEOUT * rounds
+        semaphore = asyncio.Semaphore(limit)
+
+        async def run(lang, arg):
+            async with semaphore:
+                with admission.priority(self.priority):
+                    return await task(lang, arg)
+
+        tasks = {asyncio.create_task(run(lang, arg)): lang for lang, arg in languages.items()}
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for future in done:
+            lang = tasks[future]
+            try:
+                results[lang] = future.result()
+            except Exception as e:
+                logger.warning("Processing failed for %s: %s", lang, e)
+                self.report(lang, FAILED, error=str(e))
+        for future in pending:
+            future.cancel()
+            lang = tasks[future]
+            logger.warning("Processing timed out for %s after %ss", lang, deadline)
+            self.report(lang, FAILED, error=f"Timed out after {deadline}s")
+        return results
+
+    async def _aprocess_language(self, announcement, text, lang, translated_text=None):
+        """``_process_language`` for coroutines."""
+        # 1. Translate
+        if translated_text is None:
+            try:
+                with self.timed(lang, "translate"):
+                    translated_text = await self.atranslate(text, lang)
+            except Exception as e:
+                error_msg = f"Translation failed for {lang}: {str(e)}"
+                logger.warning(error_msg)
+                self.report(lang, FAILED, error=error_msg)
+                return None, None, 0, None
+        self.report(lang, TRANSLATED, text=translated_text)
+
+        # 2. TTS (generate audio bytes) and upload
+        try:
+            with self.timed(lang, "synthesize"):
+                audio_bytes = await self.asynthesize(translated_text, lang)
+            audio_url, audio_size, audio_format = await self.aupload_audio(announcement, lang, audio_bytes)
+        except Exception as e:
+            error_msg = f"TTS failed for {lang}: {str(e)}"
+            logger.warning(error_msg)
+            self.report(lang, FAILED, error=error_msg)
+            return translated_text, None, 0, None
+
+        self.report(lang, AUDIO, url=audio_url)
+        return translated_text, audio_url, audio_size, audio_format
+
+    async def _aprocess_shared(self, flight_key, announcement, text, lang, translated_text=None):
+        """``_aprocess_language``, coalesced with identical work already
+        running on this event loop."""
+        result, shared = await singleflight.async_flights.run(
+            flight_key,
+            lambda: self._aprocess_language(announcement, text, lang, translated_text),
+            timeout=settings.ANNOUNCEMENT_LANGUAGE_TIMEOUT,
+            accept=lambda result: bool(result[1]),
+        )
+        if shared:
+            logger.info("Shared in-flight result for %s", lang)
+            self.report(lang, TRANSLATED, text=result[0], shared=True)
+            self.report(lang, AUDIO, url=result[1], shared=True)
+        return result
+
+    async def atranslate(self, text, lang):
+        translation = await async_spitch().text.translate(
+            text=text,
+            source="en",
+            target=lang,
+        )
+        logger.info("Translation for %s successful: %.100s", lang, translation.text)
+        return translation.text
+
+    async def asynthesize(self, text, lang):
+        resp = await async_spitch().speech.generate(
+            text=text,
+            language=lang,
+            voice=VOICE_MAP.get(lang, "john"),
+        )
+        audio_bytes = resp.http_response.content
+        metrics.bytes_total.inc(len(audio_bytes), kind="tts")
+        logger.info("TTS generated for %s, audio size: %d bytes", lang, len(audio_bytes))
+        return audio_bytes
+
+    async def aupload_audio(self, announcement, lang, audio_bytes):
+        """``upload_audio`` in a worker thread: encoding is CPU work and
+        Django's storage API (Cloudinary included) is sync-only."""
+        return await asyncio.to_thread(self.upload_audio, announcement, lang, audio_bytes)
@@ -0,0 +1,209 @@
+"""Async versions of the announcement, transcription and history views.
+
+``core/urls.py`` routes to these instead of the DRF views when
+``ASYNC_VIEWS`` is on. That only pays off under an ASGI server (see
+``gunicorn_asgi.conf.py``): a request waiting on Spitch, storage or the
+database then holds a coroutine rather than a worker thread. Requests and
+responses are the same as the DRF views' (both validate requests and build
+responses with ``core/api.py``); DRF has no async views, so these are plain
+Django ones.
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import admission, api, history, jobs, metrics, transcription
+from .async_pipeline import AsyncAnnouncementPipeline
+from .models import Announcement
+from .pipeline import AnnouncementPipeline
+from .serializers import AnnouncementSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def overloaded(e):
+    body, headers = api.shed(e)
+    response = JsonResponse(body, status=503)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def request_data(request):
+    """The parsed JSON or form body, like DRF's ``request.data``."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError as e:
+            raise api.InvalidRequest(f"JSON parse error - {e}")
+        if not isinstance(data, dict):
+            raise api.InvalidRequest("Expected a JSON object.")
+        return data
+    return request.POST
+
+
+class AsyncAPIView(View):
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Like DRF's APIView: API clients don't send CSRF tokens.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+
+class CreateAnnouncementAsyncView(AsyncAPIView):
+    http_method_names = ["post", "options"]
+
+    async def post(self, request):
+        try:
+            data = request_data(request)
+            logger.info(
+                "CreateAnnouncementAsyncView received - text: %.100s, languages: %s",
+                data.get("text"), data.get("languages", []),
+            )
+            parsed = api.parse_announcement(data)
+        except api.InvalidRequest as e:
+            return error(str(e))
+
+        if parsed.queued:
+            return await self._enqueue_announcement(request, parsed)
+
+        try:
+            admission.controller.check(parsed.priority)
+        except admission.Overloaded as e:
+            return overloaded(e)
+
+        if parsed.template:
+            return await self._process_template(request, parsed)
+        return await self._process_announcement(request, parsed)
+
+    async def _enqueue_announcement(self, request, parsed, audio=None, audio_name=""):
+        announcement = await Announcement.objects.acreate(**parsed.create_kwargs())
+        job = await sync_to_async(jobs.enqueue)(
+            announcement, audio=audio, audio_name=audio_name, params=parsed.job_params()
+        )
+        logger.info("Announcement %s queued as job %s", announcement.id, job.id)
+
+        body, status_url = api.queued(request, announcement, job)
+        response = JsonResponse(body, status=202)
+        response["Location"] = status_url
+        return response
+
+    async def _process_announcement(self, request, parsed, translations=None):
+        logger.info(
+            "Processing announcement: text=%.100r, languages=%s, tone=%s", parsed.text, parsed.languages, parsed.tone
+        )
+
+        announcement = await Announcement.objects.acreate(**parsed.create_kwargs())
+        try:
+            await AsyncAnnouncementPipeline(request.build_absolute_uri).aprocess(announcement, translations)
+            logger.info("Announcement completed successfully with ID: %s", announcement.id)
+        except Exception as e:
+            await announcement.adelete()
+            error_msg = f"Announcement processing failed: {str(e)}"
+            logger.error(error_msg)
+            return error(error_msg, 500)
+
+        return JsonResponse(AnnouncementSerializer(announcement).data, status=201)
+
+    async def _process_template(self, request, parsed):
+        announcement = await Announcement.objects.acreate(**parsed.create_kwargs())
+        try:
+            # Phrase stitching has no async path; run the thread-pool
+            # pipeline on this request's sync thread.
+            pipeline = AnnouncementPipeline(request.build_absolute_uri)
+            await sync_to_async(pipeline.process_template)(announcement, parsed.parts, parsed.slots)
+            logger.info("Template announcement completed successfully with ID: %s", announcement.id)
+        except Exception as e:
+            await announcement.adelete()
+            error_msg = f"Announcement processing failed: {str(e)}"
+            logger.error(error_msg)
+            return error(error_msg, 500)
+
+        return JsonResponse(AnnouncementSerializer(announcement).data, status=201)
+
+
+class TranscribeAnnouncementAsyncView(CreateAnnouncementAsyncView):
+    async def post(self, request):
+        # The ASGI handler has already buffered the body, so there is
+        # nothing to gain from converting while it arrives (the sync view's
+        # streaming upload handler); parse it off the event loop instead.
+        with metrics.timer("upload_receive"):
+            files, data = await sync_to_async(lambda: (request.FILES, request.POST))()
+        audio_file = files.get("audio")
+
+        logger.info(
+            "TranscribeAnnouncementAsyncView received - audio_file: %s, languages_str: %s",
+            audio_file, data.get("languages", "[]"),
+        )
+        try:
+            parsed = api.parse_transcription(data, audio_file)
+        except api.InvalidRequest as e:
+            return error(str(e))
+
+        recording = await sync_to_async(audio_file.read)()
+        if parsed.queued:
+            return await self._enqueue_announcement(request, parsed, audio=recording, audio_name=audio_file.name)
+
+        try:
+            admission.controller.check(parsed.priority)
+        except admission.Overloaded as e:
+            return overloaded(e)
+
+        # 1. Transcribe (long recordings are translated segment by segment
+        # along the way)
+        translations = {}
+        try:
+            logger.info(
+                "Transcribing audio file: %s, size: %s bytes, type: %s",
+                audio_file.name, audio_file.size, audio_file.content_type,
+            )
+            with admission.priority(parsed.priority):
+                parsed.text = await transcription.transcribe_upload_async(recording, parsed.languages, translations)
+        except admission.Overloaded as e:
+            return overloaded(e)
+        except Exception as e:
+            error_msg = f"Transcription failed: {str(e)}"
+            logger.error(error_msg)
+            return error(error_msg, 500)
+
+        # 2. Reuse pipeline
+        return await self._process_announcement(request, parsed, translations)
+
+
+class AnnouncementHistoryAsyncView(AsyncAPIView):
+    """``AnnouncementHistoryView`` on the async ORM; same parameters,
+    validators and ``Link`` header."""
+
+    http_method_names = ["get", "head", "options"]
+
+    async def get(self, request):
+        params = request.GET
+        try:
+            queryset, cursor, limit, fields = api.history_query(params)
+            rows, has_next = await history.apage_keys(queryset, cursor, limit)
+            deleted_at = await history.alast_deletion()
+        except history.HistoryQueryError as e:
+            return error(str(e))
+
+        try:
+            etag, timestamp, not_modified = api.history_not_modified(request, rows, fields, params, deleted_at)
+            if not_modified is not None:
+                return not_modified
+
+            announcements = await history.aload(rows, fields)
+            logger.debug("Retrieved %d announcements from history", len(announcements))
+            data = AnnouncementSerializer(announcements, many=True, fields=fields).data
+            response = JsonResponse(data, safe=False)
+        except Exception as e:
+            error_msg = f"Failed to retrieve history: {str(e)}"
+            logger.error(error_msg)
+            return error(error_msg, 500)
+
+        return api.history_headers(request, response, etag, timestamp, announcements if has_next else None)
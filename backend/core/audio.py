@@ -0,0 +1,405 @@
+"""PCM helpers for the audio we get back from Spitch and the recordings we
+send to it.
+
+Everything here works on float32 NumPy buffers in [-1, 1] with shape
+``(frames,)`` for mono or ``(frames, channels)`` for multichannel audio.
+"""
+import io
+import shutil
+import struct
+import subprocess
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+try:
+    # Optional: lets decode() handle Ogg (Opus/Vorbis) and FLAC in-process.
+    import soundfile
+except ImportError:
+    soundfile = None
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+# Output formats we can store announcement audio in.
+MIME_TYPES = {
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+    "mp3": "audio/mpeg",
+}
+
+FFMPEG_ENCODERS = {
+    "ogg": ["-c:a", "libopus", "-f", "ogg"],
+    "mp3": ["-c:a", "libmp3lame", "-f", "mp3"],
+}
+
+SOUNDFILE_FORMATS = {
+    "ogg": ("OGG", "OPUS"),
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+}
+
+
+class AudioFormatError(ValueError):
+    pass
+
+
+def read_wav(data):
+    """Decode a RIFF/WAVE byte string into ``(samples, sample_rate)``.
+
+    Spitch streams its WAVs, so the RIFF and data chunk sizes are often
+    placeholders (0xFFFFFFFF); the data chunk is clamped to what is
+    actually there.
+    """
+    data = memoryview(data)
+    if len(data) < 12 or bytes(data[0:4]) != b"RIFF" or bytes(data[8:12]) != b"WAVE":
+        raise AudioFormatError("Not a RIFF/WAVE file")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(data[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            format_tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                format_tag = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (format_tag, channels, rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioFormatError("data chunk before fmt chunk")
+            end = min(body + chunk_size, len(data))
+            format_tag, channels, rate, bits = fmt
+            samples = _decode_pcm(data[body:end], format_tag, bits)
+            frames = len(samples) // channels
+            samples = samples[:frames * channels]
+            if channels > 1:
+                samples = samples.reshape(frames, channels)
+            return samples, rate
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise AudioFormatError("No data chunk found")
+
+
+def can_decode(head):
+    """Whether ``decode`` handles data starting with these bytes."""
+    head = bytes(head[:4])
+    return head == b"RIFF" or (head in (b"OggS", b"fLaC") and soundfile is not None)
+
+
+def decode(data):
+    """Decode a whole recording into ``(samples, sample_rate)`` in-process.
+
+    WAV in any PCM/float layout is handled natively; Ogg and FLAC go
+    through ``soundfile`` when it is installed. Anything else (notably the
+    browser's WebM/Opus) raises ``AudioFormatError`` so the caller can fall
+    back to ffmpeg.
+    """
+    head = bytes(data[:4])
+    if head == b"RIFF":
+        return read_wav(data)
+    if head in (b"OggS", b"fLaC") and soundfile is not None:
+        try:
+            samples, rate = soundfile.read(io.BytesIO(data), dtype="float32")
+        except Exception as e:
+            raise AudioFormatError(f"Could not decode audio: {e}")
+        return samples, rate
+    raise AudioFormatError("No in-process decoder for this format")
+
+
+def _decode_pcm(raw, format_tag, bits):
+    width = bits // 8
+    raw = raw[:len(raw) - len(raw) % width]
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        return np.frombuffer(raw, dtype=f"<f{width}").astype(np.float32)
+    if format_tag != WAVE_FORMAT_PCM:
+        raise AudioFormatError(f"Unsupported WAV format tag {format_tag:#x}")
+    if bits == 8:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if bits == 16:
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    if bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        return ints.astype(np.float32) / 8388608.0
+    if bits == 32:
+        return np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    raise AudioFormatError(f"Unsupported PCM bit depth {bits}")
+
+
+def to_pcm16(samples):
+    """Float samples -> little-endian signed 16-bit PCM bytes."""
+    clipped = np.clip(samples, -1.0, 1.0)
+    return (clipped * 32767.0).round().astype("<i2").tobytes()
+
+
+def from_pcm16(raw):
+    return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def write_wav(samples, sample_rate):
+    """Encode float samples as a 16-bit PCM WAV byte string."""
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    return pcm16_to_wav(to_pcm16(samples), sample_rate, channels)
+
+
+def pcm16_to_wav(pcm, sample_rate, channels=1):
+    """Prefix raw 16-bit PCM with a WAV header (without re-encoding it)."""
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(pcm), b"WAVE",
+        b"fmt ", 16, WAVE_FORMAT_PCM, channels, sample_rate,
+        sample_rate * channels * 2, channels * 2, 16,
+        b"data", len(pcm),
+    )
+    return header + pcm
+
+
+def to_mono(samples):
+    return samples if samples.ndim == 1 else samples.mean(axis=1, dtype=np.float32)
+
+
+def _lowpass(up, down, taps_per_phase):
+    """Kaiser-windowed sinc anti-aliasing filter for an up/down resampler,
+    scaled by ``up`` to make up for the zero-stuffing.
+
+    The filter has an odd length (so its delay is a whole sample) and is
+    padded with one zero to split evenly into ``up`` phases.
+    """
+    num_taps = taps_per_phase * up - 1
+    cutoff = 0.5 / max(up, down) * 0.9
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, 8.0)
+    h *= up / h.sum()
+    return np.append(h, 0.0).astype(np.float32)
+
+
+def resample(samples, src_rate, dst_rate, taps_per_phase=32):
+    """Polyphase resampling of mono ``samples`` from ``src_rate`` to ``dst_rate``.
+
+    Output sample ``m`` only needs filter phase ``(m * down + delay) % up``,
+    and the outputs sharing a phase read the input at a fixed stride of
+    ``down``. So each phase is ``taps_per_phase`` strided multiply-adds over
+    the whole signal instead of filtering a zero-stuffed signal at the
+    upsampled rate.
+    """
+    if src_rate == dst_rate or not samples.size:
+        return samples.astype(np.float32, copy=False)
+
+    g = gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    h = _lowpass(up, down, taps_per_phase)
+    # phases[p, i] = h[p + up * i]
+    phases = h.reshape(taps_per_phase, up).T
+    delay = (h.size - 2) // 2
+
+    k = taps_per_phase
+    out_len = -(-samples.size * up // down)
+    right = k + delay // up + down + 1
+    padded = np.concatenate([np.zeros(k, np.float32), samples.astype(np.float32), np.zeros(right, np.float32)])
+    out = np.empty(out_len, dtype=np.float32)
+
+    for m0 in range(min(up, out_len)):
+        count = -(-(out_len - m0) // up)
+        t0 = m0 * down + delay
+        base, phase = t0 // up, t0 % up
+        acc = np.zeros(count, dtype=np.float32)
+        for i, coeff in enumerate(phases[phase]):
+            start = base - i + k
+            acc += coeff * padded[start:start + down * (count - 1) + 1:down]
+        out[m0::up] = acc
+    return out
+
+
+def to_speech_pcm(samples, sample_rate, target_rate=16000):
+    """Downmix and resample to the mono 16 kHz s16le PCM Spitch expects."""
+    return to_pcm16(resample(to_mono(samples), sample_rate, target_rate))
+
+
+def rms_dbfs(samples, floor_dbfs=-50.0):
+    """Loudness of the non-silent part of ``samples`` in dBFS."""
+    if not samples.size:
+        return floor_dbfs
+    floor = 10 ** (floor_dbfs / 20)
+    voiced = samples[np.abs(samples) > floor]
+    if not voiced.size:
+        return floor_dbfs
+    rms = np.sqrt(np.mean(np.square(voiced, dtype=np.float64)))
+    return float(20 * np.log10(max(rms, 1e-9)))
+
+
+def match_loudness(samples, target_dbfs):
+    """Scale ``samples`` so their voiced RMS sits at ``target_dbfs``,
+    backing off the gain if that would clip."""
+    if not samples.size:
+        return samples
+    gain = 10 ** ((target_dbfs - rms_dbfs(samples)) / 20)
+    peak = float(np.max(np.abs(samples)))
+    if peak * gain > 0.99:
+        gain = 0.99 / peak
+    return (samples * gain).astype(np.float32)
+
+
+def crossfade_concat(segments, sample_rate, crossfade_ms):
+    """Concatenate mono segments, overlapping neighbours with an
+    equal-power crossfade of ``crossfade_ms`` (shortened for segments that
+    are too short to carry it)."""
+    segments = [s for s in segments if s.size]
+    if not segments:
+        return np.zeros(0, dtype=np.float32)
+
+    xf = int(sample_rate * crossfade_ms / 1000)
+    if len(segments) > 1:
+        xf = min(xf, min(s.size for s in segments) // 2)
+    else:
+        xf = 0
+
+    total = sum(s.size for s in segments) - xf * (len(segments) - 1)
+    out = np.zeros(total, dtype=np.float32)
+    t = np.linspace(0.0, np.pi / 2, xf, dtype=np.float32) if xf else None
+    fade_in = np.sin(t) if xf else None
+    fade_out = np.cos(t) if xf else None
+
+    pos = 0
+    for i, seg in enumerate(segments):
+        seg = seg.astype(np.float32, copy=True)
+        if xf and i > 0:
+            seg[:xf] *= fade_in
+        if xf and i < len(segments) - 1:
+            seg[-xf:] *= fade_out
+        out[pos:pos + seg.size] += seg
+        pos += seg.size - xf
+    return out
+
+
+def trim_silence(samples, sample_rate, threshold_dbfs=-45.0, pad_ms=80, frame_ms=10):
+    """Cut leading and trailing silence, keeping ``pad_ms`` of headroom.
+
+    Works on 10 ms frame energies so a single click doesn't count as
+    speech. Audio that never crosses the threshold is returned unchanged.
+    """
+    mono = to_mono(samples)
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    frames = mono.size // frame
+    if not frames:
+        return samples
+    energy = np.sqrt(np.mean(np.square(mono[:frames * frame].reshape(frames, frame)), axis=1))
+    voiced = np.flatnonzero(energy > 10 ** (threshold_dbfs / 20))
+    if not voiced.size:
+        return samples
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(0, voiced[0] * frame - pad)
+    end = min(mono.size, (voiced[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def split_at_silences(samples, sample_rate, max_seconds, threshold_dbfs=-40.0, min_silence_ms=250, frame_ms=20):
+    """Split a recording into ``(start, end)`` sample ranges of at most
+    ``max_seconds``, cutting in the middle of pauses.
+
+    Frames quieter than ``threshold_dbfs`` count as silence (quieter than a
+    tenth of the loud frames instead, for quiet recordings, but never below
+    -60 dBFS); a run of ``min_silence_ms`` of them is a pause. A stretch
+    with no pause is cut at ``max_seconds`` regardless. Ranges with no
+    speech are dropped.
+    """
+    mono = to_mono(samples)
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    frames = mono.size // frame
+    if not frames:
+        return [(0, mono.size)] if mono.size else []
+    energy = np.sqrt(np.mean(np.square(mono[:frames * frame].reshape(frames, frame)), axis=1))
+    floor = max(min(10 ** (threshold_dbfs / 20), float(np.percentile(energy, 90)) * 0.1), 1e-3)
+    silent = energy < floor
+
+    # Runs of silent frames: +1 where one starts, -1 just past where it ends.
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    pauses = (ends - starts) * frame_ms >= min_silence_ms
+    cuts = ((starts + ends) // 2)[pauses] * frame
+
+    max_len = max(frame, int(max_seconds * sample_rate))
+    bounds = [0]
+    previous = None
+    for cut in [*(int(c) for c in cuts), mono.size]:
+        while cut - bounds[-1] > max_len:
+            bounds.append(previous if previous is not None and previous > bounds[-1] else bounds[-1] + max_len)
+        previous = cut
+    if bounds[-1] != mono.size:
+        bounds.append(mono.size)
+
+    voiced = ~silent
+    return [
+        (start, end) for start, end in zip(bounds, bounds[1:])
+        if voiced[start // frame:-(-end // frame)].any()
+    ]
+
+
+def encoder_available(fmt):
+    if fmt == "wav":
+        return True
+    if fmt not in FFMPEG_ENCODERS:
+        return False
+    if soundfile is not None:
+        major, subtype = SOUNDFILE_FORMATS[fmt]
+        if subtype in soundfile.available_subtypes(major):
+            return True
+    return FFMPEG_ENCODERS[fmt][1] in ffmpeg_encoders()
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_encoders():
+    """Names of the audio encoders the installed ffmpeg was built with
+    (empty without ffmpeg). Probed once per process."""
+    if shutil.which("ffmpeg") is None:
+        return frozenset()
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return frozenset()
+    # Encoder lines look like " A....D libmp3lame  libmp3lame MP3 ...".
+    return frozenset(
+        parts[1] for parts in (line.split() for line in result.stdout.decode(errors="replace").splitlines())
+        if len(parts) > 1 and parts[0].startswith("A") and parts[1] != "="
+    )
+
+
+def encode(samples, sample_rate, fmt, bitrate="32k"):
+    """Encode mono float ``samples`` as ``fmt`` ("wav", "ogg" or "mp3").
+
+    ``bitrate`` only applies to ffmpeg; soundfile encodes at libsndfile's
+    default quality. Raises ``AudioFormatError`` if either encoder fails.
+    """
+    if fmt == "wav":
+        return write_wav(samples, sample_rate)
+    if fmt not in FFMPEG_ENCODERS:
+        raise AudioFormatError(f"Unknown output format {fmt!r}")
+
+    if soundfile is not None:
+        major, subtype = SOUNDFILE_FORMATS[fmt]
+        if subtype in soundfile.available_subtypes(major):
+            buf = io.BytesIO()
+            try:
+                soundfile.write(buf, samples, sample_rate, format=major, subtype=subtype)
+            except RuntimeError as e:
+                # libsndfile rejects some rates/formats (LibsndfileError).
+                raise AudioFormatError(f"Encoding to {fmt} failed: {e}")
+            return buf.getvalue()
+
+    result = subprocess.run(
+        [
+            'ffmpeg', '-v', 'error',
+            '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+            *FFMPEG_ENCODERS[fmt][:2], '-b:a', bitrate, *FFMPEG_ENCODERS[fmt][2:],
+            'pipe:1',
+        ],
+        input=to_pcm16(samples),
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        raise AudioFormatError(f"Encoding to {fmt} failed: {result.stderr.decode(errors='replace')}")
+    return result.stdout
@@ -0,0 +1,211 @@
+"""Local on-disk copies of stored announcement audio.
+
+PA terminals replaying an announcement would otherwise all download it from
+the storage backend (Cloudinary), the slowest hop on a venue network.
+``AnnouncementAudioView`` serves it from ``disk`` instead: an LRU of files in
+``AUDIO_CACHE_DIR`` bounded at ``AUDIO_CACHE_MAX_BYTES``, written as the
+pipeline uploads new audio and filled from storage on a miss.
+
+Stored names are unique per upload and never rewritten, so a cached file
+never goes stale; audio released by ``storage`` is dropped from here too.
+Each process keeps its own index of the directory (rebuilt from it on first
+use), so with several workers sharing one directory the bound is per
+worker, and a file one worker evicts is simply fetched again by the next.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import metrics, singleflight
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK = 1 << 20
+
+
+class DiskAudioCache:
+    """Thread-safe LRU of files in ``directory``, bounded by their total size."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # file name -> size, least recent first
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def filename(self, name):
+        """Storage names can contain slashes; cache files are named by digest."""
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+        return digest + os.path.splitext(name)[1].lower()
+
+    def path(self, name):
+        return os.path.join(self.directory, self.filename(name))
+
+    def get(self, name):
+        """The path of the local copy of ``name``, or ``None``."""
+        filename = self.filename(name)
+        with self._lock:
+            self._load()
+            hit = filename in self._entries
+            if hit:
+                self._entries.move_to_end(filename)
+        metrics.cache_lookups.inc(cache="audio", result="hit" if hit else "miss")
+        return os.path.join(self.directory, filename) if hit else None
+
+    def put(self, name, data):
+        """Keep a copy of ``data``, just uploaded as ``name``."""
+        if len(data) > self.max_bytes:
+            return None
+        return self._write(name, lambda f: f.write(data))
+
+    def fill(self, name):
+        """Copy ``name`` from storage; returns the local path. Concurrent
+        misses for the same name share one download."""
+        def download():
+            with default_storage.open(name) as src:
+                return self._write(name, lambda f: shutil.copyfileobj(src, f, COPY_CHUNK))
+
+        path, _ = singleflight.flights.run(f"audio-cache:{name}", download)
+        return path
+
+    def local(self, name):
+        """The local path of ``name``, fetched from storage on a miss, or
+        ``None`` if it is too big to keep. Storage errors propagate."""
+        path = self.get(name)
+        if path is not None and os.path.exists(path):
+            return path
+        return self.fill(name)
+
+    def discard(self, name):
+        filename = self.filename(name)
+        with self._lock:
+            size = self._entries.pop(filename, None)
+            if size is not None:
+                self.size -= size
+        self._unlink(filename)
+
+    def _write(self, name, write):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write under a temporary name and rename, so readers (in this or
+        # another worker) never see a partial file.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                size = f.tell()
+            if size > self.max_bytes:
+                os.unlink(tmp)
+                return None
+            os.replace(tmp, self.path(name))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._add(self.filename(name), size)
+        return self.path(name)
+
+    def _add(self, filename, size):
+        evicted = []
+        with self._lock:
+            self._load()
+            old = self._entries.pop(filename, None)
+            if old is not None:
+                self.size -= old
+            self._entries[filename] = size
+            self.size += size
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                victim, victim_size = self._entries.popitem(last=False)
+                self.size -= victim_size
+                evicted.append(victim)
+        for victim in evicted:
+            self._unlink(victim)
+        if evicted:
+            logger.debug("Evicted %d cached audio files", len(evicted))
+
+    def _load(self):
+        """Index files left by an earlier run, least recently used first."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            found = [entry for entry in os.scandir(self.directory)
+                     if entry.is_file() and not entry.name.endswith(".part")]
+        except FileNotFoundError:
+            return
+        for entry in sorted(found, key=lambda entry: entry.stat().st_mtime):
+            self._entries[entry.name] = entry.stat().st_size
+            self.size += entry.stat().st_size
+
+    def _unlink(self, filename):
+        # Responses still streaming the file keep their open handle.
+        try:
+            os.unlink(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            filenames = list(self._entries)
+            self._entries.clear()
+            self.size = 0
+        for filename in filenames:
+            self._unlink(filename)
+
+
+disk = DiskAudioCache(settings.AUDIO_CACHE_DIR, settings.AUDIO_CACHE_MAX_BYTES)
+
+
+class MappedFile:
+    """A file (or the range of it given to ``select``) for ``FileResponse``.
+
+    ``read`` returns views into a memory map of the file rather than copies.
+    ``fileno`` exposes the descriptor, positioned at ``start``, so a WSGI
+    server's ``wsgi.file_wrapper`` (gunicorn's) can ``sendfile`` the range
+    straight from the page cache; the response's Content-Length bounds it.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.select(0, size)
+
+    def select(self, start, end):
+        """Limit reads to bytes ``start`` to ``end``."""
+        self.start, self.end = start, min(end, len(self._map))
+        self._pos = start
+        os.lseek(self._file.fileno(), start, os.SEEK_SET)
+
+    def read(self, size=-1):
+        stop = self.end if size is None or size < 0 else min(self.end, self._pos + size)
+        view = memoryview(self._map)[self._pos:stop]
+        self._pos = max(self._pos, stop)
+        return view
+
+    def tell(self):
+        return self._pos - self.start
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: self.start, os.SEEK_CUR: self._pos, os.SEEK_END: self.end}[whence]
+        self._pos = min(max(self.start, base + offset), self.end)
+        return self.tell()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # A chunk is still referenced; unmapped when it goes.
+        self._file.close()
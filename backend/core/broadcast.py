@@ -0,0 +1,69 @@
+"""Combined multilingual broadcast tracks.
+
+An announcement created with ``broadcast: true`` also gets one file with
+every language's audio back to back, in the order the languages were
+requested, so a PA box can play it with a single request. Segments are
+resampled to ``BROADCAST_SAMPLE_RATE``, trimmed, normalized to the same
+loudness and separated by ``BROADCAST_GAP_MS`` of silence, with an optional
+chime up front.
+"""
+import subprocess
+
+import numpy as np
+from django.conf import settings
+
+from . import audio
+
+# "Ding-dong": (frequency in Hz, onset in seconds).
+CHIME_NOTES = ((659.25, 0.0), (523.25, 0.45))
+CHIME_SECONDS = 1.4
+
+
+def chime(rate):
+    """A two-note PA chime, each note a decaying sine with a soft overtone."""
+    t = np.arange(int(rate * CHIME_SECONDS), dtype=np.float32) / rate
+    out = np.zeros_like(t)
+    for freq, onset in CHIME_NOTES:
+        local = t - onset
+        envelope = np.where(local >= 0, np.exp(-3.0 * np.maximum(local, 0)), 0).astype(np.float32)
+        tone = np.sin(2 * np.pi * freq * local) + 0.3 * np.sin(4 * np.pi * freq * local)
+        out += envelope * tone.astype(np.float32)
+    return out
+
+
+def decode(data, rate):
+    """Stored audio in any output format as mono float samples at ``rate``.
+
+    WAV (and Ogg/FLAC with soundfile) is decoded in-process, anything else
+    (MP3) through ffmpeg.
+    """
+    if audio.can_decode(data):
+        samples, src_rate = audio.decode(data)
+        return audio.resample(audio.to_mono(samples), src_rate, rate)
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-v', 'error', '-i', 'pipe:0', '-ac', '1', '-ar', str(rate), '-f', 'f32le', 'pipe:1'],
+            input=bytes(data), capture_output=True, timeout=60,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise audio.AudioFormatError(f"Could not decode audio: {e}")
+    if result.returncode != 0:
+        raise audio.AudioFormatError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype="<f4").copy()
+
+
+def render(segments, rate):
+    """Join mono ``segments`` (at ``rate``) into one track, as WAV bytes."""
+    target = settings.BROADCAST_TARGET_DBFS
+    gap = np.zeros(int(rate * settings.BROADCAST_GAP_MS / 1000), dtype=np.float32)
+    parts = []
+    if settings.BROADCAST_CHIME:
+        parts.append(audio.match_loudness(chime(rate), target))
+    for samples in segments:
+        if settings.AUDIO_TRIM_SILENCE:
+            samples = audio.trim_silence(samples, rate, settings.AUDIO_SILENCE_THRESHOLD_DBFS)
+        if parts:
+            parts.append(gap)
+        parts.append(audio.match_loudness(samples, target))
+    track = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return audio.write_wav(np.clip(track, -1.0, 1.0), rate)
@@ -0,0 +1,206 @@
+"""Content-addressed cache for translations and synthesized audio.
+
+Lookups go through a small in-process LRU first and fall back to the
+``CachedTranslation`` table. Every hit is confirmed against the table (the
+hit counter update doubles as an existence check), so an entry invalidated
+from one worker stops being served by every other worker too.
+"""
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import CacheCounter, CachedTranslation
+
+
+def normalize_text(text):
+    """Collapse whitespace and unicode variants so trivially different
+    spellings of the same announcement share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text, source, target, voice, tone):
+    raw = "\x1f".join([normalize_text(text), source, target, voice, tone])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by the total size of its values in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def sizeof(value):
+        size = 0
+        for v in value:
+            if isinstance(v, str):
+                size += len(v.encode("utf-8"))
+            elif isinstance(v, (bytes, bytearray)):
+                size += len(v)
+            elif hasattr(v, "nbytes"):
+                size += v.nbytes
+        return size
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= self.sizeof(old)
+            self._data[key] = value
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= self.sizeof(old)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+memory = LRUCache(settings.ANNOUNCEMENT_CACHE_MAX_BYTES)
+
+
+# CacheCounter names -> lookup result label in the metrics.
+LOOKUP_RESULTS = {"hits": "hit", "misses": "miss"}
+
+
+def _count(name, amount=1):
+    if not amount:
+        return
+    if name in LOOKUP_RESULTS:
+        metrics.cache_lookups.inc(amount, cache="announcement", result=LOOKUP_RESULTS[name])
+    updated = CacheCounter.objects.filter(name=name).update(value=F("value") + amount)
+    if not updated:
+        CacheCounter.objects.get_or_create(name=name)
+        CacheCounter.objects.filter(name=name).update(value=F("value") + amount)
+
+
+def lookup_many(text, source, tone, voices, audio_format):
+    """Look up cached results for several target languages at once.
+
+    ``voices`` maps target language to voice. Returns a dict of
+    ``target -> (translated_text, audio_url, audio_size, audio_format)`` for
+    every cached language; ``audio_url`` is empty when only the translation
+    is cached, or the cached audio is in a different format than
+    ``audio_format``.
+    """
+    if not settings.ANNOUNCEMENT_CACHE_ENABLED:
+        return {}
+
+    keys = {cache_key(text, source, target, voice, tone): target for target, voice in voices.items()}
+    found = {}
+    for key, target in keys.items():
+        value = memory.get(key)
+        if value is not None:
+            found[key] = value
+
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for entry in CachedTranslation.objects.filter(key__in=missing).only(
+            "key", "translated_text", "audio_url", "audio_format", "audio_size"
+        ):
+            found[entry.key] = (entry.translated_text, entry.audio_url, entry.audio_format, entry.audio_size)
+            memory.set(entry.key, found[entry.key])
+
+    if found:
+        # Bump hit counters; keys that no longer exist were invalidated
+        # elsewhere and must not be served from this worker's memory.
+        CachedTranslation.objects.filter(key__in=found).update(
+            hit_count=F("hit_count") + 1, last_hit_at=timezone.now()
+        )
+        live = set(CachedTranslation.objects.filter(key__in=found).values_list("key", flat=True))
+        for key in list(found):
+            if key not in live:
+                memory.delete(key)
+                del found[key]
+
+    _count("hits", len(found))
+    _count("misses", len(keys) - len(found))
+    results = {}
+    for key, (translated_text, audio_url, fmt, audio_size) in found.items():
+        if fmt != audio_format:
+            audio_url, audio_size = "", 0
+        results[keys[key]] = (translated_text, audio_url, audio_size, fmt)
+    return results
+
+
+def store_many(text, source, tone, results):
+    """Store fresh results. ``results`` maps target language to
+    ``(voice, translated_text, audio_url, audio_size, audio_format)``, the
+    format being the one the audio was actually stored in."""
+    if not settings.ANNOUNCEMENT_CACHE_ENABLED:
+        return
+
+    normalized = normalize_text(text)
+    for target, (voice, translated_text, audio_url, audio_size, audio_format) in results.items():
+        if not translated_text:
+            continue
+        key = cache_key(text, source, target, voice, tone)
+        CachedTranslation.objects.update_or_create(
+            key=key,
+            defaults={
+                "text": normalized,
+                "source": source,
+                "target": target,
+                "voice": voice,
+                "tone": tone,
+                "translated_text": translated_text,
+                "audio_url": audio_url or "",
+                "audio_size": audio_size or 0,
+                "audio_format": audio_format,
+            },
+        )
+        memory.set(key, (translated_text, audio_url or "", audio_format, audio_size or 0))
+
+
+def invalidate(queryset=None):
+    """Delete cache entries (all of them by default) and drop them from this
+    worker's memory. Other workers notice on their next lookup."""
+    if queryset is None:
+        queryset = CachedTranslation.objects.all()
+        memory.clear()
+    else:
+        for key in queryset.values_list("key", flat=True):
+            memory.delete(key)
+    deleted, _ = queryset.delete()
+    return deleted
+
+
+def stats():
+    counters = dict(CacheCounter.objects.values_list("name", "value"))
+    return {
+        "hits": counters.get("hits", 0),
+        "misses": counters.get("misses", 0),
+        "entries": CachedTranslation.objects.count(),
+        "memory_entries": len(memory),
+        "memory_bytes": memory.size,
+    }
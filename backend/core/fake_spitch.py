@@ -0,0 +1,98 @@
+"""A local HTTP server speaking just enough of the Spitch API.
+
+Used by the tests and by ``manage.py bench_load`` so neither needs a real
+API key or network access. Point ``ResilientSpitch(base_url=server.url)``
+at it.
+"""
+import json
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from . import audio
+
+
+def tone(seconds, rate=24000, freq=440.0):
+    t = np.arange(int(seconds * rate), dtype=np.float32) / rate
+    return audio.write_wav(0.3 * np.sin(2 * np.pi * freq * t), rate)
+
+
+class FakeSpitchServer:
+    """Replies to translate, speech and transcription requests.
+
+    Every reply waits ``latency`` seconds, spread log-normally by
+    ``jitter``, and fails with a 503 with probability ``error_rate``.
+    ``fail(path, *responses)`` scripts ``(status, delay)`` replies for the
+    next requests to ``path``, ahead of the random behaviour.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.script = {}
+        self.requests = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._speech = tone(0.05)
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.requests.append((self.path, self.client_address[1]))
+                status, delay = fake.next_response(self.path)
+                time.sleep(delay)
+                if status != 200:
+                    self.reply(status, "application/json", b'{"detail": "upstream error"}')
+                elif self.path == "/v1/translate":
+                    target = json.loads(body)["target"]
+                    self.reply(200, "application/json", json.dumps({
+                        "request_id": "r", "text": f"[{target}] translated",
+                    }).encode())
+                elif self.path == "/v1/speech":
+                    self.reply(200, "audio/wav", fake._speech)
+                else:
+                    self.reply(200, "application/json", b'{"request_id": "r", "text": "Flight 220"}')
+
+            def reply(self, status, content_type, payload):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def next_response(self, path):
+        try:
+            return self.script.get(path, queue.Queue()).get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            delay = self.latency
+            if self.jitter:
+                delay *= self._random.lognormvariate(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+        return (503 if failed else 200), delay
+
+    def fail(self, path, *responses):
+        q = self.script.setdefault(path, queue.Queue())
+        for response in responses:
+            q.put(response)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,160 @@
+"""Query helpers for the announcement history endpoint.
+
+History is paged newest-first with an opaque keyset cursor over the
+indexed ``(created_at, id)`` pair, so deep pages cost the same as the
+first one and rows inserted while a client pages don't shift or repeat
+results.
+"""
+import base64
+import hashlib
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Announcement, AnnouncementLanguage, DeletionMark
+from .serializers import AnnouncementSerializer
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Serializer fields that need a model field of a different name.
+DERIVED_FIELDS = {"audio_mime_type": "audio_format"}
+
+
+class HistoryQueryError(ValueError):
+    pass
+
+
+def encode_cursor(announcement):
+    raw = f"{announcement.created_at.isoformat()}|{announcement.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        created_at = datetime.fromisoformat(created_at)
+        return created_at, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise HistoryQueryError("Invalid cursor.")
+
+
+def parse_limit(value):
+    if value in (None, ""):
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise HistoryQueryError("limit must be an integer.")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def parse_fields(value):
+    """``fields=id,text,created_at`` -> serializer field names, or None for all."""
+    if not value:
+        return None
+    available = set(AnnouncementSerializer().fields)
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = sorted(set(fields) - available)
+    if unknown:
+        raise HistoryQueryError(f"Unknown fields: {', '.join(unknown)}")
+    return ["id", *[name for name in fields if name != "id"]]
+
+
+def parse_when(value, name, end_of_day=False):
+    """Accept an ISO datetime or a plain date (start/end of that day)."""
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            raise HistoryQueryError(f"{name} must be an ISO date or datetime.")
+        when = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+def filtered(params):
+    """The history queryset for ``language``/``since``/``until`` filters."""
+    queryset = Announcement.objects.all()
+    if params.get("language"):
+        queryset = queryset.filter(
+            results__language=params["language"],
+            results__status__in=[AnnouncementLanguage.TRANSLATED, AnnouncementLanguage.DONE],
+        )
+    if params.get("since"):
+        queryset = queryset.filter(created_at__gte=parse_when(params["since"], "since"))
+    if params.get("until"):
+        queryset = queryset.filter(created_at__lte=parse_when(params["until"], "until", end_of_day=True))
+    return queryset
+
+
+def _page_query(queryset, cursor, limit):
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return queryset.values_list("id", "created_at", "updated_at")[:limit + 1]
+
+
+def page_keys(queryset, cursor, limit):
+    """One page of ``(id, created_at, updated_at)`` rows, read off the index
+    without touching the JSON columns, plus whether there is a next page."""
+    rows = list(_page_query(queryset, cursor, limit))
+    return rows[:limit], len(rows) > limit
+
+
+async def apage_keys(queryset, cursor, limit):
+    rows = [row async for row in _page_query(queryset, cursor, limit)]
+    return rows[:limit], len(rows) > limit
+
+
+def _deletions():
+    return DeletionMark.objects.filter(name="announcement").values_list("deleted_at", flat=True)
+
+
+def last_deletion():
+    """When an announcement was last deleted, or ``None``."""
+    return _deletions().first()
+
+
+async def alast_deletion():
+    return await _deletions().afirst()
+
+
+def validators(rows, fields, params, deleted_at=None):
+    """ETag and Last-Modified for a page. The ETag covers which rows are on
+    the page, when each last changed and how they're rendered. A deletion
+    (``deleted_at``, from ``last_deletion``) moves Last-Modified too, since
+    it can drop rows from the page without touching the others."""
+    digest = hashlib.sha256()
+    for pk, _, updated_at in rows:
+        digest.update(f"{pk}:{updated_at.isoformat()};".encode())
+    digest.update(repr((fields, sorted(params.items()))).encode())
+    changes = [updated_at for _, _, updated_at in rows]
+    if deleted_at is not None:
+        changes.append(deleted_at)
+    return f'"{digest.hexdigest()[:32]}"', max(changes, default=None)
+
+
+def _load_query(rows, fields):
+    queryset = Announcement.objects.filter(id__in=[pk for pk, _, _ in rows])
+    if fields is not None:
+        model_fields = {DERIVED_FIELDS.get(name, name) for name in fields}
+        queryset = queryset.only(*model_fields, "created_at")
+    return queryset
+
+
+def load(rows, fields):
+    """Fetch the page's rows in page order, loading only projected columns."""
+    by_id = {announcement.id: announcement for announcement in _load_query(rows, fields)}
+    return [by_id[pk] for pk, _, _ in rows if pk in by_id]
+
+
+async def aload(rows, fields):
+    by_id = {announcement.id: announcement async for announcement in _load_query(rows, fields)}
+    return [by_id[pk] for pk, _, _ in rows if pk in by_id]
+
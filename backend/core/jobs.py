@@ -0,0 +1,192 @@
+"""DB-backed job queue for asynchronous announcement creation.
+
+Views enqueue an ``AnnouncementJob`` and return straight away; worker
+processes started with ``manage.py run_announcement_workers`` claim jobs
+from the table and run the regular pipeline, recording per-language
+progress as they go.
+
+Jobs for scheduled announcements (``scheduled_for`` set) are left to
+``manage.py run_scheduler``, which claims them once their broadcast time is
+within the lead window so the audio is ready before it's needed.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import admission, phrases, transcription
+from .models import AnnouncementJob
+from .pipeline import AnnouncementPipeline
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+
+
+def enqueue(announcement, audio=None, audio_name="", params=None):
+    return AnnouncementJob.objects.create(
+        announcement=announcement,
+        audio=audio,
+        audio_name=audio_name,
+        params=params or {},
+        progress={lang: PENDING for lang in dict.fromkeys(announcement.languages)},
+    )
+
+
+def pending_jobs(scheduled=False, lead=None):
+    """Pending jobs in the order they should be claimed.
+
+    Unscheduled jobs go most urgent, then oldest first. With ``scheduled``,
+    only jobs for announcements due within ``lead`` seconds (default
+    ``ANNOUNCEMENT_SCHEDULE_LEAD``), soonest first; overdue ones included.
+    """
+    queryset = AnnouncementJob.objects.filter(state=AnnouncementJob.PENDING)
+    if not scheduled:
+        return queryset.filter(announcement__scheduled_for__isnull=True).order_by(
+            "announcement__priority", "created_at"
+        )
+    if lead is None:
+        lead = settings.ANNOUNCEMENT_SCHEDULE_LEAD
+    horizon = timezone.now() + timedelta(seconds=lead)
+    return queryset.filter(announcement__scheduled_for__lte=horizon).order_by(
+        "announcement__scheduled_for", "announcement__priority", "created_at"
+    )
+
+
+def claim_next(worker, scheduled=False, lead=None):
+    """Atomically claim the next job from ``pending_jobs(scheduled, lead)``,
+    or return ``None``.
+
+    The claim is a conditional UPDATE, so two workers racing for the same
+    row can't both win; the loser just moves on to the next one.
+    """
+    while True:
+        job_id = pending_jobs(scheduled, lead).values_list("id", flat=True).first()
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = AnnouncementJob.objects.filter(id=job_id, state=AnnouncementJob.PENDING).update(
+            state=AnnouncementJob.RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return AnnouncementJob.objects.select_related("announcement").get(id=job_id)
+
+
+def requeue_stale():
+    """Put jobs whose worker died (no heartbeat for
+    ``ANNOUNCEMENT_JOB_STALE_AFTER`` seconds) back on the queue, or fail them
+    for good once they have used up their attempts. A job that is merely
+    slow keeps its heartbeat going and is left alone."""
+    cutoff = timezone.now() - timedelta(seconds=settings.ANNOUNCEMENT_JOB_STALE_AFTER)
+    stale = AnnouncementJob.objects.filter(state=AnnouncementJob.RUNNING, heartbeat_at__lt=cutoff)
+    stale.filter(attempts__lt=settings.ANNOUNCEMENT_JOB_MAX_ATTEMPTS).update(
+        state=AnnouncementJob.PENDING, worker=""
+    )
+    stale.update(
+        state=AnnouncementJob.FAILED,
+        error="Worker stopped responding.",
+        finished_at=timezone.now(),
+    )
+
+
+@contextmanager
+def heartbeat(job):
+    """Refresh ``job.heartbeat_at`` every ``ANNOUNCEMENT_JOB_HEARTBEAT``
+    seconds from a background thread while the block runs, so long stages
+    (a big transcription, a slow upstream) don't look like a dead worker."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.ANNOUNCEMENT_JOB_HEARTBEAT):
+                try:
+                    AnnouncementJob.objects.filter(
+                        pk=job.pk, state=AnnouncementJob.RUNNING, worker=job.worker
+                    ).update(heartbeat_at=timezone.now())
+                except DatabaseError as e:
+                    logger.warning("Heartbeat for job %s failed: %s", job.id, e)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f"job-{job.id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    with heartbeat(job):
+        _run_job(job)
+
+
+def _run_job(job):
+    announcement = job.announcement
+    progress = dict(job.progress)
+
+    def on_event(lang, stage, data):
+        progress[lang] = stage
+        AnnouncementJob.objects.filter(pk=job.pk).update(progress=progress)
+
+    logger.info("Running job %s for announcement %s", job.id, announcement.id, extra={"announcement": announcement.id})
+    translations = {}
+    try:
+        # 1. Transcribe recorded audio first
+        if job.audio is not None:
+            with admission.priority(announcement.priority):
+                announcement.text = transcription.transcribe_upload(
+                    [bytes(job.audio)], job.audio_name, announcement.languages, translations
+                )
+            announcement.save(update_fields=["text", "updated_at"])
+
+        # 2. Reuse pipeline
+        pipeline = AnnouncementPipeline()
+        if job.params.get("template"):
+            parts = phrases.parse_template(job.params["template"])
+            pipeline.process_template(announcement, parts, job.params.get("slots", {}), on_event=on_event)
+        else:
+            pipeline.process(announcement, on_event=on_event, translations=translations)
+
+        job.state = AnnouncementJob.DONE
+        job.error = ""
+        logger.info("Job %s completed", job.id)
+    except Exception as e:
+        job.state = AnnouncementJob.FAILED
+        job.error = f"Announcement processing failed: {str(e)}"
+        logger.error("Job %s failed: %s", job.id, job.error)
+
+    AnnouncementJob.objects.filter(pk=job.pk).update(
+        state=job.state,
+        error=job.error,
+        progress=progress,
+        audio=None,
+        finished_at=timezone.now(),
+    )
+
+
+def work(worker, poll_interval=1.0, once=False, should_stop=lambda: False, scheduled=False, lead=None):
+    """Claim and run jobs until ``should_stop()`` (or, with ``once``, until
+    the queue is empty). ``scheduled`` and ``lead`` pick the queue, as for
+    ``claim_next``."""
+    while not should_stop():
+        close_old_connections()
+        requeue_stale()
+        job = claim_next(worker, scheduled, lead)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
@@ -0,0 +1,380 @@
+"""Live interpretation over a WebSocket.
+
+``backend/asgi.py`` hands WebSocket connections to ``/ws/interpret/`` to
+``application`` here instead of Django. A client streams microphone audio
+and gets each sentence back, interpreted, while it is still talking:
+
+1. It sends ``{"type": "start", "languages": ["yo", "ha"], ...}`` (also
+   ``tone``, ``priority``, ``encoding`` and ``sample_rate``) and waits for
+   ``{"type": "ready"}``.
+2. It sends audio as binary messages: 16-bit little-endian mono PCM at
+   ``sample_rate`` with ``encoding: "pcm16"`` (the default), or the chunks a
+   ``MediaRecorder`` produces with ``encoding: "webm"``, which are decoded
+   as they arrive by an ffmpeg subprocess.
+3. Audio is cut into sentences at pauses of ``LIVE_PAUSE_MS`` (or at
+   ``LIVE_MAX_SENTENCE_SECONDS``). Each sentence is transcribed, saved as
+   an announcement and run through the async pipeline while the next one
+   is recorded, so latency depends on sentence length rather than on how
+   long the client keeps talking.
+4. Progress comes back as JSON: ``transcript`` per sentence, the pipeline's
+   ``translated``/``audio``/``failed`` events per language, then
+   ``sentence`` with the saved announcement.
+5. ``{"type": "stop"}`` interprets whatever is left, waits for every
+   sentence, sends ``{"type": "done"}`` and closes the socket.
+
+Django Channels isn't a dependency, so this is a plain ASGI application;
+uvicorn speaks the WebSocket protocol.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import urljoin, urlsplit
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http.request import validate_host
+
+from . import admission, audio, metrics, transcription
+from .api import request_priority
+from .async_pipeline import AsyncAnnouncementPipeline
+from .models import Announcement
+
+logger = logging.getLogger(__name__)
+
+PATH = "/ws/interpret/"
+ENCODINGS = ("pcm16", "webm")
+MIN_SAMPLE_RATE, MAX_SAMPLE_RATE = 8000, 48000
+READ_SIZE = 16384
+
+# WebSocket close codes.
+NORMAL = 1000
+POLICY_VIOLATION = 1008
+TRY_AGAIN_LATER = 1013
+FORBIDDEN = 4403
+NOT_FOUND = 4404
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class SentenceSegmenter:
+    """Cuts a live mono stream into sentences at pauses.
+
+    ``feed`` takes float samples as they arrive and returns the sentences
+    they complete: voiced audio followed by ``pause_ms`` of silence, or
+    ``max_seconds`` of audio without one. Silence before a sentence and
+    after it is dropped down to ``pad_ms``, and sentences with less than
+    ``min_speech_ms`` of voiced audio (coughs, clicks) are discarded.
+    """
+
+    def __init__(self, sample_rate, pause_ms, max_seconds, threshold_dbfs=-40.0, min_speech_ms=300, pad_ms=200,
+                 frame_ms=20):
+        self.frame = max(1, sample_rate * frame_ms // 1000)
+        self.pause = max(1, pause_ms // frame_ms)
+        self.pad = pad_ms // frame_ms
+        self.min_speech = max(1, min_speech_ms // frame_ms)
+        self.max_frames = max(1, int(max_seconds * 1000) // frame_ms)
+        self.threshold = 10 ** (threshold_dbfs / 20)
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._frames = []
+        self._speech = 0
+        self._silence = 0
+
+    def feed(self, samples):
+        data = np.concatenate([self._carry, samples.astype(np.float32, copy=False)])
+        count = data.shape[0] // self.frame
+        self._carry = data[count * self.frame:]
+        frames = data[:count * self.frame].reshape(count, self.frame)
+        voiced = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1)) >= self.threshold
+
+        sentences = []
+        for frame, is_voiced in zip(frames, voiced):
+            self._frames.append(frame)
+            if not self._speech and not is_voiced:
+                # Nothing said yet: only keep a little lead-in.
+                del self._frames[:max(0, len(self._frames) - self.pad)]
+                continue
+            if is_voiced:
+                self._speech += 1
+                self._silence = 0
+            else:
+                self._silence += 1
+            if self._silence >= self.pause or len(self._frames) >= self.max_frames:
+                sentence = self._cut()
+                if sentence is not None:
+                    sentences.append(sentence)
+        return sentences
+
+    def flush(self):
+        """The unfinished sentence, if it has enough speech in it."""
+        if self._speech and self._carry.size:
+            self._frames.append(self._carry)
+        self._carry = np.zeros(0, dtype=np.float32)
+        return self._cut()
+
+    def _cut(self):
+        trailing = max(0, self._silence - self.pad)
+        frames = self._frames[:len(self._frames) - trailing]
+        enough = self._speech >= self.min_speech
+        self._frames, self._speech, self._silence = [], 0, 0
+        return np.concatenate(frames) if enough and frames else None
+
+
+def origin_allowed(scope):
+    """Browsers can open WebSockets to any site, so check ``Origin`` the way
+    CORS would: the frontend's origins, or this site's own hosts."""
+    origin = dict(scope.get("headers", ())).get(b"origin")
+    if origin is None:
+        return True  # Not a browser.
+    origin = origin.decode("latin-1")
+    if origin in settings.CORS_ALLOWED_ORIGINS:
+        return True
+    return validate_host(urlsplit(origin).hostname or "", settings.ALLOWED_HOSTS)
+
+
+def uri_builder(scope):
+    """``request.build_absolute_uri`` for a WebSocket scope."""
+    if settings.PUBLIC_BASE_URL:
+        base = settings.PUBLIC_BASE_URL
+    else:
+        host = dict(scope.get("headers", ())).get(b"host", b"localhost").decode("latin-1")
+        base = f"{'https' if scope.get('scheme') == 'wss' else 'http'}://{host}"
+    return lambda url: urljoin(base, url)
+
+
+class LivePipeline(AsyncAnnouncementPipeline):
+    """The async pipeline, with each progress event also handed to ``forward``."""
+
+    def __init__(self, build_absolute_uri, forward):
+        super().__init__(build_absolute_uri)
+        self.forward = forward
+
+    def report(self, lang, stage, **data):
+        super().report(lang, stage, **data)
+        self.forward(lang, stage, data)
+
+
+class LiveSession:
+    def __init__(self, scope, send):
+        self.scope = scope
+        self.send = send
+        self.outbox = asyncio.Queue()
+        self.sentences = set()
+        self.count = 0
+        self.decoder = None
+        self.reader = None
+        self.started = False
+        self.slots = asyncio.Semaphore(settings.LIVE_MAX_SENTENCES_IN_FLIGHT)
+
+    def push(self, message_type, **data):
+        self.outbox.put_nowait({"type": message_type, **data})
+
+    async def run(self, receive):
+        sender = asyncio.create_task(self._send_loop())
+        close_code = NORMAL
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    close_code = None
+                    break
+                if message.get("bytes") is not None:
+                    await self.on_audio(message["bytes"])
+                elif message.get("text") is not None and await self.on_text(message["text"]):
+                    break
+        except ProtocolError as e:
+            self.push("error", error=str(e))
+            close_code = POLICY_VIOLATION
+        except admission.Overloaded as e:
+            metrics.spitch_events.inc(operation="request", event="shed")
+            logger.warning("Shedding live session: %s", e)
+            self.push("error", error=f"Service is busy, please retry later. ({e})", retry_after=e.retry_after)
+            close_code = TRY_AGAIN_LATER
+        finally:
+            await self._stop_decoder(kill=close_code != NORMAL)
+            # Sentences already being interpreted still finish (and land in
+            # history) if the client goes away.
+            await asyncio.gather(*self.sentences, return_exceptions=True)
+            if close_code == NORMAL and self.started:
+                self.push("done", sentences=self.count)
+            if close_code is not None:
+                self.outbox.put_nowait({"type": "websocket.close", "code": close_code})
+            self.outbox.put_nowait(None)
+            await sender
+
+    async def _send_loop(self):
+        while (message := await self.outbox.get()) is not None:
+            if not message["type"].startswith("websocket."):
+                message = {"type": "websocket.send", "text": json.dumps(message, default=str)}
+            try:
+                await self.send(message)
+            except Exception as e:
+                # Gone away; keep draining so nothing waits on the queue.
+                logger.info("Live session send failed: %s", e)
+
+    async def on_text(self, text):
+        """Handle a control message; True once the session is over."""
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ProtocolError(f"JSON parse error - {e}")
+        kind = data.get("type") if isinstance(data, dict) else None
+        if kind == "start" and not self.started:
+            await self.start(data)
+        elif kind == "stop" and self.started:
+            await self._stop_decoder()
+            self._submit(self.segmenter.flush())
+            return True
+        else:
+            raise ProtocolError(f"Unexpected message {kind!r}.")
+        return False
+
+    async def start(self, data):
+        languages = data.get("languages")
+        if not isinstance(languages, list) or not languages or not all(isinstance(lang, str) for lang in languages):
+            raise ProtocolError("Languages must be a non-empty list.")
+        encoding = data.get("encoding", "pcm16")
+        if encoding not in ENCODINGS:
+            raise ProtocolError(f"Encoding must be one of {', '.join(ENCODINGS)}.")
+        sample_rate = data.get("sample_rate", transcription.SAMPLE_RATE)
+        if encoding == "webm":
+            sample_rate = transcription.SAMPLE_RATE
+        if not isinstance(sample_rate, int) or not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ProtocolError(f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}.")
+
+        self.priority = request_priority(data)
+        admission.controller.check(self.priority)
+
+        self.languages = languages
+        self.tone = data.get("tone", "neutral")
+        self.sample_rate = sample_rate
+        self.segmenter = SentenceSegmenter(
+            sample_rate, settings.LIVE_PAUSE_MS, settings.LIVE_MAX_SENTENCE_SECONDS, settings.TRANSCRIBE_SILENCE_DBFS,
+        )
+        self._pcm_carry = b""
+        if encoding == "webm":
+            self.decoder = await asyncio.create_subprocess_exec(
+                *transcription.FFMPEG_PCM_COMMAND,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            self.reader = asyncio.create_task(self._read_decoder(self.decoder.stdout))
+        self.started = True
+        logger.info("Live session started - languages: %s, encoding: %s, rate: %s", languages, encoding, sample_rate)
+        self.push("ready", sample_rate=sample_rate)
+
+    async def on_audio(self, data):
+        if not self.started:
+            raise ProtocolError("Send a start message before audio.")
+        metrics.bytes_total.inc(len(data), kind="upload")
+        if self.decoder is not None:
+            try:
+                self.decoder.stdin.write(data)
+                await self.decoder.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                raise ProtocolError("Could not decode the audio stream.")
+        else:
+            self._feed_pcm(data)
+
+    def _feed_pcm(self, data):
+        data = self._pcm_carry + data
+        even = len(data) - len(data) % 2
+        self._pcm_carry = data[even:]
+        for sentence in self.segmenter.feed(audio.from_pcm16(data[:even])):
+            self._submit(sentence)
+
+    async def _read_decoder(self, stdout):
+        while chunk := await stdout.read(READ_SIZE):
+            self._feed_pcm(chunk)
+
+    async def _stop_decoder(self, kill=False):
+        """Let ffmpeg decode what it has buffered (or kill it) and wait for
+        the last of its output."""
+        if self.decoder is None:
+            return
+        decoder, self.decoder = self.decoder, None
+        if kill and decoder.returncode is None:
+            decoder.kill()
+        else:
+            decoder.stdin.close()
+        await asyncio.gather(self.reader, return_exceptions=True)
+        await decoder.wait()
+
+    def _submit(self, samples):
+        if samples is None:
+            return
+        self.count += 1
+        task = asyncio.create_task(self.interpret(self.count, samples))
+        self.sentences.add(task)
+        task.add_done_callback(self.sentences.discard)
+
+    async def interpret(self, index, samples):
+        """Transcribe, translate and voice one sentence."""
+        async with self.slots:
+            with admission.priority(self.priority), metrics.timer("live_sentence"):
+                await self._interpret(index, samples)
+
+    async def _interpret(self, index, samples):
+        # 1. Transcribe
+        try:
+            wav = await asyncio.to_thread(
+                lambda: audio.pcm16_to_wav(audio.to_speech_pcm(samples, self.sample_rate), transcription.SAMPLE_RATE)
+            )
+            text = (await transcription.transcribe_wav_async(wav)).strip()
+        except Exception as e:
+            logger.warning("Live transcription failed for sentence %s: %s", index, e)
+            self.push("failed", sentence=index, error=f"Transcription failed: {str(e)}")
+            return
+        self.push("transcript", sentence=index, text=text)
+        if not text:
+            return
+
+        # 2. Translate and voice it like any other announcement
+        announcement = await Announcement.objects.acreate(
+            text=text,
+            languages=self.languages,
+            translations={},
+            tone=self.tone,
+            audio_files={},
+            priority=self.priority,
+        )
+
+        def forward(lang, stage, data):
+            self.push(stage, sentence=index, language=lang, **data)
+
+        try:
+            await LivePipeline(uri_builder(self.scope), forward).aprocess(announcement)
+        except Exception as e:
+            await announcement.adelete()
+            logger.error("Live announcement processing failed for sentence %s: %s", index, e)
+            self.push("failed", sentence=index, error=f"Announcement processing failed: {str(e)}")
+            return
+        self.push(
+            "sentence", sentence=index, id=announcement.id, text=text,
+            translations=announcement.translations, audio_files=announcement.audio_files,
+        )
+
+
+async def application(scope, receive, send):
+    """ASGI application for WebSocket connections."""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    if scope["path"] != PATH:
+        await send({"type": "websocket.close", "code": NOT_FOUND})
+        return
+    if not origin_allowed(scope):
+        logger.warning("Rejected live session from origin %s", dict(scope["headers"]).get(b"origin"))
+        await send({"type": "websocket.close", "code": FORBIDDEN})
+        return
+
+    await send({"type": "websocket.accept"})
+    await sync_to_async(close_old_connections)()
+    try:
+        await LiveSession(scope, send).run(receive)
+    finally:
+        await sync_to_async(close_old_connections)()
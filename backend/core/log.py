@@ -0,0 +1,68 @@
+"""Logging helpers wired up by ``LOGGING`` in settings.
+
+``QueuedStreamHandler`` hands records to a background thread, so request
+and pool threads never block on a stdout write. ``JsonFormatter`` emits one
+JSON object per line, including any ``extra={...}`` fields.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+
+# Attributes every LogRecord has; anything else came from ``extra``.
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _STANDARD_ATTRS:
+                data[name] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class QueuedStreamHandler(logging.handlers.QueueHandler):
+    """Format on the calling thread, write to stderr on a listener thread.
+
+    Forked children (the worker and scheduler processes) don't inherit the
+    listener thread, so each one starts its own.
+    """
+
+    def __init__(self):
+        super().__init__(queue.SimpleQueue())
+        self.stream = logging.StreamHandler()
+        self.stream.setFormatter(logging.Formatter("%(message)s"))
+        self.listener = logging.handlers.QueueListener(self.queue, self.stream)
+        self.listener.start()
+        atexit.register(self.stop)
+        os.register_at_fork(after_in_child=self._restart)
+        # multiprocessing children leave through os._exit, skipping atexit.
+        multiprocessing.util.register_after_fork(self, QueuedStreamHandler._stop_at_process_exit)
+
+    def _restart(self):
+        if self.listener is None:
+            return
+        # The parent may have forked mid-put, so don't reuse its queue.
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, self.stream)
+        self.listener.start()
+
+    def _stop_at_process_exit(self):
+        multiprocessing.util.Finalize(None, self.stop, exitpriority=0)
+
+    def stop(self):
+        """Write out queued records and stop the listener."""
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import audio
+from core.transcription import SAMPLE_RATE, native_audio_conversion
+
+
+def ffmpeg_conversion(data):
+    """The temp-file ffmpeg path the transcribe view used to take every time."""
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = os.path.join(tmp, "in.wav"), os.path.join(tmp, "out.wav")
+        with open(src, "wb") as f:
+            f.write(data)
+        subprocess.run(
+            ['ffmpeg', '-v', 'error', '-i', src, '-ac', '1', '-ar', str(SAMPLE_RATE),
+             '-acodec', 'pcm_s16le', '-y', dst],
+            check=True,
+        )
+        with open(dst, "rb") as f:
+            return f.read()
+
+
+class Command(BaseCommand):
+    help = "Compare in-process audio conversion with the ffmpeg subprocess on sample WAVs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="*", help="Audio files (default: the sample WAVs in the project root).")
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        files = [Path(f) for f in options["files"]] or sorted(Path(settings.BASE_DIR).glob("*.wav"))
+        if not files:
+            self.stderr.write("No sample files found.")
+            return
+
+        engines = [("native", native_audio_conversion)]
+        if shutil.which("ffmpeg"):
+            engines.append(("ffmpeg", ffmpeg_conversion))
+        else:
+            self.stderr.write("ffmpeg not found; benchmarking the native engine only.")
+
+        iterations = options["iterations"]
+        self.stdout.write(f"{'file':<60} {'engine':<8} {'ms/op':>9} {'x realtime':>11}")
+        totals = {name: 0.0 for name, _ in engines}
+        for path in files:
+            data = path.read_bytes()
+            samples, rate = audio.decode(data)
+            duration = len(samples) / rate
+            for name, convert in engines:
+                convert(data)  # warm-up
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    convert(data)
+                elapsed = (time.perf_counter() - start) / iterations
+                totals[name] += elapsed
+                self.stdout.write(
+                    f"{path.name:<60} {name:<8} {elapsed * 1000:>9.2f} {duration / elapsed:>10.0f}x"
+                )
+
+        for name, total in totals.items():
+            self.stdout.write(f"{'total':<60} {name:<8} {total * 1000:>9.2f}")
@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import admission, metrics, pipeline
+from core.fake_spitch import FakeSpitchServer, tone
+from core.spitch_client import ResilientSpitch
+
+BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "baseline.json"
+SCENARIOS = ["announce", "transcribe", "history"]
+LANGUAGES = ["yo", "ig", "ha"]
+IN_MEMORY_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+# (field, which direction is worse)
+CHECKS = [("p50_ms", "up"), ("p95_ms", "up"), ("rps", "down"), ("upstream_calls_per_request", "up")]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(app):
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler, allow_reuse_address=False)
+    server.set_app(app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def unlimited_admission():
+    buckets = {name: admission.LocalBucket(1e9, 1e9) for name in settings.ADMISSION_BUCKETS}
+    return admission.AdmissionController(buckets, max_queue=10 ** 6, max_wait=3600)
+
+
+def compare(report, baseline, tolerance):
+    """Lines describing every metric that got worse than ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    for name, result in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for field, worse in CHECKS:
+            old, new = base[field], result[field]
+            if (worse == "up" and new > old * (1 + tolerance)) or (worse == "down" and new < old * (1 - tolerance)):
+                regressions.append(f"{name} {field}: {old} -> {new}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test /api/announce/, /api/transcribe/ and /api/history/ against a local fake Spitch "
+        "server and in-memory storage, and compare the results with a saved baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once.")
+        parser.add_argument("--latency-ms", type=float, default=50, help="Median fake Spitch latency.")
+        parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma applied to the latency.")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of Spitch calls that return 503.")
+        parser.add_argument("--distinct-texts", type=int, default=10,
+                            help="Announcement texts to cycle through; repeats are served from the cache.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--admission", action="store_true",
+                            help="Keep the configured ADMISSION_BUCKETS rate limits instead of lifting them.")
+        parser.add_argument("--output", help="Write the JSON report here.")
+        parser.add_argument("--baseline", default=str(BASELINE), help="Baseline to compare with.")
+        parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run.")
+        parser.add_argument("--tolerance", type=float, default=0.3,
+                            help="Allowed relative change before a metric counts as a regression.")
+        parser.add_argument("--check", action="store_true", help="Exit with an error if anything regressed.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.texts = [
+            f"Flight {100 + n} to Lagos is now boarding at gate {n % 12 + 1}"
+            for n in range(max(1, options["distinct_texts"]))
+        ]
+        self.recording = tone(2.0, rate=16000)
+
+        report = self.run()
+        self.print_report(report)
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2) + "\n")
+        baseline_path = Path(options["baseline"])
+        if options["save_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {baseline_path}"))
+            return
+        if not baseline_path.exists():
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get("config") != report["config"]:
+            self.stderr.write("Baseline was recorded with different options; comparison is approximate.")
+        regressions = compare(report, baseline, options["tolerance"])
+        for line in regressions:
+            self.stderr.write(self.style.WARNING(f"Regression: {line}"))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
+        elif options["check"]:
+            raise CommandError(f"{len(regressions)} metric(s) regressed against {baseline_path}")
+
+    def run(self):
+        options = self.options
+        fake = FakeSpitchServer(
+            latency=options["latency_ms"] / 1000, jitter=options["jitter"],
+            error_rate=options["error_rate"], seed=options["seed"],
+        )
+        controller = admission.build_controller() if options["admission"] else unlimited_admission()
+        client = ResilientSpitch(api_key="bench", base_url=fake.url, admission_controller=controller)
+        original_spitch, original_controller = pipeline.spitch, admission.controller
+        pipeline.spitch, admission.controller = client, controller
+
+        old_name = connection.settings_dict["NAME"]
+        old_test, old_options = dict(connection.settings_dict["TEST"]), dict(connection.settings_dict["OPTIONS"])
+        tmp = tempfile.TemporaryDirectory()
+        if connection.vendor == "sqlite":
+            # A file rather than the shared in-memory test database, so
+            # concurrent request threads wait for each other's writes.
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp.name, "bench.sqlite3")
+            connection.settings_dict["OPTIONS"].update(timeout=30, transaction_mode="IMMEDIATE")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # get_wsgi_application() sets Django up again, which reapplies LOGGING.
+        server = serve(get_wsgi_application())
+        level = logging.INFO if options["verbosity"] > 1 else logging.ERROR
+        for name in ("core", "django.request"):
+            logging.getLogger(name).setLevel(level)
+        try:
+            with override_settings(ALLOWED_HOSTS=["127.0.0.1"], STORAGES=IN_MEMORY_STORAGES, METRICS_ENABLED=True):
+                base_url = f"http://127.0.0.1:{server.server_port}"
+                scenarios = {name: self.run_scenario(name, base_url, fake) for name in options["scenarios"]}
+        finally:
+            server.shutdown()
+            server.server_close()
+            fake.close()
+            pipeline.spitch, admission.controller = original_spitch, original_controller
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict["TEST"], connection.settings_dict["OPTIONS"] = old_test, old_options
+            tmp.cleanup()
+
+        config = {
+            name: options[name]
+            for name in ("requests", "concurrency", "latency_ms", "jitter", "error_rate", "distinct_texts", "seed", "admission")
+        }
+        return {"config": config, "scenarios": scenarios}
+
+    def run_scenario(self, name, base_url, fake):
+        options = self.options
+        send = getattr(self, f"send_{name}")
+        for metric in metrics.registry:
+            metric.clear()
+        upstream_before = len(fake.requests)
+
+        with httpx.Client(base_url=base_url, timeout=120,
+                          limits=httpx.Limits(max_connections=options["concurrency"])) as http:
+            def one(i):
+                started = time.perf_counter()
+                try:
+                    ok = send(http, i)
+                except httpx.HTTPError:
+                    ok = None
+                return time.perf_counter() - started, ok
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options["concurrency"]) as pool:
+                results = list(pool.map(one, range(options["requests"])))
+            elapsed = time.perf_counter() - started
+
+        latencies = np.array([seconds for seconds, _ in results]) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        stages = {}
+        for (stage, _language), (count, total) in metrics.stage_seconds.totals().items():
+            entry = stages.setdefault(stage, [0, 0.0])
+            entry[0] += count
+            entry[1] += total
+        return {
+            "requests": len(results),
+            "errors": sum(ok is None for _, ok in results),
+            "partial": sum(ok is False for _, ok in results),
+            "rps": round(len(results) / elapsed, 2),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "upstream_calls_per_request": round((len(fake.requests) - upstream_before) / len(results), 2),
+            "stage_mean_ms": {
+                stage: round(total / count * 1000, 1) for stage, (count, total) in sorted(stages.items())
+            },
+        }
+
+    # Each send_* returns True for a complete response, False for a partial
+    # one (some languages missing) and None for a failed request.
+
+    def send_announce(self, http, i):
+        response = http.post("/api/announce/", json={
+            "text": self.texts[i % len(self.texts)], "languages": LANGUAGES, "tone": "neutral",
+        })
+        return self.complete(response)
+
+    def send_transcribe(self, http, i):
+        response = http.post(
+            "/api/transcribe/",
+            files={"audio": ("announcement.wav", self.recording, "audio/wav")},
+            data={"languages": json.dumps(LANGUAGES), "tone": "neutral"},
+        )
+        return self.complete(response)
+
+    def send_history(self, http, i):
+        response = http.get("/api/history/", params={"limit": 20})
+        return response.is_success or None
+
+    def complete(self, response):
+        if not response.is_success:
+            return None
+        return len(response.json().get("audio_files", {})) == len(LANGUAGES)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'scenario':<12} {'reqs':>5} {'err':>4} {'part':>5} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'upstream/req':>13}"
+        )
+        for name, r in report["scenarios"].items():
+            self.stdout.write(
+                f"{name:<12} {r['requests']:>5} {r['errors']:>4} {r['partial']:>5} {r['rps']:>8.2f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                f"{r['upstream_calls_per_request']:>13.2f}"
+            )
+            if r["stage_mean_ms"] and self.options["verbosity"] > 1:
+                stages = ", ".join(f"{stage} {ms}ms" for stage, ms in r["stage_mean_ms"].items())
+                self.stdout.write(f"{'':<12} {stages}")
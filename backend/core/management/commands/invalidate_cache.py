@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import cache as announcement_cache
+from core.models import CachedTranslation
+
+
+class Command(BaseCommand):
+    help = "Invalidate cached translations/audio, or show cache statistics."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Invalidate every cache entry.")
+        parser.add_argument("--text", help="Only entries for this announcement text.")
+        parser.add_argument("--target", help="Only entries for this target language.")
+        parser.add_argument("--voice", help="Only entries for this voice.")
+        parser.add_argument("--older-than", type=int, metavar="DAYS", help="Only entries created more than DAYS ago.")
+        parser.add_argument("--stats", action="store_true", help="Print hit/miss counters and exit.")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for name, value in announcement_cache.stats().items():
+                self.stdout.write(f"{name}: {value}")
+            return
+
+        queryset = CachedTranslation.objects.all()
+        filtered = False
+        if options["text"]:
+            queryset = queryset.filter(text=announcement_cache.normalize_text(options["text"]))
+            filtered = True
+        if options["target"]:
+            queryset = queryset.filter(target=options["target"])
+            filtered = True
+        if options["voice"]:
+            queryset = queryset.filter(voice=options["voice"])
+            filtered = True
+        if options["older_than"] is not None:
+            queryset = queryset.filter(created_at__lt=timezone.now() - timedelta(days=options["older_than"]))
+            filtered = True
+
+        if not filtered and not options["all"]:
+            self.stderr.write("Refusing to invalidate everything without --all.")
+            return
+
+        deleted = announcement_cache.invalidate(queryset)
+        self.stdout.write(self.style.SUCCESS(f"Invalidated {deleted} cache entries."))
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+def _worker_main(name, poll_interval, once, queue):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+    jobs.work(name, poll_interval=poll_interval, once=once, should_stop=lambda: bool(stopping), **queue)
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that process queued (async) announcements."
+    label = "announcement worker"
+    default_processes = "ANNOUNCEMENT_WORKER_PROCESSES"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=getattr(settings, self.default_processes),
+            help="Number of worker processes.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit once the queue is empty instead of polling forever.",
+        )
+
+    def queue(self, options):
+        """Keyword arguments for ``jobs.work`` selecting which jobs to run."""
+        return {}
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Starting {processes} {self.label}(s)")
+
+        # Children must open their own DB connections.
+        connections.close_all()
+        ctx = multiprocessing.get_context("fork")
+        workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(f"{prefix}-{i}", options["poll_interval"], options["once"], self.queue(options)),
+                name=f"{self.label.replace(' ', '-')}-{i}",
+            )
+            for i in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        def forward(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, signum)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+
+        for worker in workers:
+            worker.join()
+        self.stdout.write(f"{self.label.capitalize()}s stopped")
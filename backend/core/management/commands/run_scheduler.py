@@ -0,0 +1,22 @@
+from django.conf import settings
+
+from core.management.commands.run_announcement_workers import Command as WorkersCommand
+
+
+class Command(WorkersCommand):
+    help = (
+        "Run a pool of worker processes that precompute scheduled announcements "
+        "once they're due within the lead window."
+    )
+    label = "scheduler worker"
+    default_processes = "ANNOUNCEMENT_SCHEDULER_PROCESSES"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--lead", type=float, default=settings.ANNOUNCEMENT_SCHEDULE_LEAD,
+            help="Seconds ahead of its broadcast time to precompute an announcement.",
+        )
+
+    def queue(self, options):
+        return {"scheduled": True, "lead": options["lead"]}
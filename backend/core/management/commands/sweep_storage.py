@@ -0,0 +1,83 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core import retention, storage
+
+
+def human_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete generated audio that is orphaned (failed or superseded announcements), older than "
+        "RETENTION_MAX_AGE_DAYS or beyond RETENTION_MAX_BYTES, in batches, every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what a sweep would delete and exit.")
+        parser.add_argument("--once", action="store_true", help="Run one sweep and exit.")
+        parser.add_argument(
+            "--interval", type=float, default=settings.RETENTION_SWEEP_INTERVAL, help="Seconds between sweeps.",
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.RETENTION_BATCH_SIZE,
+                            help="Files deleted per transaction.")
+        parser.add_argument(
+            "--untracked", action="store_true",
+            help="Also list generated files in storage that aren't tracked (listing storage may be slow) "
+                 "and, unless --dry-run, start tracking them so sweeps cover them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["untracked"]:
+            self.handle_untracked(options["dry_run"])
+
+        if options["dry_run"]:
+            self.print_report(retention.sweep(dry_run=True), "Would delete")
+            return
+
+        if options["once"]:
+            self.sweep(options)
+            return
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+        while not stopping:
+            self.sweep(options)
+            deadline = time.monotonic() + options["interval"]
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(min(1.0, options["interval"]))
+
+    def sweep(self, options):
+        close_old_connections()
+        report = retention.sweep(batch_size=options["batch_size"])
+        # Let this sweep's deletions finish before reporting (or exiting).
+        storage.wait_for_cleanup()
+        self.print_report(report, "Deleted")
+
+    def handle_untracked(self, dry_run):
+        try:
+            names = retention.untracked()
+        except NotImplementedError:
+            raise CommandError("The storage backend can't list files.")
+        self.stdout.write(f"untracked: {len(names)} files")
+        for name in names:
+            self.stdout.write(f"  {name}")
+        if names and not dry_run:
+            self.stdout.write(f"Tracking {retention.adopt(names)} files")
+
+    def print_report(self, report, verb):
+        for reason in retention.REASONS:
+            files, size = report[reason]
+            self.stdout.write(f"{verb} {reason}: {files} files, {human_size(size)}")
+        files, size = retention.totals()
+        quota = human_size(settings.RETENTION_MAX_BYTES) if settings.RETENTION_MAX_BYTES else "no quota"
+        self.stdout.write(f"Tracked: {files} files, {human_size(size)} ({quota})")
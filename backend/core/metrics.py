@@ -0,0 +1,159 @@
+"""In-process metrics with a Prometheus text exposition.
+
+A deliberately small stand-in for ``prometheus_client``: labelled counters
+and histograms kept in memory, rendered by ``render()`` for
+``/api/metrics/``. Each server process keeps its own numbers (Prometheus
+sums them across scrape targets).
+
+Stages are timed with ``timer("translate", language="yo")``; failures of a
+timed block are counted automatically.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Seconds; spans a cache hit up to a slow TTS call.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._samples(items))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self, items):
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def totals(self):
+        """``{label values: (count, sum)}`` for every label set observed."""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._values.items()}
+
+    def _samples(self, items):
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+registry = []
+
+stage_seconds = Histogram(
+    "voicebridge_stage_seconds",
+    "Time spent per pipeline stage.",
+    ["stage", "language"],
+)
+stage_failures = Counter(
+    "voicebridge_stage_failures_total",
+    "Pipeline stages that raised.",
+    ["stage", "language"],
+)
+bytes_total = Counter(
+    "voicebridge_bytes_total",
+    "Bytes handled, by kind (upload, pcm, tts, stored).",
+    ["kind"],
+)
+cache_lookups = Counter(
+    "voicebridge_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+spitch_events = Counter(
+    "voicebridge_spitch_events_total",
+    "Spitch client events: retry, circuit_open, shed.",
+    ["operation", "event"],
+)
+
+
+@contextmanager
+def timer(stage, language=""):
+    """Observe the block's duration under ``stage``; count it as a failure
+    if it raises."""
+    started = time.monotonic()
+    try:
+        yield
+    except BaseException:
+        stage_failures.inc(stage=stage, language=language)
+        raise
+    finally:
+        stage_seconds.observe(time.monotonic() - started, stage=stage, language=language)
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
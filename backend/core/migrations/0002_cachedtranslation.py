@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CachedTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField()),
+                ('source', models.CharField(max_length=10)),
+                ('target', models.CharField(max_length=10)),
+                ('voice', models.CharField(max_length=50)),
+                ('tone', models.CharField(max_length=50)),
+                ('translated_text', models.TextField()),
+                ('audio_url', models.URLField(blank=True, max_length=500)),
+                ('audio_size', models.PositiveIntegerField(default=0)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
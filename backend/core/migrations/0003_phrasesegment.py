@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_cachedtranslation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhraseSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('phrase', models.TextField()),
+                ('target', models.CharField(max_length=10)),
+                ('voice', models.CharField(max_length=50)),
+                ('tone', models.CharField(max_length=50)),
+                ('translated_text', models.TextField()),
+                ('pcm', models.BinaryField()),
+                ('sample_rate', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_phrasesegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnouncementJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('audio', models.BinaryField(blank=True, null=True)),
+                ('audio_name', models.CharField(blank=True, max_length=255)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('progress', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('announcement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='job', to='core.announcement')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', 'created_at'], name='core_announ_state_6fa272_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_announcementjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='audio_format',
+            field=models.CharField(default='wav', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='cachedtranslation',
+            name='audio_format',
+            field=models.CharField(default='wav', max_length=10),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_announcement_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnouncementLanguage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10)),
+                ('voice', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('translated', 'Translated'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('translated_text', models.TextField(blank=True)),
+                ('audio_url', models.TextField(blank=True)),
+                ('byte_size', models.PositiveIntegerField(default=0)),
+                ('cached', models.BooleanField(default=False)),
+                ('timings', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('announcement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='core.announcement')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['language', 'created_at'], name='core_announ_languag_172b39_idx'), models.Index(fields=['status'], name='core_announ_status_38de5a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('announcement', 'language'), name='unique_announcement_language')],
+            },
+        ),
+    ]
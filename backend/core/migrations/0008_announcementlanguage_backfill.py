@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:47
+
+from django.db import migrations
+
+# Voices as of this migration (core.pipeline.VOICE_MAP).
+VOICES = {"yo": "femi", "ig": "obinna", "ha": "aliyu", "en": "john"}
+BATCH_SIZE = 500
+
+
+def backfill(apps, schema_editor):
+    Announcement = apps.get_model('core', 'Announcement')
+    AnnouncementLanguage = apps.get_model('core', 'AnnouncementLanguage')
+
+    rows = []
+    announcements = Announcement.objects.only(
+        'id', 'languages', 'translations', 'audio_files', 'created_at'
+    )
+    for announcement in announcements.iterator(chunk_size=BATCH_SIZE):
+        translations = announcement.translations or {}
+        audio_files = announcement.audio_files or {}
+        languages = dict.fromkeys([*(announcement.languages or []), *translations, *audio_files])
+        for lang in languages:
+            if not isinstance(lang, str):
+                continue
+            if audio_files.get(lang):
+                status = 'done'
+            elif translations.get(lang):
+                status = 'translated'
+            else:
+                status = 'failed'
+            rows.append(AnnouncementLanguage(
+                announcement_id=announcement.id,
+                language=lang[:10],
+                voice=VOICES.get(lang, 'john'),
+                status=status,
+                translated_text=translations.get(lang) or '',
+                audio_url=audio_files.get(lang) or '',
+                created_at=announcement.created_at,
+            ))
+        if len(rows) >= BATCH_SIZE:
+            AnnouncementLanguage.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    AnnouncementLanguage.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_announcementlanguage'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
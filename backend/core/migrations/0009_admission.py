@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_announcementlanguage_backfill'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionBucket',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='announcement',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Urgent'), (1, 'Routine')], default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_admission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='scheduled_for',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_announcement_scheduled_for'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredAudio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('url', models.CharField(db_index=True, max_length=500)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('language', models.CharField(blank=True, max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('announcement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stored_audio', to='core.announcement')),
+            ],
+        ),
+    ]
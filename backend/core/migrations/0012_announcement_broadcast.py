@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_storedaudio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='broadcast',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='announcement',
+            name='broadcast_url',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill(apps, schema_editor):
+    # Existing audio is taken to be in its announcement's format.
+    Announcement = apps.get_model('core', 'Announcement')
+    AnnouncementLanguage = apps.get_model('core', 'AnnouncementLanguage')
+    AnnouncementLanguage.objects.exclude(audio_url='').update(audio_format=Subquery(
+        Announcement.objects.filter(id=OuterRef('announcement_id')).values('audio_format')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_announcement_broadcast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcementlanguage',
+            name='audio_format',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:42
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill(apps, schema_editor):
+    # Jobs running now get their start time until their next heartbeat.
+    AnnouncementJob = apps.get_model('core', 'AnnouncementJob')
+    AnnouncementJob.objects.filter(state='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_announcementlanguage_audio_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcementjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_announcementjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionMark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,14 +1,235 @@
 # models.py
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from cloudinary_storage.storage import MediaCloudinaryStorage
 
 class Announcement(models.Model):
+    # Urgent (safety) announcements are admitted to Spitch and claimed by
+    # job workers ahead of routine ones.
+    URGENT = 0
+    ROUTINE = 1
+    PRIORITY_CHOICES = [(URGENT, "Urgent"), (ROUTINE, "Routine")]
+
     text = models.TextField()
     languages = models.JSONField(default=list)
     translations = models.JSONField(default=dict)
     tone = models.CharField(max_length=50, default="neutral")
     audio_files = models.JSONField(default=dict)  # We'll keep this for now
+    audio_format = models.CharField(max_length=10, default="wav")
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=ROUTINE)
+    # Broadcast time for announcements known in advance; ``run_scheduler``
+    # precomputes their audio ahead of it.
+    scheduled_for = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Also render every language into one file for PA boxes; see
+    # core/broadcast.py.
+    broadcast = models.BooleanField(default=False)
+    broadcast_url = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # History is paged newest-first by (created_at, id).
+            models.Index(fields=["-created_at", "-id"], name="announcement_history_idx"),
+        ]
 
     def __str__(self):
-        return f"Announcement {self.id} ({self.created_at})"
\ No newline at end of file
+        return f"Announcement {self.id} ({self.created_at})"
+
+class AnnouncementLanguage(models.Model):
+    """One language of an announcement: its translation, audio and how it went.
+
+    ``Announcement.translations``/``audio_files`` are still written for API
+    compatibility; this table is what per-language queries and progress
+    updates use. ``created_at`` is copied from the announcement so queries
+    like "all Hausa announcements this week" stay on one index.
+    """
+    PENDING = "pending"
+    TRANSLATED = "translated"  # translation done, audio failed
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (TRANSLATED, "Translated"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name="results")
+    language = models.CharField(max_length=10)
+    voice = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    translated_text = models.TextField(blank=True)
+    audio_url = models.TextField(blank=True)
+    byte_size = models.PositiveIntegerField(default=0)
+    # The format this language's audio was actually stored in, which is
+    # WAV when encoding it failed.
+    audio_format = models.CharField(max_length=10, blank=True)
+    cached = models.BooleanField(default=False)
+    # Milliseconds per stage, e.g. {"translate_ms": 412, "synthesize_ms": 1830}.
+    timings = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["announcement", "language"], name="unique_announcement_language"),
+        ]
+        indexes = [
+            models.Index(fields=["language", "created_at"]),
+            models.Index(fields=["status"]),
+        ]
+
+    def __str__(self):
+        return f"Announcement {self.announcement_id} [{self.language}] {self.status}"
+
+class CachedTranslation(models.Model):
+    """A translation and its synthesized audio, keyed on what produced them.
+
+    ``key`` is a digest of (normalized text, source, target, voice, tone) so
+    repeat announcements can reuse the stored translation and audio URL
+    instead of calling Spitch and storage again.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    text = models.TextField()
+    source = models.CharField(max_length=10)
+    target = models.CharField(max_length=10)
+    voice = models.CharField(max_length=50)
+    tone = models.CharField(max_length=50)
+    translated_text = models.TextField()
+    audio_url = models.URLField(max_length=500, blank=True)
+    audio_size = models.PositiveIntegerField(default=0)
+    audio_format = models.CharField(max_length=10, default="wav")
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.source}->{self.target} ({self.voice}/{self.tone}): {self.text[:50]}"
+
+
+class CacheCounter(models.Model):
+    """Running hit/miss totals for the translation cache, shared by all workers."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class PhraseSegment(models.Model):
+    """The translated, synthesized audio for one fixed phrase of a template.
+
+    Stored as mono 16-bit PCM so template announcements can be stitched
+    together without re-synthesizing the parts that never change.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    phrase = models.TextField()
+    target = models.CharField(max_length=10)
+    voice = models.CharField(max_length=50)
+    tone = models.CharField(max_length=50)
+    translated_text = models.TextField()
+    pcm = models.BinaryField()
+    sample_rate = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.target} ({self.voice}): {self.phrase[:50]}"
+
+
+class AnnouncementJob(models.Model):
+    """A queued announcement waiting for (or being run by) a job worker.
+
+    The table doubles as the queue: workers claim the oldest pending job
+    with a conditional update, so nothing beyond the database is needed.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATE_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    announcement = models.OneToOneField(Announcement, on_delete=models.CASCADE, related_name="job")
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=PENDING)
+    # Raw upload for transcription jobs; cleared once transcribed.
+    audio = models.BinaryField(null=True, blank=True)
+    audio_name = models.CharField(max_length=255, blank=True)
+    # Extra request options, e.g. {"template": ..., "slots": {...}}
+    params = models.JSONField(default=dict, blank=True)
+    # Per-language stage: pending / translated / audio / failed
+    progress = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs; a running job whose
+    # heartbeat stops is requeued.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["state", "created_at"])]
+
+    def __str__(self):
+        return f"Job for announcement {self.announcement_id} ({self.state})"
+
+
+class AdmissionBucket(models.Model):
+    """Token bucket state for one Spitch operation, shared by all workers
+    when ``ADMISSION_BACKEND`` is "db"."""
+    name = models.CharField(max_length=50, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()  # Unix time of the last refill
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.1f}"
+
+
+class StoredAudio(models.Model):
+    """An audio object the pipeline put in storage.
+
+    Announcements and the cache refer to audio by URL, which can't be turned
+    back into a storage name in general (Cloudinary adds its own suffix), so
+    the name is recorded here when the file is saved.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    url = models.CharField(max_length=500, db_index=True)
+    size = models.PositiveIntegerField(default=0)
+    # The announcement the audio was generated for; later ones may reuse it
+    # through the cache.
+    announcement = models.ForeignKey(
+        Announcement, null=True, blank=True, on_delete=models.SET_NULL, related_name="stored_audio"
+    )
+    language = models.CharField(max_length=10, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class DeletionMark(models.Model):
+    """When rows of a model were last deleted.
+
+    Deleting an announcement changes no remaining row's ``updated_at``, so
+    the history endpoint also takes this into account for Last-Modified.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    deleted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.deleted_at}"
+
+
+@receiver(post_delete, sender=Announcement)
+def mark_announcement_deleted(sender, instance, **kwargs):
+    now = timezone.now()
+    if not DeletionMark.objects.filter(name="announcement").update(deleted_at=now):
+        DeletionMark.objects.get_or_create(name="announcement", defaults={"deleted_at": now})
@@ -0,0 +1,113 @@
+"""Phrase templates: announcements with a few variable slots.
+
+A template such as ``"Flight {flight} is now boarding at gate {gate}"`` is
+split into fixed phrases and slots. Fixed phrases are translated and
+synthesized once per (language, voice, tone) and kept as PCM segments; only
+the slot values are synthesized per request, and the final audio is
+stitched together in-process.
+
+Phrases are translated independently, so the target-language word order
+follows the template. That is fine for the short, formulaic announcements
+templates are meant for; free-form text should go through the regular
+pipeline.
+"""
+import string
+
+import numpy as np
+from django.conf import settings
+
+from . import audio, metrics
+from .cache import LRUCache, cache_key, normalize_text
+from .models import PhraseSegment
+
+memory = LRUCache(settings.PHRASE_SEGMENT_CACHE_MAX_BYTES)
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def parse_template(template):
+    """Split a template into ``("phrase", text)`` and ``("slot", name)`` parts."""
+    parts = []
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError as e:
+        raise TemplateError(f"Invalid template: {e}")
+    for literal, field, format_spec, conversion in parsed:
+        if literal and normalize_text(literal):
+            parts.append(("phrase", normalize_text(literal)))
+        if field is not None:
+            if not field.isidentifier() or format_spec or conversion:
+                raise TemplateError(f"Invalid slot {{{field}}}")
+            parts.append(("slot", field))
+    return parts
+
+
+def render(parts, slots):
+    """Render the plain English text of a template for the announcement record."""
+    missing = sorted({name for kind, name in parts if kind == "slot"} - set(slots))
+    if missing:
+        raise TemplateError(f"Missing slot values: {', '.join(missing)}")
+    return " ".join(value if kind == "phrase" else str(slots[value]) for kind, value in parts)
+
+
+def phrases_of(parts):
+    return list(dict.fromkeys(value for kind, value in parts if kind == "phrase"))
+
+
+def lookup_segments(phrases, target, voice, tone):
+    """Return ``phrase -> (translated_text, samples, sample_rate)`` for every
+    cached phrase."""
+    keys = {cache_key(phrase, "en", target, voice, tone): phrase for phrase in phrases}
+    found = {}
+    for key, phrase in keys.items():
+        value = memory.get(key)
+        if value is not None:
+            found[phrase] = value
+
+    missing = [key for key, phrase in keys.items() if phrase not in found]
+    if missing:
+        for segment in PhraseSegment.objects.filter(key__in=missing):
+            value = (segment.translated_text, audio.from_pcm16(bytes(segment.pcm)), segment.sample_rate)
+            memory.set(segment.key, value)
+            found[keys[segment.key]] = value
+    metrics.cache_lookups.inc(len(found), cache="phrase", result="hit")
+    metrics.cache_lookups.inc(len(keys) - len(found), cache="phrase", result="miss")
+    return found
+
+
+def store_segments(segments, target, voice, tone):
+    """Persist freshly synthesized ``phrase -> (translated_text, samples, rate)``."""
+    for phrase, (translated_text, samples, sample_rate) in segments.items():
+        key = cache_key(phrase, "en", target, voice, tone)
+        PhraseSegment.objects.update_or_create(
+            key=key,
+            defaults={
+                "phrase": phrase,
+                "target": target,
+                "voice": voice,
+                "tone": tone,
+                "translated_text": translated_text,
+                "pcm": audio.to_pcm16(samples),
+                "sample_rate": sample_rate,
+            },
+        )
+        memory.set(key, (translated_text, samples, sample_rate))
+
+
+def stitch(pieces):
+    """Join ``(samples, sample_rate)`` pieces into one WAV byte string.
+
+    Each piece is loudness-matched before the crossfade so slot values
+    synthesized today blend with phrases synthesized weeks ago.
+    """
+    rates = {rate for _, rate in pieces}
+    if len(rates) != 1:
+        raise audio.AudioFormatError(f"Segments have mixed sample rates: {sorted(rates)}")
+    rate = rates.pop()
+
+    target = settings.TEMPLATE_TARGET_DBFS
+    segments = [audio.match_loudness(audio.to_mono(samples), target) for samples, _ in pieces]
+    joined = audio.crossfade_concat(segments, rate, settings.TEMPLATE_CROSSFADE_MS)
+    return audio.write_wav(np.clip(joined, -1.0, 1.0), rate)
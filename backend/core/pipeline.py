@@ -0,0 +1,761 @@
+"""The translate -> TTS -> upload pipeline behind every announcement.
+
+Views, the job workers and anything else that produces announcement audio
+go through ``AnnouncementPipeline``. Languages are processed concurrently
+on a bounded thread pool; the worker threads only talk to Spitch and
+storage and report progress through a queue, so every DB write happens on
+the thread that drives the pipeline.
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial, wraps
+from urllib.parse import urljoin
+
+import httpx
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connections
+from django.utils import timezone
+from . import admission, audio, audio_cache, broadcast, metrics, phrases, singleflight
+from . import cache as announcement_cache
+from .models import Announcement, AnnouncementLanguage, StoredAudio
+from .spitch_client import ResilientSpitch
+
+logger = logging.getLogger(__name__)
+
+# Init Spitch client (pooled, with timeouts, retries and circuit breakers)
+spitch = ResilientSpitch(api_key=settings.SPITCH_API_KEY)
+
+VOICE_MAP = {
+    "yo": "femi",
+    "ig": "obinna",
+    "ha": "aliyu",
+    "en": "john",
+}
+
+# Progress stages reported per language.
+TRANSLATED = "translated"
+AUDIO = "audio"
+FAILED = "failed"
+
+RESULT_FIELDS = ["translated_text", "audio_url", "byte_size", "audio_format", "cached", "timings", "status", "error"]
+
+
+def absolute_url(url):
+    """Default URL builder when there is no request to build from."""
+    if url.startswith(('http://', 'https://')) or not settings.PUBLIC_BASE_URL:
+        return url
+    return urljoin(settings.PUBLIC_BASE_URL, url)
+
+
+def output_format():
+    """The configured audio output format, or WAV when no encoder for it is
+    installed."""
+    return usable_format(settings.AUDIO_OUTPUT_FORMAT)
+
+
+@lru_cache(maxsize=None)
+def usable_format(fmt):
+    """``fmt``, or WAV without an encoder for it. Resolved (and the fallback
+    logged) once per process rather than per pipeline."""
+    if audio.encoder_available(fmt):
+        return fmt
+    logger.warning("No encoder available for %s, storing WAV", fmt)
+    return "wav"
+
+
+def tracks_uploads(run):
+    """Make a pipeline run record every file it uploads as ``StoredAudio``,
+    even if it fails part way, so the retention sweep (core/retention.py)
+    can delete what nothing ends up referring to."""
+    @wraps(run)
+    def wrapper(self, *args, **kwargs):
+        self._open_uploads()
+        try:
+            return (yield from run(self, *args, **kwargs))
+        finally:
+            self._close_uploads()
+    return wrapper
+
+
+class AnnouncementPipeline:
+    def __init__(self, build_absolute_uri=None):
+        self.build_absolute_uri = build_absolute_uri or absolute_url
+        self.audio_format = output_format()
+        self.priority = admission.ROUTINE
+        self._events = queue.Queue()
+        # Per-language stage timings and failure messages for the
+        # AnnouncementLanguage rows. Written by pool threads, one key per
+        # language, and read on the driving thread once they are done.
+        self._timings = {}
+        self._errors = {}
+        # url -> (storage name, announcement id, lang, size) for each file
+        # uploaded, recorded as StoredAudio rows when the results are saved.
+        # Once a run is over, uploads still landing from languages it gave
+        # up on are deleted instead (``_closed``).
+        self._stored = {}
+        self._closed = False
+        self._upload_lock = threading.Lock()
+        # url -> WAV as synthesized, so a broadcast track doesn't have to
+        # download and decode what this run just uploaded.
+        self._generated = {}
+
+    def process(self, announcement, on_event=None, translations=None):
+        """Run the pipeline for ``announcement`` and save the results."""
+        for event in self.iter_process(announcement, translations=translations):
+            if on_event:
+                on_event(*event)
+        return announcement
+
+    @tracks_uploads
+    def iter_process(self, announcement, languages=None, translations=None):
+        """Like ``process`` but yields ``(lang, stage, data)`` events as each
+        language progresses. The announcement is saved once every language
+        has finished.
+
+        ``languages`` limits the run to some of the announcement's
+        languages; the others keep their current translation and audio.
+        ``translations`` holds translations that are already known (from a
+        long recording's segments), so only TTS runs for those languages.
+        """
+        translations = translations or {}
+        text, tone = announcement.text, announcement.tone
+        if languages is None:
+            languages = announcement.languages
+        voices = {lang: VOICE_MAP.get(lang, "john") for lang in dict.fromkeys(languages)}
+        self.priority = announcement.priority
+        rows = self._start_results(announcement, voices)
+
+        # Repeat announcements are served from the cache; only languages
+        # without a cached translation + audio go upstream.
+        cached = announcement_cache.lookup_many(text, "en", tone, voices, self.audio_format)
+        pending = {}
+        for lang in voices:
+            translated_text, audio_url, _, _ = cached.get(lang, (None, "", 0, None))
+            if audio_url:
+                yield lang, TRANSLATED, {"text": translated_text, "cached": True}
+                yield lang, AUDIO, {"url": audio_url, "cached": True}
+            else:
+                pending[lang] = translated_text or translations.get(lang)
+        logger.info(
+            "Cache hits: %s, pending: %s", sorted(set(voices) - set(pending)), sorted(pending),
+            extra={"announcement": announcement.id},
+        )
+
+        # Identical requests running right now share one upstream run per
+        # language: in this process through the flight registry, across
+        # workers through a DB lock (when enabled) and the cache.
+        flight_keys = {
+            lang: announcement_cache.cache_key(text, "en", lang, voices[lang], tone) for lang in pending
+        }
+        with singleflight.held_locks(list(flight_keys.values())) as contended:
+            if contended:
+                waited = {lang: voices[lang] for lang in pending if flight_keys[lang] in contended}
+                for lang, hit in announcement_cache.lookup_many(text, "en", tone, waited, self.audio_format).items():
+                    cached[lang] = hit
+                    if hit[1]:
+                        del pending[lang]
+                        yield lang, TRANSLATED, {"text": hit[0], "cached": True}
+                        yield lang, AUDIO, {"url": hit[1], "cached": True}
+                    else:
+                        pending[lang] = hit[0]
+
+            def task(lang, translated_text):
+                return self._process_shared(flight_keys[lang], announcement, text, lang, translated_text)
+
+            results = yield from self._run_languages(task, pending)
+            announcement_cache.store_many(text, "en", tone, {
+                lang: (voices[lang], *result) for lang, result in results.items()
+            })
+
+        self._finish(announcement, rows, self._outcomes(voices, results, cached, pending))
+
+    def update(self, announcement, text, languages, tone, on_event=None):
+        for event in self.iter_update(announcement, text, languages, tone):
+            if on_event:
+                on_event(*event)
+        return announcement
+
+    def iter_update(self, announcement, text, languages, tone):
+        """Apply an edit to a finished announcement, regenerating only what
+        it made stale.
+
+        A new text or tone (or output format) makes every language stale;
+        otherwise only added languages, and any without audio yet, are run.
+        Removed languages are dropped when the results are saved, so a failed
+        run leaves them in place.
+        """
+        languages = list(dict.fromkeys(languages))
+        if (text, tone, self.audio_format) != (announcement.text, announcement.tone, announcement.audio_format):
+            stale = languages
+        else:
+            stale = [lang for lang in languages if lang not in announcement.audio_files]
+        logger.info(
+            "Updating announcement %s, regenerating %s", announcement.id, stale,
+            extra={"announcement": announcement.id},
+        )
+
+        announcement.text, announcement.languages, announcement.tone = text, languages, tone
+        yield from self.iter_process(announcement, stale)
+
+    def process_template(self, announcement, parts, slots, on_event=None):
+        for event in self.iter_process_template(announcement, parts, slots):
+            if on_event:
+                on_event(*event)
+        return announcement
+
+    @tracks_uploads
+    def iter_process_template(self, announcement, parts, slots):
+        """Template mode: stitch cached phrase audio around per-request slot audio."""
+        tone = announcement.tone
+        self.priority = announcement.priority
+        fixed = phrases.phrases_of(parts)
+        voices = {lang: VOICE_MAP.get(lang, "john") for lang in dict.fromkeys(announcement.languages)}
+
+        rows = self._start_results(announcement, voices)
+        cached = {
+            lang: phrases.lookup_segments(fixed, lang, voice, tone)
+            for lang, voice in voices.items()
+        }
+        task = partial(self._process_template_language, announcement, parts, slots)
+        results = yield from self._run_languages(task, cached)
+
+        outcomes = {}
+        for lang in voices:
+            if lang not in results:
+                outcomes[lang] = (None, None, 0, None, False)
+                continue
+            *result, new_segments = results[lang]
+            phrases.store_segments(new_segments, lang, voices[lang], tone)
+            outcomes[lang] = (*result, False)
+        self._finish(announcement, rows, outcomes)
+
+    def process_batch(self, announcements, on_event=None):
+        for event in self.iter_process_batch(announcements):
+            if on_event:
+                on_event(*event)
+        return announcements
+
+    @tracks_uploads
+    def iter_process_batch(self, announcements):
+        """Process several already-created announcements as one unit of work.
+
+        Identical (text, language) pairs across the batch are translated,
+        synthesized and uploaded once, and all unique work shares one thread
+        pool, so the batch is bounded by ``ANNOUNCEMENT_MAX_CONCURRENCY``
+        rather than multiplying it. Events are keyed by
+        ``(normalized_text, lang)``. Rows are written with one
+        ``bulk_create`` and the announcements with one ``bulk_update``.
+        """
+        self.priority = min((a.priority for a in announcements), default=admission.ROUTINE)
+        # Unique work: (normalized text, lang) -> first announcement needing it.
+        owners = {}
+        keys = {}
+        for announcement in announcements:
+            normalized = announcement_cache.normalize_text(announcement.text)
+            keys[announcement.id] = {}
+            for lang in dict.fromkeys(announcement.languages):
+                keys[announcement.id][lang] = (normalized, lang)
+                owners.setdefault((normalized, lang), announcement)
+
+        # Cache lookups, one query batch per distinct (text, tone).
+        cached = {}
+        groups = {}
+        for announcement in announcements:
+            for lang, key in keys[announcement.id].items():
+                groups.setdefault((announcement.text, announcement.tone), {})[lang] = key
+        for (text, tone), langs in groups.items():
+            voices = {lang: VOICE_MAP.get(lang, "john") for lang in langs}
+            for lang, hit in announcement_cache.lookup_many(text, "en", tone, voices, self.audio_format).items():
+                if hit[1] or langs[lang] not in cached:
+                    cached[langs[lang]] = hit
+
+        pending = {}
+        for key, announcement in owners.items():
+            translated_text, audio_url, _, _ = cached.get(key, (None, "", 0, None))
+            if not audio_url:
+                pending[key] = (announcement, translated_text)
+        logger.info("Batch of %d: %d unique language jobs, %d to run", len(announcements), len(owners), len(pending))
+
+        def task(key, arg):
+            announcement, translated_text = arg
+            lang = key[1]
+            flight_key = announcement_cache.cache_key(
+                announcement.text, "en", lang, VOICE_MAP.get(lang, "john"), announcement.tone
+            )
+            return self._process_shared(flight_key, announcement, announcement.text, lang, translated_text, key=key)
+
+        results = yield from self._run_languages(task, pending)
+        for (text, tone), langs in groups.items():
+            announcement_cache.store_many(text, "en", tone, {
+                lang: (VOICE_MAP.get(lang, "john"), *results[key])
+                for lang, key in langs.items() if key in results
+            })
+
+        rows = []
+        for announcement in announcements:
+            announcement_rows = {}
+            outcomes = {}
+            for lang, key in keys[announcement.id].items():
+                announcement_rows[lang] = AnnouncementLanguage(
+                    announcement=announcement,
+                    language=lang,
+                    voice=VOICE_MAP.get(lang, "john"),
+                    created_at=announcement.created_at,
+                )
+                if key in results:
+                    outcomes[lang] = results[key] + (False,)
+                else:
+                    outcomes[lang] = cached.get(key, (None, None, 0, None)) + (key not in pending,)
+            self._apply_outcomes(announcement, announcement_rows, outcomes, keys[announcement.id])
+            announcement.updated_at = timezone.now()
+            self.render_broadcast(announcement)
+            rows.extend(announcement_rows.values())
+
+        with metrics.timer("db_save"):
+            AnnouncementLanguage.objects.bulk_create(rows)
+            Announcement.objects.bulk_update(
+                announcements, ["translations", "audio_files", "audio_format", "broadcast_url", "updated_at"]
+            )
+            StoredAudio.objects.bulk_create(self._stored_rows(), ignore_conflicts=True)
+
+    def _start_results(self, announcement, voices):
+        """Create (or reset, when a job is retried) a pending
+        AnnouncementLanguage row per language. Returns ``lang -> row``."""
+        existing = {row.language: row for row in announcement.results.all()}
+        new_rows = self._reset_results(announcement, voices, existing)
+        AnnouncementLanguage.objects.bulk_update(list(existing.values()), ["voice", "status", "error"])
+        AnnouncementLanguage.objects.bulk_create(new_rows)
+        return {row.language: row for row in [*existing.values(), *new_rows]}
+
+    def _reset_results(self, announcement, voices, existing):
+        """Mark the ``existing`` rows pending again and return unsaved new
+        rows for the languages that have none."""
+        new_rows = []
+        for lang, voice in voices.items():
+            row = existing.get(lang)
+            if row is None:
+                new_rows.append(AnnouncementLanguage(
+                    announcement=announcement,
+                    language=lang,
+                    voice=voice,
+                    created_at=announcement.created_at,
+                ))
+                continue
+            row.voice, row.status, row.error = voice, AnnouncementLanguage.PENDING, ""
+        return new_rows
+
+    def _outcomes(self, voices, results, cached, pending):
+        """Every language's ``(translated_text, audio_url, audio_size,
+        audio_format, cached)``, from this run's ``results`` or else the
+        cache lookup."""
+        outcomes = {}
+        for lang in voices:
+            if lang in results:
+                outcomes[lang] = results[lang] + (False,)
+            else:
+                outcomes[lang] = cached.get(lang, (None, None, 0, None)) + (lang not in pending,)
+        return outcomes
+
+    def _finish(self, announcement, rows, outcomes):
+        """Save every language's outcome in one ``bulk_update`` and the
+        announcement itself. ``outcomes`` maps language to
+        ``(translated_text, audio_url, audio_size, audio_format, cached)``.
+        Rows of languages an update removed are deleted."""
+        dropped = [rows.pop(lang).pk for lang in list(rows) if lang not in announcement.languages]
+        self._apply_outcomes(announcement, rows, outcomes)
+        self.render_broadcast(announcement)
+        with metrics.timer("db_save"):
+            if dropped:
+                AnnouncementLanguage.objects.filter(pk__in=dropped).delete()
+            AnnouncementLanguage.objects.bulk_update(list(rows.values()), RESULT_FIELDS)
+            announcement.save()
+            StoredAudio.objects.bulk_create(self._stored_rows(), ignore_conflicts=True)
+
+    def _stored_rows(self):
+        """Unsaved StoredAudio rows for the files uploaded so far; each is
+        handed out once."""
+        with self._upload_lock:
+            stored, self._stored = self._stored, {}
+        return [
+            StoredAudio(name=name, url=url, size=size, announcement_id=announcement_id, language=lang)
+            for url, (name, announcement_id, lang, size) in stored.items()
+        ]
+
+    def _open_uploads(self):
+        with self._upload_lock:
+            self._closed = False
+
+    def _close_uploads(self):
+        """End a run: record anything uploaded but not saved yet (the run
+        failed) and turn away later uploads."""
+        with self._upload_lock:
+            self._closed = True
+        rows = self._stored_rows()
+        if not rows:
+            return
+        try:
+            StoredAudio.objects.bulk_create(rows, ignore_conflicts=True)
+        except DatabaseError as e:
+            logger.warning("Could not record %d uploaded files: %s", len(rows), e)
+
+    def _apply_outcomes(self, announcement, rows, outcomes, keys=None):
+        """Fill in the language rows and the announcement's translations /
+        audio files without saving. ``keys`` maps a language to the key its
+        work ran under, when that isn't the language itself."""
+        translations = {}
+        audio_files = {}
+        formats = set()
+        for lang, (translated_text, audio_url, audio_size, audio_format, cached) in outcomes.items():
+            if translated_text:
+                translations[lang] = translated_text
+            if audio_url:
+                audio_files[lang] = audio_url
+                formats.add(audio_format)
+
+            key = keys[lang] if keys else lang
+            row = rows[lang]
+            row.translated_text = translated_text or ""
+            row.audio_url = audio_url or ""
+            row.byte_size = audio_size if audio_url else 0
+            row.audio_format = audio_format if audio_url else ""
+            row.cached = cached
+            row.timings = self._timings.get(key, {})
+            if audio_url:
+                row.status, row.error = AnnouncementLanguage.DONE, ""
+            else:
+                row.status = AnnouncementLanguage.TRANSLATED if translated_text else AnnouncementLanguage.FAILED
+                row.error = self._errors.get(key, "")
+
+        # Languages this run didn't cover (an incremental update) keep their
+        # translation and audio.
+        for lang in announcement.languages:
+            if lang not in outcomes:
+                if lang in announcement.translations:
+                    translations[lang] = announcement.translations[lang]
+                if lang in announcement.audio_files:
+                    audio_files[lang] = announcement.audio_files[lang]
+                    formats.add(announcement.audio_format)
+
+        # Update the announcement with translations and audio files. Its
+        # single format is WAV if any language had to fall back to it; the
+        # rows have each language's own.
+        announcement.translations = translations
+        announcement.audio_files = audio_files
+        announcement.audio_format = "wav" if "wav" in formats else self.audio_format
+
+    def render_broadcast(self, announcement):
+        """Render the combined broadcast track for an announcement that asked
+        for one and set ``broadcast_url`` (without saving). Languages with
+        no audio are left out."""
+        urls = [announcement.audio_files[lang] for lang in dict.fromkeys(announcement.languages)
+                if lang in announcement.audio_files]
+        if not announcement.broadcast or not urls:
+            announcement.broadcast_url = ""
+            return
+
+        rate = settings.BROADCAST_SAMPLE_RATE
+        names = dict(StoredAudio.objects.filter(url__in=urls).values_list("url", "name"))
+        with metrics.timer("broadcast"):
+            segments = []
+            for url in urls:
+                try:
+                    data = self._generated.get(url) or self.load_audio(url, names.get(url))
+                    segments.append(broadcast.decode(data, rate))
+                except Exception as e:
+                    logger.warning("Leaving %s out of the broadcast track: %s", url, e)
+            track = broadcast.render(segments, rate)
+        announcement.broadcast_url, _, _ = self.upload_audio(announcement, "broadcast", track)
+
+    def load_audio(self, url, name=None):
+        """Stored audio bytes, from storage when the name is known."""
+        if name:
+            path = audio_cache.disk.get(name) if settings.AUDIO_CACHE_ENABLED else None
+            try:
+                if path is not None:
+                    with open(path, "rb") as f:
+                        return f.read()
+            except FileNotFoundError:
+                pass  # Evicted meanwhile.
+            with default_storage.open(name) as f:
+                return f.read()
+        response = httpx.get(url, timeout=30, follow_redirects=True)
+        response.raise_for_status()
+        return response.content
+
+    def report(self, lang, stage, **data):
+        """Called from worker threads to publish progress."""
+        if stage == FAILED:
+            self._errors[lang] = data.get("error", "")
+        self._events.put((lang, stage, data))
+
+    @contextmanager
+    def timed(self, lang, stage):
+        """Add the time spent in the block to ``lang``'s ``<stage>_ms`` and
+        to the stage metrics. ``lang`` may be a batch's ``(text, lang)`` key."""
+        started = time.monotonic()
+        try:
+            with metrics.timer(stage, lang[1] if isinstance(lang, tuple) else lang):
+                yield
+        finally:
+            timings = self._timings.setdefault(lang, {})
+            key = f"{stage}_ms"
+            timings[key] = timings.get(key, 0) + round((time.monotonic() - started) * 1000)
+
+    def _run_languages(self, task, languages):
+        """Fan the per-language work out over a bounded thread pool.
+
+        ``languages`` maps each language to an extra argument for ``task``,
+        which is called as ``task(lang, arg)``. Each language runs as its own
+        task, so end-to-end latency is set by the slowest language instead of
+        the sum of all of them. Failures and timeouts are isolated per
+        language.
+
+        This is a generator: it yields progress events as the tasks report
+        them and returns ``lang -> task result`` once they are all done.
+        """
+        results = {}
+        if not languages:
+            return results
+        max_workers = max(1, min(settings.ANNOUNCEMENT_MAX_CONCURRENCY, len(languages)))
+        # Languages beyond the pool size queue up behind the first batch,
+        # so the overall deadline grows with the number of rounds.
+        rounds = -(-len(languages) // max_workers)
+        deadline = settings.ANNOUNCEMENT_LANGUAGE_TIMEOUT * rounds
+        deadline_at = time.monotonic() + deadline
+
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="announce")
+        try:
+            futures = {}
+            for lang, arg in languages.items():
+                future = pool.submit(self._run_task, task, lang, arg)
+                future.add_done_callback(lambda f, lang=lang: self._events.put((lang, None, f)))
+                futures[lang] = future
+
+            pending = set(futures)
+            while pending:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    lang, stage, data = self._events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if stage is not None:
+                    yield lang, stage, data
+                    continue
+
+                pending.discard(lang)
+                try:
+                    results[lang] = data.result()
+                except Exception as e:
+                    logger.warning("Processing failed for %s: %s", lang, e)
+                    self._errors[lang] = str(e)
+                    yield lang, FAILED, {"error": str(e)}
+
+            for lang in pending:
+                logger.warning("Processing timed out for %s after %ss", lang, deadline)
+                self._errors[lang] = f"Timed out after {deadline}s"
+                yield lang, FAILED, {"error": self._errors[lang]}
+        finally:
+            # Don't hold the response on stragglers; their upstream calls are
+            # bounded by the per-language timeout anyway.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    def _run_task(self, task, lang, arg):
+        """Pool-thread entry point: Spitch calls are admitted at this
+        announcement's priority."""
+        try:
+            with admission.priority(self.priority):
+                return task(lang, arg)
+        finally:
+            # The DB-backed admission buckets may have opened a connection
+            # for this thread.
+            connections.close_all()
+
+    def _process_language(self, announcement, text, lang, translated_text=None, key=None):
+        """Translate, synthesize and upload one language.
+
+        Returns ``(translated_text, audio_url, audio_size, audio_format)``;
+        the text and URL may be ``None`` when that stage failed. Translation is skipped when
+        ``translated_text`` is already known. Progress is reported under
+        ``key`` (the language by default).
+        """
+        key = key or lang
+        # 1. Translate
+        if translated_text is None:
+            try:
+                with self.timed(key, "translate"):
+                    translated_text = self.translate(text, lang)
+            except Exception as e:
+                error_msg = f"Translation failed for {lang}: {str(e)}"
+                logger.warning(error_msg)
+                self.report(key, FAILED, error=error_msg)
+                return None, None, 0, None
+        self.report(key, TRANSLATED, text=translated_text)
+
+        # 2. TTS (generate audio bytes) and upload
+        try:
+            with self.timed(key, "synthesize"):
+                audio_bytes = self.synthesize(translated_text, lang)
+            audio_url, audio_size, audio_format = self.upload_audio(announcement, lang, audio_bytes, key=key)
+        except Exception as e:
+            error_msg = f"TTS failed for {lang}: {str(e)}"
+            logger.warning(error_msg)
+            self.report(key, FAILED, error=error_msg)
+            return translated_text, None, 0, None
+
+        self.report(key, AUDIO, url=audio_url)
+        return translated_text, audio_url, audio_size, audio_format
+
+    def _process_shared(self, flight_key, announcement, text, lang, translated_text=None, key=None):
+        """``_process_language``, coalesced with any identical work already
+        running in this process (see ``singleflight``)."""
+        key = key or lang
+        result, shared = singleflight.flights.run(
+            flight_key,
+            lambda: self._process_language(announcement, text, lang, translated_text, key=key),
+            timeout=settings.ANNOUNCEMENT_LANGUAGE_TIMEOUT,
+            accept=lambda result: bool(result[1]),
+        )
+        if shared:
+            logger.info("Shared in-flight result for %s", lang)
+            self.report(key, TRANSLATED, text=result[0], shared=True)
+            self.report(key, AUDIO, url=result[1], shared=True)
+        return result
+
+    def _process_template_language(self, announcement, parts, slots, lang, cached):
+        """Build one language of a template announcement.
+
+        Missing phrase segments are translated and synthesized (and returned
+        so the caller can cache them); slot values are synthesized as-is.
+        Falls back to the full-sentence pipeline if stitching fails.
+        Returns ``(translated_text, audio_url, audio_size, audio_format,
+        new_segments)``.
+        """
+        new_segments = {}
+        try:
+            pieces = []
+            words = []
+            for kind, value in parts:
+                if kind == "phrase":
+                    if value not in cached and value not in new_segments:
+                        with self.timed(lang, "translate"):
+                            translated = self.translate(value, lang)
+                        with self.timed(lang, "synthesize"):
+                            samples, rate = audio.read_wav(self.synthesize(translated, lang))
+                        new_segments[value] = (translated, audio.to_mono(samples), rate)
+                    translated, samples, rate = cached.get(value) or new_segments[value]
+                else:
+                    translated = str(slots[value])
+                    with self.timed(lang, "synthesize"):
+                        samples, rate = audio.read_wav(self.synthesize(translated, lang))
+                words.append(translated)
+                pieces.append((samples, rate))
+
+            translated_text = " ".join(words)
+            self.report(lang, TRANSLATED, text=translated_text)
+            with self.timed(lang, "stitch"):
+                stitched = phrases.stitch(pieces)
+            audio_url, audio_size, audio_format = self.upload_audio(announcement, lang, stitched)
+            self.report(lang, AUDIO, url=audio_url)
+            return translated_text, audio_url, audio_size, audio_format, new_segments
+        except Exception as e:
+            logger.warning("Template stitching failed for %s, synthesizing full text: %s", lang, e)
+            return (*self._process_language(announcement, announcement.text, lang), new_segments)
+
+    def translate(self, text, lang):
+        logger.debug("Translating to %s", lang)
+        translation = spitch.text.translate(
+            text=text,
+            source="en",
+            target=lang,
+        )
+        translated_text = translation.text
+        logger.info("Translation for %s successful: %.100s", lang, translated_text)
+        return translated_text
+
+    def synthesize(self, text, lang):
+        voice = VOICE_MAP.get(lang, "john")
+        logger.debug("Generating TTS for %s with voice %s", lang, voice)
+        resp = spitch.speech.generate(
+            text=text,
+            language=lang,
+            voice=voice,
+        )
+        audio_bytes = resp.http_response.content
+        metrics.bytes_total.inc(len(audio_bytes), kind="tts")
+        logger.info("TTS generated for %s, audio size: %d bytes", lang, len(audio_bytes))
+        return audio_bytes
+
+    def encode_output(self, wav_bytes):
+        """Trim silence and encode synthesized WAV audio in the output format.
+
+        Returns ``(audio_bytes, format)``; falls back to the untouched WAV if
+        the audio can't be decoded or encoded.
+        """
+        try:
+            samples, rate = audio.read_wav(wav_bytes)
+            samples = audio.to_mono(samples)
+            if settings.AUDIO_TRIM_SILENCE:
+                samples = audio.trim_silence(samples, rate, settings.AUDIO_SILENCE_THRESHOLD_DBFS)
+            encoded = audio.encode(samples, rate, self.audio_format, settings.AUDIO_OUTPUT_BITRATE)
+        except (audio.AudioFormatError, OSError) as e:
+            logger.warning("Audio encoding failed, storing original WAV: %s", e)
+            return wav_bytes, "wav"
+        logger.debug("Encoded %d bytes of WAV as %d bytes of %s", len(wav_bytes), len(encoded), self.audio_format)
+        return encoded, self.audio_format
+
+    def upload_audio(self, announcement, lang, audio_bytes, key=None):
+        """Encode and store one language's audio. Returns ``(url, size,
+        format)``; the format is WAV when encoding fell back to it."""
+        key = key or lang
+        wav_bytes = audio_bytes
+        with self.timed(key, "encode"):
+            audio_bytes, fmt = self.encode_output(audio_bytes)
+
+        # Generate unique filename for Cloudinary
+        filename = f"announcement_{announcement.id}_{lang}_{uuid.uuid4().hex}.{fmt}"
+
+        # Save using Django's file storage (should upload to Cloudinary)
+        content_file = ContentFile(audio_bytes)
+        with self.timed(key, "upload"):
+            saved_path = default_storage.save(filename, content_file)
+
+        # Get the FULL Cloudinary URL
+        audio_url = default_storage.url(saved_path)
+
+        # Ensure it's a full URL (not relative path)
+        if not audio_url.startswith(('http://', 'https://')):
+            # If it's a relative path, construct full URL
+            audio_url = self.build_absolute_uri(audio_url)
+
+        with self._upload_lock:
+            late = self._closed
+            if not late:
+                self._stored[audio_url] = (saved_path, announcement.id, lang, len(audio_bytes))
+                self._generated[audio_url] = wav_bytes
+        if late:
+            # The run gave up on this language and has saved its results;
+            # nothing will ever refer to this file.
+            default_storage.delete(saved_path)
+            raise RuntimeError(f"Announcement {announcement.id} was saved before its {lang} audio was uploaded")
+
+        if settings.AUDIO_CACHE_ENABLED:
+            # Write-through, so the first playback doesn't go back to storage.
+            try:
+                audio_cache.disk.put(saved_path, audio_bytes)
+            except OSError as e:
+                logger.warning("Could not cache audio %s locally: %s", saved_path, e)
+
+        metrics.bytes_total.inc(len(audio_bytes), kind="stored")
+        logger.info("Audio uploaded for %s: %s", lang, audio_url)
+        return audio_url, len(audio_bytes), fmt
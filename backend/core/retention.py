@@ -0,0 +1,167 @@
+"""Retention for generated audio.
+
+Every file the pipeline uploads is recorded as ``StoredAudio``. A sweep
+(``manage.py sweep_storage``) deletes, in batches:
+
+- orphaned audio: files no announcement refers to any more, because the
+  announcement failed and was deleted, or the audio was superseded. Files
+  younger than ``RETENTION_ORPHAN_GRACE_SECONDS`` are left alone, since an
+  announcement still in flight may be about to save them;
+- expired audio, older than ``RETENTION_MAX_AGE_DAYS``;
+- the oldest audio beyond ``RETENTION_MAX_BYTES`` in total.
+
+Expired and over-quota audio is detached from its announcements first, so
+they keep their text and translations but stop handing out dead links.
+Files are deleted from storage in the background once each batch commits
+(see ``storage.release``).
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from . import storage
+from .models import Announcement, AnnouncementLanguage, StoredAudio
+
+logger = logging.getLogger(__name__)
+
+ORPHANED = "orphaned"
+EXPIRED = "expired"
+OVER_QUOTA = "over_quota"
+REASONS = (ORPHANED, EXPIRED, OVER_QUOTA)
+
+# Names the pipeline gives the files it uploads.
+GENERATED_PREFIX = "announcement_"
+
+
+def orphaned(now):
+    cutoff = now - timedelta(seconds=settings.RETENTION_ORPHAN_GRACE_SECONDS)
+    return (
+        StoredAudio.objects.filter(created_at__lt=cutoff)
+        .exclude(url__in=AnnouncementLanguage.objects.values("audio_url"))
+        .exclude(url__in=Announcement.objects.exclude(broadcast_url="").values("broadcast_url"))
+    )
+
+
+def plan(now=None):
+    """``reason -> [(id, size), ...]`` of the ``StoredAudio`` rows a sweep
+    would delete, oldest first. Each row is listed under one reason only."""
+    now = now or timezone.now()
+    oldest_first = ("created_at", "id")
+    planned = {ORPHANED: list(orphaned(now).order_by(*oldest_first).values_list("id", "size"))}
+    taken = {pk for pk, _ in planned[ORPHANED]}
+
+    planned[EXPIRED] = []
+    if settings.RETENTION_MAX_AGE_DAYS:
+        cutoff = now - timedelta(days=settings.RETENTION_MAX_AGE_DAYS)
+        expired = StoredAudio.objects.filter(created_at__lt=cutoff).order_by(*oldest_first)
+        planned[EXPIRED] = [(pk, size) for pk, size in expired.values_list("id", "size") if pk not in taken]
+        taken.update(pk for pk, _ in planned[EXPIRED])
+
+    planned[OVER_QUOTA] = []
+    if settings.RETENTION_MAX_BYTES:
+        total = StoredAudio.objects.aggregate(total=Sum("size"))["total"] or 0
+        excess = total - sum(size for rows in planned.values() for _, size in rows) - settings.RETENTION_MAX_BYTES
+        rows = StoredAudio.objects.order_by(*oldest_first).values_list("id", "size").iterator()
+        for pk, size in rows:
+            if excess <= 0:
+                break
+            if pk not in taken:
+                planned[OVER_QUOTA].append((pk, size))
+                excess -= size
+    return planned
+
+
+def sweep(now=None, dry_run=False, batch_size=None):
+    """Delete what ``plan`` selects, ``batch_size`` files per transaction.
+    Returns ``reason -> (files, bytes)``."""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    planned = plan(now)
+    report = {reason: (len(rows), sum(size for _, size in rows)) for reason, rows in planned.items()}
+    if dry_run:
+        return report
+
+    for reason, rows in planned.items():
+        ids = [pk for pk, _ in rows]
+        for start in range(0, len(ids), batch_size):
+            names = delete(ids[start:start + batch_size], detach=reason != ORPHANED)
+            logger.info("Swept %d %s audio files", len(names), reason)
+    return report
+
+
+def delete(ids, detach=False):
+    """Delete the ``StoredAudio`` rows ``ids`` and their files. With
+    ``detach``, first take their URLs off the announcements using them."""
+    with transaction.atomic():
+        urls = set(StoredAudio.objects.filter(id__in=ids).values_list("url", flat=True))
+        if detach:
+            detach_audio(urls)
+        return storage.release(urls)
+
+
+def detach_audio(urls):
+    """Clear every announcement reference to ``urls``."""
+    results = AnnouncementLanguage.objects.filter(audio_url__in=urls)
+    affected = set(results.values_list("announcement_id", flat=True))
+    results.update(audio_url="", byte_size=0)
+
+    announcements = list(
+        Announcement.objects.filter(Q(id__in=affected) | Q(broadcast_url__in=urls))
+        .only("id", "audio_files", "broadcast_url")
+    )
+    now = timezone.now()
+    for announcement in announcements:
+        announcement.audio_files = {
+            lang: url for lang, url in announcement.audio_files.items() if url not in urls
+        }
+        if announcement.broadcast_url in urls:
+            announcement.broadcast_url = ""
+        # History ETags are built from updated_at.
+        announcement.updated_at = now
+    Announcement.objects.bulk_update(announcements, ["audio_files", "broadcast_url", "updated_at"])
+
+
+def totals():
+    """``(files, bytes)`` of all tracked audio."""
+    stats = StoredAudio.objects.aggregate(total=Sum("size"))
+    return StoredAudio.objects.count(), stats["total"] or 0
+
+
+def untracked():
+    """Generated files in storage that ``StoredAudio`` doesn't know about:
+    uploaded before it existed, or by a process that died mid-run. Lists
+    the storage root, which can be slow on a remote backend."""
+    _, files = default_storage.listdir("")
+    names = [name for name in files if name.startswith(GENERATED_PREFIX)]
+    known = set(StoredAudio.objects.filter(name__in=names).values_list("name", flat=True))
+    return [name for name in names if name not in known]
+
+
+def adopt(names):
+    """Start tracking ``names`` so sweeps handle them. A file an
+    announcement still uses is recorded under that URL, so only files
+    nothing uses become orphans."""
+    rows = []
+    for name in names:
+        stem = os.path.splitext(name)[0]
+        url = (
+            AnnouncementLanguage.objects.filter(audio_url__contains=stem).values_list("audio_url", flat=True).first()
+            or Announcement.objects.filter(broadcast_url__contains=stem).values_list("broadcast_url", flat=True).first()
+            or default_storage.url(name)
+        )
+        # announcement_<id>_<language>_<uuid>.<ext>
+        parts = stem.split("_")
+        language = parts[2] if len(parts) == 4 else ""
+        announcement_id = int(parts[1]) if len(parts) == 4 and parts[1].isdigit() else None
+        if announcement_id is not None and not Announcement.objects.filter(id=announcement_id).exists():
+            announcement_id = None
+        rows.append(StoredAudio(
+            name=name, url=url, size=default_storage.size(name), announcement_id=announcement_id, language=language,
+        ))
+    StoredAudio.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
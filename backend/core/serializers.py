@@ -1,7 +1,20 @@
 from rest_framework import serializers
+from .audio import MIME_TYPES
 from .models import Announcement
 
 class AnnouncementSerializer(serializers.ModelSerializer):
+    audio_mime_type = serializers.SerializerMethodField()
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # Optional projection: only serialize the named fields.
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def get_audio_mime_type(self, obj):
+        return MIME_TYPES.get(obj.audio_format, "application/octet-stream")
+
     class Meta:
         model = Announcement
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
@@ -0,0 +1,210 @@
+"""Coalesce identical in-flight translate/TTS/upload work.
+
+When several requests need the same (text, language, voice, tone) at the
+same moment, the first one becomes the leader and does the work; the
+others wait on its ``Flight`` and share the result instead of calling
+Spitch and uploading the same audio again.
+
+``flights`` only sees requests in this process. With
+``SINGLE_FLIGHT_DB_LOCK`` enabled on PostgreSQL, ``held_locks`` adds an
+advisory lock per key so requests in other worker processes wait for the
+leader and then pick its result up from the announcement cache.
+
+``async_flights`` and ``async_held_locks`` are the same for coroutines.
+"""
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        self.result, self.error = result, error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """The leader's result, or ``None`` if it failed or took too long."""
+        if not self._done.wait(timeout) or self.error is not None:
+            return None
+        return self.result
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """Return ``(flight, is_leader)`` for ``key``."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(result, error)
+
+    def run(self, key, work, timeout=None, accept=lambda result: True):
+        """Run ``work()`` once per concurrent ``key``.
+
+        Returns ``(result, shared)``; ``shared`` is true when the result came
+        from another caller's run. If the leader raises, returns a result
+        ``accept`` rejects, or doesn't finish within ``timeout``, followers
+        run ``work()`` themselves.
+        """
+        flight, leader = self.claim(key)
+        if not leader:
+            result = flight.wait(timeout)
+            if result is not None and accept(result):
+                return result, True
+            return work(), False
+        try:
+            result = work()
+        except BaseException as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result)
+        return result, False
+
+    def __len__(self):
+        return len(self._flights)
+
+
+flights = SingleFlight()
+
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for coroutines running on one event loop."""
+
+    def __init__(self):
+        self._flights = {}
+
+    async def run(self, key, work, timeout=None, accept=lambda result: True):
+        """Await ``work()`` once per concurrent ``key``; see ``SingleFlight.run``."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(flight), timeout)
+            except asyncio.TimeoutError:
+                result = None
+            if result is not None and accept(result):
+                return result, True
+            return await work(), False
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        result = None
+        try:
+            result = await work()
+            return result, False
+        finally:
+            del self._flights[key]
+            # Followers treat None (the leader failed) as "do it yourself".
+            flight.set_result(result)
+
+    def __len__(self):
+        return len(self._flights)
+
+
+async_flights = AsyncSingleFlight()
+
+
+_warned_pooled = False
+
+
+def db_locks_enabled():
+    """Whether ``held_locks`` takes advisory locks.
+
+    They are session-level: behind a transaction-mode pooler (marked by
+    ``DISABLE_SERVER_SIDE_CURSORS``) the unlock could run on another backend
+    and leak the lock, so they are refused there.
+    """
+    global _warned_pooled
+    if not settings.SINGLE_FLIGHT_DB_LOCK or connection.vendor != "postgresql":
+        return False
+    if connection.settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        if not _warned_pooled:
+            _warned_pooled = True
+            logger.warning("SINGLE_FLIGHT_DB_LOCK needs a direct connection; ignored behind a transaction pooler")
+        return False
+    return True
+
+
+def _lock_id(key):
+    # Advisory lock ids are signed 64-bit; keys are hex digests.
+    return int(key[:16], 16) - 2 ** 63
+
+
+@contextmanager
+def held_locks(keys):
+    """Hold a PostgreSQL advisory lock per key for the duration of the block.
+
+    Keys another worker already holds are waited for (up to
+    ``SINGLE_FLIGHT_LOCK_TIMEOUT`` seconds) and yielded as a set, so the
+    caller can look them up in the cache again before doing the work
+    itself. A no-op yielding an empty set unless ``db_locks_enabled()``.
+    """
+    if not keys or not db_locks_enabled():
+        yield set()
+        return
+
+    held = []
+    contended = set()
+    try:
+        with connection.cursor() as cursor:
+            # Sorted, so two workers locking overlapping sets can't deadlock.
+            for key in sorted(set(keys)):
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [_lock_id(key)])
+                if cursor.fetchone()[0]:
+                    held.append(key)
+                    continue
+                contended.add(key)
+                try:
+                    cursor.execute(
+                        "SELECT set_config('lock_timeout', %s, false)",
+                        [f"{int(settings.SINGLE_FLIGHT_LOCK_TIMEOUT * 1000)}ms"],
+                    )
+                    cursor.execute("SELECT pg_advisory_lock(%s)", [_lock_id(key)])
+                    held.append(key)
+                except DatabaseError as e:
+                    logger.warning("Gave up waiting for another worker on %s: %s", key[:12], e)
+                finally:
+                    cursor.execute("SELECT set_config('lock_timeout', '0', false)")
+        yield contended
+    finally:
+        if held:
+            with connection.cursor() as cursor:
+                for key in held:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [_lock_id(key)])
+
+
+@asynccontextmanager
+async def async_held_locks(keys):
+    """``held_locks`` for async code. The locks are taken and released
+    through ``sync_to_async``, which runs both on the request's one sync
+    thread, so on the same DB connection."""
+    if not keys or not db_locks_enabled():
+        yield set()
+        return
+    locks = held_locks(keys)
+    contended = await sync_to_async(locks.__enter__)()
+    try:
+        yield contended
+    finally:
+        await sync_to_async(locks.__exit__)(None, None, None)
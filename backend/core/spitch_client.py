@@ -0,0 +1,284 @@
+"""A resilient wrapper around the Spitch SDK client.
+
+``ResilientSpitch`` has the same ``text.translate`` / ``speech.generate`` /
+``speech.transcribe`` shape as ``spitch.Spitch``, so the rest of the code
+(and the test fakes) don't care which one they get. On top of the SDK it
+adds:
+
+* one shared, tuned httpx connection pool for every thread in the process,
+* per-operation timeouts,
+* jittered exponential backoff on failures that are safe to retry
+  (connection errors, timeouts, 429 and 5xx),
+* a circuit breaker per (operation, language) that fails fast while that
+  part of the upstream is unhealthy, so a dead language doesn't tie up
+  pool threads for the full timeout on every request,
+* admission control (``core.admission``): every attempt first takes a
+  token from the operation's rate limit, in priority order.
+
+``AsyncResilientSpitch`` does the same for ``spitch.AsyncSpitch``.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+from django.conf import settings
+from spitch import APIConnectionError, APIStatusError, AsyncSpitch, Spitch
+
+from . import admission, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while a breaker is open."""
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open breaker.
+
+    After ``threshold`` consecutive failures the breaker opens and every
+    call fails fast for ``reset_after`` seconds. Then a single trial call is
+    let through: success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold=5, reset_after=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_after:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial_running = False
+
+    def retry_after(self):
+        """Seconds until the breaker lets a trial call through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_after - (self.clock() - self.opened_at))
+
+
+def is_retryable(error):
+    if isinstance(error, APIConnectionError):  # includes timeouts
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _retry_after_header(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _http_client_options():
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.SPITCH_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SPITCH_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.SPITCH_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(settings.SPITCH_GENERATE_TIMEOUT, connect=settings.SPITCH_CONNECT_TIMEOUT),
+        "follow_redirects": True,
+    }
+
+
+def shared_http_client():
+    """The httpx client (and connection pool) used for all Spitch calls."""
+    return httpx.Client(**_http_client_options())
+
+
+def shared_async_http_client():
+    """The async equivalent, for ``AsyncResilientSpitch``."""
+    return httpx.AsyncClient(**_http_client_options())
+
+
+class ResilientSpitch:
+    def __init__(self, api_key=None, base_url=None, client=None, timeouts=None,
+                 max_retries=None, backoff=None, backoff_max=None,
+                 breaker_threshold=None, breaker_reset=None, sleep=time.sleep, admission_controller=None):
+        # Retries are ours; the SDK's own retry loop would hide failures from
+        # the breaker and ignore our timeouts.
+        self.client = client or Spitch(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=shared_http_client(),
+        )
+        self.timeouts = {
+            "translate": settings.SPITCH_TRANSLATE_TIMEOUT,
+            "generate": settings.SPITCH_GENERATE_TIMEOUT,
+            "transcribe": settings.SPITCH_TRANSCRIBE_TIMEOUT,
+            **(timeouts or {}),
+        }
+        self.max_retries = settings.SPITCH_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.SPITCH_RETRY_BACKOFF if backoff is None else backoff
+        self.backoff_max = settings.SPITCH_RETRY_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.breaker_threshold = settings.SPITCH_BREAKER_THRESHOLD if breaker_threshold is None else breaker_threshold
+        self.breaker_reset = settings.SPITCH_BREAKER_RESET if breaker_reset is None else breaker_reset
+        self.sleep = sleep
+        self.admission = admission_controller or admission.controller
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+
+        self.text = SimpleNamespace(translate=self.translate)
+        self.speech = SimpleNamespace(generate=self.generate, transcribe=self.transcribe)
+
+    def translate(self, text, source, target, **kwargs):
+        return self._call("translate", target, self.client.text.translate,
+                          text=text, source=source, target=target, **kwargs)
+
+    def generate(self, text, language, voice, **kwargs):
+        return self._call("generate", language, self.client.speech.generate,
+                          text=text, language=language, voice=voice, **kwargs)
+
+    def transcribe(self, content, language, **kwargs):
+        return self._call("transcribe", language, self.client.speech.transcribe,
+                          content=content, language=language, **kwargs)
+
+    def breaker(self, operation, language):
+        key = (operation, language)
+        with self._breakers_lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return self._breakers[key]
+
+    def backoff_delay(self, attempt, error=None):
+        """Full-jitter exponential backoff, honouring Retry-After on 429s."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        retry_after = _retry_after_header(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _call(self, operation, lang, method, /, **kwargs):
+        breaker = self.breaker(operation, lang)
+        kwargs.setdefault("timeout", self.timeouts[operation])
+
+        for attempt in range(self.max_retries + 1):
+            # Wait for rate-limit capacity first, so a long queue doesn't
+            # hold the breaker's half-open trial slot.
+            try:
+                self.admission.acquire(operation)
+            except admission.Overloaded:
+                metrics.spitch_events.inc(operation=operation, event="shed")
+                raise
+            self._check_breaker(operation, lang, breaker)
+            try:
+                result = method(**kwargs)
+            except Exception as e:
+                delay = self._retry_delay(operation, lang, breaker, attempt, e)
+                if delay is None:
+                    raise
+                self.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    def _check_breaker(self, operation, lang, breaker):
+        if not breaker.allow():
+            metrics.spitch_events.inc(operation=operation, event="circuit_open")
+            raise CircuitOpenError(
+                f"Spitch {operation} for {lang} is failing; "
+                f"retrying in {breaker.retry_after():.0f}s"
+            )
+
+    def _retry_delay(self, operation, lang, breaker, attempt, error):
+        """Record a failed attempt. Returns how long to back off before the
+        next one, or ``None`` when the error should be raised."""
+        if not is_retryable(error):
+            # The request was bad, not the upstream.
+            breaker.record_success()
+            return None
+        breaker.record_failure()
+        if attempt == self.max_retries:
+            return None
+        delay = self.backoff_delay(attempt, error)
+        metrics.spitch_events.inc(operation=operation, event="retry")
+        logger.warning(
+            "Spitch %s for %s failed (%s), retry %d in %.2fs", operation, lang, error, attempt + 1, delay
+        )
+        return delay
+
+
+class AsyncResilientSpitch(ResilientSpitch):
+    """``ResilientSpitch`` around ``spitch.AsyncSpitch``, for async views.
+
+    Same breakers, retries and admission control, but every method returns
+    a coroutine and waits without blocking the event loop. The connection
+    pool belongs to the loop the client is first used on.
+    """
+
+    def __init__(self, api_key=None, base_url=None, client=None, sleep=asyncio.sleep, **kwargs):
+        client = client or AsyncSpitch(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=shared_async_http_client(),
+        )
+        super().__init__(client=client, sleep=sleep, **kwargs)
+
+    async def _call(self, operation, lang, method, /, **kwargs):
+        breaker = self.breaker(operation, lang)
+        kwargs.setdefault("timeout", self.timeouts[operation])
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.admission.acquire_async(operation)
+            except admission.Overloaded:
+                metrics.spitch_events.inc(operation=operation, event="shed")
+                raise
+            self._check_breaker(operation, lang, breaker)
+            try:
+                result = await method(**kwargs)
+            except Exception as e:
+                delay = self._retry_delay(operation, lang, breaker, attempt, e)
+                if delay is None:
+                    raise
+                await self.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
@@ -0,0 +1,53 @@
+"""Clean-up of generated audio that nothing refers to any more.
+
+Announcements and the translation cache point at stored audio by URL;
+``StoredAudio`` maps those URLs back to storage names. Deleting from
+storage (a network round trip per file with Cloudinary) happens on a
+background thread after the transaction commits, so requests don't wait
+for it.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import audio_cache
+from . import cache as announcement_cache
+from .models import AnnouncementLanguage, CachedTranslation, StoredAudio
+
+logger = logging.getLogger(__name__)
+
+_cleanup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-cleanup")
+
+
+def release(urls):
+    """Delete the stored audio at ``urls`` that no announcement uses any
+    more, along with cache entries pointing at it. Returns the storage names
+    queued for deletion."""
+    urls = set(urls)
+    urls -= set(AnnouncementLanguage.objects.filter(audio_url__in=urls).values_list("audio_url", flat=True))
+    if not urls:
+        return []
+    announcement_cache.invalidate(CachedTranslation.objects.filter(audio_url__in=urls))
+    stored = StoredAudio.objects.filter(url__in=urls)
+    names = list(stored.values_list("name", flat=True))
+    stored.delete()
+    if names:
+        transaction.on_commit(lambda: _cleanup.submit(delete_files, names))
+    return names
+
+
+def delete_files(names):
+    for name in names:
+        audio_cache.disk.discard(name)
+        try:
+            default_storage.delete(name)
+            logger.info("Deleted superseded audio %s", name)
+        except Exception as e:
+            logger.warning("Failed to delete audio %s: %s", name, e)
+
+
+def wait_for_cleanup():
+    """Block until every deletion queued so far has run."""
+    _cleanup.submit(lambda: None).result()
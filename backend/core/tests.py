@@ -1,3 +1,1737 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from rest_framework.test import APIClient
+
+from . import (
+    admission, audio, audio_cache, broadcast, jobs, live, metrics, phrases, pipeline, retention, singleflight,
+    storage, transcription,
+)
+from . import cache as announcement_cache
+from .async_views import AnnouncementHistoryAsyncView, CreateAnnouncementAsyncView, TranscribeAnnouncementAsyncView
+from .fake_spitch import FakeSpitchServer
+from .log import JsonFormatter, QueuedStreamHandler
+from .management.commands.bench_load import compare
+from .pipeline import AnnouncementPipeline
+from .spitch_client import AsyncResilientSpitch, CircuitBreaker, CircuitOpenError, ResilientSpitch
+from .models import (
+    Announcement,
+    AnnouncementJob,
+    AnnouncementLanguage,
+    CacheCounter,
+    CachedTranslation,
+    PhraseSegment,
+    StoredAudio,
+)
+
+def tone_wav(seconds=0.2, rate=24000, freq=440.0, amplitude=0.3):
+    t = np.arange(int(seconds * rate), dtype=np.float32) / rate
+    return audio.write_wav(amplitude * np.sin(2 * np.pi * freq * t), rate)
+
+
+IN_MEMORY_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class FakeSpitch:
+    """Stand-in for the Spitch client that records calls instead of hitting the API."""
+
+    def __init__(self, delay=0.0, fail_languages=()):
+        self.delay = delay
+        self.fail_languages = set(fail_languages)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.text = SimpleNamespace(translate=self.translate)
+        self.speech = SimpleNamespace(generate=self.generate, transcribe=self.transcribe)
+
+    def _enter(self, name):
+        with self._lock:
+            self.calls.append(name)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+
+    def translate(self, text, source, target, **kwargs):
+        self._enter("translate")
+        if target in self.fail_languages:
+            raise RuntimeError("upstream error")
+        return SimpleNamespace(text=f"[{target}] {text}")
+
+    def generate(self, text, language, voice, **kwargs):
+        self._enter("generate")
+        return SimpleNamespace(http_response=SimpleNamespace(content=tone_wav(0.05 + 0.01 * len(text))))
+
+    def transcribe(self, content, language, **kwargs):
+        self._enter("transcribe")
+        return SimpleNamespace(text="Flight 220 is now boarding")
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class CreateAnnouncementViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def post_announcement(self, fake, **data):
+        payload = {"text": "Flight 220 is now boarding", "languages": ["yo", "ig", "ha"]}
+        payload.update(data)
+        with mock.patch("core.pipeline.spitch", fake):
+            return self.client.post("/api/announce/", payload, format="json")
+
+    def test_languages_run_concurrently(self):
+        fake = FakeSpitch(delay=0.05)
+        response = self.post_announcement(fake)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(response.data["translations"]), ["yo", "ig", "ha"])
+        self.assertEqual(list(response.data["audio_files"]), ["yo", "ig", "ha"])
+        self.assertGreater(fake.max_active, 1)
+
+    def test_failure_is_isolated_per_language(self):
+        response = self.post_announcement(FakeSpitch(fail_languages=["ig"]))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(response.data["translations"]), {"yo", "ha"})
+        self.assertEqual(set(response.data["audio_files"]), {"yo", "ha"})
+
+    @override_settings(ANNOUNCEMENT_LANGUAGE_TIMEOUT=0.05)
+    def test_slow_language_times_out(self):
+        fake = FakeSpitch(delay=0.2)
+        with mock.patch("core.pipeline.spitch", fake):
+            response = self.post_announcement(fake, languages=["yo"])
+            # The abandoned language keeps running; let it finish against
+            # the fake rather than leak into later tests.
+            deadline = time.monotonic() + 5
+            while len(singleflight.flights) and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["translations"], {})
+        self.assertEqual(Announcement.objects.count(), 1)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class AnnouncementCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        announcement_cache.memory.clear()
+
+    def post_announcement(self, fake, text="Flight 220 is now boarding", languages=("yo", "ha")):
+        with mock.patch("core.pipeline.spitch", fake):
+            return self.client.post(
+                "/api/announce/", {"text": text, "languages": list(languages)}, format="json"
+            )
+
+    def test_repeat_announcement_skips_upstream(self):
+        first = self.post_announcement(FakeSpitch())
+        fake = FakeSpitch()
+        second = self.post_announcement(fake, text="  Flight 220 is   now boarding ")
+
+        self.assertEqual(fake.calls, [])
+        self.assertEqual(second.data["audio_files"], first.data["audio_files"])
+        self.assertEqual(second.data["translations"], first.data["translations"])
+        self.assertEqual(CacheCounter.objects.get(name="hits").value, 2)
+        self.assertEqual(CacheCounter.objects.get(name="misses").value, 2)
+
+    def test_only_uncached_languages_go_upstream(self):
+        self.post_announcement(FakeSpitch(), languages=["yo"])
+        fake = FakeSpitch()
+        self.post_announcement(fake, languages=["yo", "ig"])
+
+        self.assertEqual(fake.calls, ["translate", "generate"])
+        self.assertEqual(CachedTranslation.objects.get(target="yo").hit_count, 1)
+
+    def test_invalidated_entry_is_not_served_from_memory(self):
+        self.post_announcement(FakeSpitch())
+        call_command("invalidate_cache", "--target", "yo", stdout=mock.MagicMock())
+        # Simulate another worker that still holds the entry in memory.
+        key = announcement_cache.cache_key("Flight 220 is now boarding", "en", "yo", "femi", "neutral")
+        announcement_cache.memory.set(key, ("stale", "http://example.com/stale.wav", "wav", 100))
+
+        fake = FakeSpitch()
+        response = self.post_announcement(fake)
+
+        self.assertEqual(fake.calls, ["translate", "generate"])
+        self.assertNotEqual(response.data["translations"]["yo"], "stale")
+
+    def test_lru_evicts_by_size(self):
+        lru = announcement_cache.LRUCache(max_bytes=10)
+        lru.set("a", ("12345", ""))
+        lru.set("b", ("12345", ""))
+        lru.get("a")
+        lru.set("c", ("123", ""))
+
+        self.assertIsNotNone(lru.get("a"))
+        self.assertIsNone(lru.get("b"))
+        self.assertLessEqual(lru.size, 10)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class TemplateAnnouncementTests(TestCase):
+    template = "Flight {flight} is now boarding at gate {gate}"
+
+    def setUp(self):
+        self.client = APIClient()
+        phrases.memory.clear()
+
+    def post_template(self, fake, **slots):
+        payload = {"template": self.template, "slots": slots, "languages": ["yo", "ha"]}
+        with mock.patch("core.pipeline.spitch", fake):
+            return self.client.post("/api/announce/", payload, format="json")
+
+    def test_fixed_phrases_are_synthesized_once(self):
+        first = self.post_template(FakeSpitch(), flight="220", gate="B12")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(first.data["text"], "Flight 220 is now boarding at gate B12")
+        self.assertEqual(set(first.data["audio_files"]), {"yo", "ha"})
+        self.assertEqual(PhraseSegment.objects.count(), 4)
+
+        phrases.memory.clear()
+        fake = FakeSpitch()
+        second = self.post_template(fake, flight="318", gate="C4")
+
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(fake.calls.count("translate"), 0)
+        self.assertEqual(fake.calls.count("generate"), 4)
+        self.assertEqual(second.data["translations"]["yo"], "[yo] Flight 318 [yo] is now boarding at gate C4")
+
+    def test_missing_slot_is_rejected(self):
+        response = self.post_template(FakeSpitch(), flight="220")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("gate", response.data["error"])
+
+    def test_stitch_matches_loudness_and_crossfades(self):
+        rate = 24000
+        quiet = audio.read_wav(tone_wav(0.5, rate, amplitude=0.05))[0]
+        loud = audio.read_wav(tone_wav(0.5, rate, amplitude=0.5))[0]
+
+        stitched, out_rate = audio.read_wav(phrases.stitch([(quiet, rate), (loud, rate)]))
+
+        xf = int(rate * 15 / 1000)
+        self.assertEqual(out_rate, rate)
+        self.assertEqual(stitched.size, quiet.size + loud.size - xf)
+        first, second = stitched[: quiet.size - xf], stitched[quiet.size:]
+        self.assertAlmostEqual(audio.rms_dbfs(first), audio.rms_dbfs(second), delta=0.5)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class AsyncAnnouncementTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        announcement_cache.memory.clear()
+
+    def test_async_announcement_is_processed_by_worker(self):
+        response = self.client.post(
+            "/api/announce/",
+            {"text": "Gate change for flight 220", "languages": ["yo", "ig"], "async": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        status_url = f"/api/announce/{response.data['id']}/status/"
+
+        pending = self.client.get(status_url)
+        self.assertEqual(pending.data["state"], "pending")
+        self.assertEqual(pending.data["languages"], {"yo": "pending", "ig": "pending"})
+
+        with mock.patch("core.pipeline.spitch", FakeSpitch(fail_languages=["ig"])):
+            jobs.work("test-worker", once=True)
+
+        done = self.client.get(status_url)
+        self.assertEqual(done.data["state"], "done")
+        self.assertEqual(done.data["languages"], {"yo": "audio", "ig": "failed"})
+        self.assertEqual(set(done.data["announcement"]["audio_files"]), {"yo"})
+
+    def test_async_transcription_keeps_upload_until_worker_runs(self):
+        upload = SimpleUploadedFile("clip.webm", b"webm-bytes", content_type="audio/webm")
+        response = self.client.post(
+            "/api/transcribe/",
+            {"audio": upload, "languages": '["ha"]', "async": "true"},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 202)
+        job = AnnouncementJob.objects.get(announcement_id=response.data["id"])
+        self.assertEqual(bytes(job.audio), b"webm-bytes")
+
+        with mock.patch("core.pipeline.spitch", FakeSpitch()), \
+                mock.patch("core.transcription.convert_webm_to_wav", side_effect=lambda path: path):
+            jobs.work("test-worker", once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, "done")
+        self.assertIsNone(job.audio)
+        self.assertEqual(job.announcement.text, "Flight 220 is now boarding")
+
+    def test_job_is_claimed_once(self):
+        for text in ("first", "second"):
+            jobs.enqueue(Announcement.objects.create(text=text, languages=["yo"]))
+
+        first = jobs.claim_next("a")
+        second = jobs.claim_next("b")
+
+        self.assertNotEqual(first.id, second.id)
+        self.assertIsNone(jobs.claim_next("c"))
+        self.assertEqual(first.attempts, 1)
+
+    @override_settings(ANNOUNCEMENT_JOB_STALE_AFTER=60)
+    def test_only_jobs_without_a_heartbeat_are_requeued(self):
+        for text in ("slow", "dead"):
+            jobs.enqueue(Announcement.objects.create(text=text, languages=["yo"]))
+        slow, dead = jobs.claim_next("a"), jobs.claim_next("b")
+        long_ago = timezone.now() - timedelta(minutes=10)
+        AnnouncementJob.objects.filter(id=slow.id).update(started_at=long_ago)
+        AnnouncementJob.objects.filter(id=dead.id).update(started_at=long_ago, heartbeat_at=long_ago)
+
+        jobs.requeue_stale()
+
+        self.assertEqual(AnnouncementJob.objects.get(id=slow.id).state, "running")
+        self.assertEqual(AnnouncementJob.objects.get(id=dead.id).state, "pending")
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    # The heartbeat thread writes through its own connection, which
+    # TestCase's open transaction would lock out.
+    @override_settings(ANNOUNCEMENT_JOB_HEARTBEAT=0.01)
+    def test_running_job_keeps_its_heartbeat(self):
+        jobs.enqueue(Announcement.objects.create(text="slow", languages=["yo"]))
+        job = jobs.claim_next("a")
+        long_ago = timezone.now() - timedelta(minutes=10)
+        AnnouncementJob.objects.filter(id=job.id).update(heartbeat_at=long_ago)
+
+        with jobs.heartbeat(job):
+            deadline = time.monotonic() + 5
+            while AnnouncementJob.objects.get(id=job.id).heartbeat_at == long_ago and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertGreater(AnnouncementJob.objects.get(id=job.id).heartbeat_at, long_ago)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ScheduledAnnouncementTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        announcement_cache.memory.clear()
+
+    def schedule(self, minutes):
+        when = timezone.now() + timedelta(minutes=minutes)
+        return self.client.post(
+            "/api/announce/",
+            {"text": "Boarding closes for flight 220", "languages": ["yo"], "scheduled_for": when.isoformat()},
+            format="json",
+        )
+
+    def test_scheduled_announcement_is_precomputed_within_lead_window(self):
+        soon = self.schedule(10)
+        later = self.schedule(60)
+        self.assertEqual(soon.status_code, 202)
+        self.assertIn("scheduled_for", soon.data)
+
+        # Regular workers leave scheduled announcements to the scheduler.
+        self.assertIsNone(jobs.claim_next("worker"))
+
+        with mock.patch("core.pipeline.spitch", FakeSpitch()):
+            jobs.work("scheduler", once=True, scheduled=True, lead=30 * 60)
+
+        done = self.client.get(f"/api/announce/{soon.data['id']}/status/")
+        self.assertEqual(done.data["state"], "done")
+        self.assertEqual(set(done.data["announcement"]["audio_files"]), {"yo"})
+        self.assertEqual(self.client.get(f"/api/announce/{later.data['id']}/status/").data["state"], "pending")
+
+    def test_overdue_announcements_are_claimed_first(self):
+        late = self.schedule(-5)
+        self.schedule(5)
+        self.assertEqual(jobs.claim_next("scheduler", scheduled=True, lead=0).announcement_id, late.data["id"])
+        self.assertIsNone(jobs.claim_next("scheduler", scheduled=True, lead=0))
+
+    def test_invalid_scheduled_for_is_rejected(self):
+        response = self.client.post(
+            "/api/announce/",
+            {"text": "Hello", "languages": ["yo"], "scheduled_for": "next tuesday"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Announcement.objects.exists())
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class UpdateAnnouncementTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        announcement_cache.memory.clear()
+
+    def create(self, text="Flight 220 is now boarding", languages=("yo", "ig")):
+        with mock.patch("core.pipeline.spitch", FakeSpitch()):
+            return self.client.post("/api/announce/", {"text": text, "languages": list(languages)}, format="json").data
+
+    def patch(self, pk, fake, **data):
+        with mock.patch("core.pipeline.spitch", fake), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/announce/{pk}/", data, format="json")
+        storage.wait_for_cleanup()
+        return response
+
+    def stored_names(self, urls):
+        return set(StoredAudio.objects.filter(url__in=urls).values_list("name", flat=True))
+
+    def test_adding_a_language_only_generates_that_language(self):
+        created = self.create()
+        fake = FakeSpitch()
+        response = self.patch(created["id"], fake, languages=["yo", "ig", "ha"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(fake.calls), ["generate", "translate"])
+        self.assertEqual(set(response.data["audio_files"]), {"yo", "ig", "ha"})
+        for lang in ("yo", "ig"):
+            self.assertEqual(response.data["audio_files"][lang], created["audio_files"][lang])
+
+    def test_new_text_regenerates_and_deletes_superseded_audio(self):
+        created = self.create()
+        old_names = self.stored_names(created["audio_files"].values())
+        self.assertEqual(len(old_names), 2)
+
+        fake = FakeSpitch()
+        response = self.patch(created["id"], fake, text="Flight 220 is now closed")
+
+        self.assertEqual(fake.calls.count("translate"), 2)
+        self.assertEqual(response.data["translations"]["yo"], "[yo] Flight 220 is now closed")
+        for name in old_names:
+            self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredAudio.objects.filter(name__in=old_names).exists())
+        self.assertFalse(CachedTranslation.objects.filter(text="flight 220 is now boarding").exists())
+
+    def test_audio_still_used_elsewhere_is_kept(self):
+        first = self.create()
+        second = self.create()  # served from the cache: same files
+        self.assertEqual(first["audio_files"], second["audio_files"])
+
+        self.patch(first["id"], FakeSpitch(), languages=["yo"])
+
+        name, = self.stored_names([first["audio_files"]["ig"]])
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(AnnouncementLanguage.objects.filter(announcement_id=first["id"]).count(), 1)
+
+    def test_failed_update_keeps_removed_languages(self):
+        created = self.create()
+        announcement = Announcement.objects.get(pk=created["id"])
+        with mock.patch("core.pipeline.spitch", FakeSpitch()), \
+                mock.patch("core.cache.lookup_many", side_effect=RuntimeError("cache down")), \
+                self.assertRaises(RuntimeError):
+            AnnouncementPipeline().update(announcement, "Flight 220 is now closed", ["yo"], "neutral")
+
+        self.assertEqual(set(announcement.results.values_list("language", flat=True)), {"yo", "ig"})
+
+    def test_queued_announcement_is_updated_in_place(self):
+        response = self.client.post(
+            "/api/announce/", {"text": "Gate change", "languages": ["yo"], "async": True}, format="json"
+        )
+        fake = FakeSpitch()
+        patched = self.patch(response.data["id"], fake, text="Gate change for flight 220", languages=["ha"])
+
+        self.assertEqual(patched.status_code, 202)
+        self.assertEqual(fake.calls, [])
+        job = AnnouncementJob.objects.get(announcement_id=response.data["id"])
+        self.assertEqual(job.progress, {"ha": "pending"})
+        self.assertEqual(job.announcement.text, "Gate change for flight 220")
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class StreamAnnouncementTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        announcement_cache.memory.clear()
+
+    def read_events(self, response):
+        events = []
+        for block in b"".join(response.streaming_content).decode().strip().split("\n\n"):
+            name, data = block.split("\n", 1)
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+        return events
+
+    def test_events_per_language_then_full_record(self):
+        with mock.patch("core.pipeline.spitch", FakeSpitch(fail_languages=["ig"])):
+            response = self.client.post(
+                "/api/announce/stream/",
+                {"text": "Flight 220 is now boarding", "languages": ["yo", "ig"]},
+                format="json",
+            )
+            events = self.read_events(response)
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], "created")
+        self.assertEqual(names[-1], "complete")
+        self.assertLess(names.index("translated"), names.index("audio"))
+        self.assertIn(("failed", "ig"), [(name, data.get("language")) for name, data in events])
+        self.assertEqual(events[-1][1]["translations"], {"yo": "[yo] Flight 220 is now boarding"})
+        self.assertEqual(events[-1][1]["id"], events[0][1]["id"])
+
+
+def encode_webm(wav_bytes):
+    """Encode a WAV to WebM/Opus with ffmpeg, like the browser recorder does."""
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = os.path.join(tmp, "in.wav"), os.path.join(tmp, "out.webm")
+        with open(src, "wb") as f:
+            f.write(wav_bytes)
+        subprocess.run(["ffmpeg", "-v", "error", "-i", src, "-c:a", "libopus", dst], check=True)
+        with open(dst, "rb") as f:
+            return f.read()
+
+
+@skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class StreamingConversionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.webm = encode_webm(tone_wav(1.5, rate=48000))
+
+    def temp_file_pcm(self):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as f:
+            f.write(self.webm)
+        wav_path = transcription.convert_webm_to_wav(f.name)
+        try:
+            with open(wav_path, "rb") as wav:
+                samples, rate = audio.read_wav(wav.read())
+        finally:
+            os.unlink(f.name)
+            os.unlink(wav_path)
+        self.assertEqual(rate, 16000)
+        return audio.to_pcm16(samples)
+
+    def test_pipe_output_matches_temp_file_path(self):
+        chunks = [self.webm[i:i + 4096] for i in range(0, len(self.webm), 4096)]
+        pcm = transcription.convert_stream_to_pcm(chunks, size_hint=1)
+
+        self.assertEqual(bytes(pcm), self.temp_file_pcm())
+
+    def test_upload_is_decoded_while_received(self):
+        fake = FakeSpitch()
+        captured = []
+
+        def transcribe(content, language, **kwargs):
+            captured.append(content)
+            return SimpleNamespace(text="Flight 220 is now boarding")
+
+        fake.speech.transcribe = transcribe
+        upload = SimpleUploadedFile("clip.webm", self.webm, content_type="audio/webm")
+        with mock.patch("core.pipeline.spitch", fake), \
+                mock.patch("core.transcription.transcribe_upload") as temp_file_path:
+            response = APIClient().post(
+                "/api/transcribe/", {"audio": upload, "languages": '["yo"]'}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, 201)
+        temp_file_path.assert_not_called()
+        self.assertEqual(audio.read_wav(captured[0])[1], 16000)
+        self.assertEqual(captured[0][44:], self.temp_file_pcm())
+
+
+class NativeConversionTests(TestCase):
+    def test_resample_preserves_tone(self):
+        for rate in (48000, 44100, 24000, 8000):
+            t = np.arange(rate) / rate
+            samples = np.sin(2 * np.pi * 1000 * t).astype(np.float32)
+
+            out = audio.resample(samples, rate, 16000)
+
+            expected = np.sin(2 * np.pi * 1000 * np.arange(out.size) / 16000)
+            self.assertEqual(out.size, 16000)
+            self.assertLess(np.abs(out[300:-300] - expected[300:-300]).max(), 1e-3)
+
+    def test_stereo_float_wav_is_downmixed_and_resampled(self):
+        rate = 44100
+        t = np.arange(rate // 2) / rate
+        left = 0.5 * np.sin(2 * np.pi * 440 * t)
+        data = np.stack([left, left], axis=1).astype("<f4").tobytes()
+        # 32-bit float stereo with a streaming (placeholder) data size.
+        wav = struct.pack(
+            "<4sI4s4sIHHIIHH4sI", b"RIFF", 0xFFFFFFFF, b"WAVE", b"fmt ", 16,
+            audio.WAVE_FORMAT_IEEE_FLOAT, 2, rate, rate * 8, 8, 32, b"data", 0xFFFFFFFF,
+        ) + data
+
+        samples, out_rate = audio.read_wav(transcription.native_audio_conversion(wav))
+
+        self.assertEqual(out_rate, 16000)
+        self.assertEqual(samples.ndim, 1)
+        self.assertAlmostEqual(samples.size, 8000, delta=1)
+        self.assertAlmostEqual(float(np.abs(samples[500:-500]).max()), 0.5, delta=0.01)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=4096)
+    def test_large_uploads_spill_to_disk(self):
+        wav = tone_wav(1.0, rate=16000)
+        handler = transcription.StreamingConversionUploadHandler()
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file("audio", "clip.wav", "audio/wav", len(wav))
+        for start in range(0, len(wav), 1024):
+            handler.receive_data_chunk(wav[start:start + 1024], start)
+        upload = handler.file_complete(len(wav))
+        self.addCleanup(upload.close)
+
+        self.assertTrue(upload.file._rolled)
+        self.assertEqual(b"".join(upload.chunks()), wav)
+        self.assertEqual(len(upload.pcm), 2 * 16000)
+
+    def test_webm_is_left_to_ffmpeg(self):
+        with self.assertRaises(audio.AudioFormatError):
+            transcription.native_audio_conversion(b"\x1aE\xdf\xa3webm")
+
+    @override_settings(STORAGES=IN_MEMORY_STORAGES, AUDIO_OUTPUT_FORMAT="wav")
+    def test_wav_upload_skips_ffmpeg(self):
+        captured = []
+        fake = FakeSpitch()
+        fake.speech.transcribe = lambda content, language, **kw: (
+            captured.append(content) or SimpleNamespace(text="Flight 220 is now boarding")
+        )
+        upload = SimpleUploadedFile("clip.wav", tone_wav(1.0, rate=48000), content_type="audio/wav")
+        with mock.patch("core.pipeline.spitch", fake), mock.patch("subprocess.Popen") as popen:
+            response = APIClient().post(
+                "/api/transcribe/", {"audio": upload, "languages": '["yo"]'}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, 201)
+        popen.assert_not_called()
+        samples, rate = audio.read_wav(captured[0])
+        self.assertEqual((rate, samples.size), (16000, 16000))
+
+
+def speech_with_pauses(spans, rate=16000):
+    """Alternating tone/silence spans in seconds, starting with a tone."""
+    pieces = []
+    for i, seconds in enumerate(spans):
+        t = np.arange(int(seconds * rate), dtype=np.float32) / rate
+        pieces.append(0.3 * np.sin(2 * np.pi * 300 * t) if i % 2 == 0 else np.zeros_like(t))
+    return np.concatenate(pieces).astype(np.float32)
+
+
+class LongTranscriptionTests(TestCase):
+    def test_split_cuts_in_pauses_within_max_length(self):
+        rate = 16000
+        samples = speech_with_pauses([8, 0.6, 7, 0.4, 9, 1, 30, 0.5], rate)
+
+        bounds = audio.split_at_silences(samples, rate, max_seconds=20)
+
+        self.assertEqual([round(start / rate, 1) for start, _ in bounds], [0.0, 15.8, 25.5, 45.5])
+        self.assertTrue(all(end - start <= 20 * rate for start, end in bounds))
+        self.assertEqual(audio.split_at_silences(np.zeros(3 * rate, dtype=np.float32), rate, 20), [])
+
+    @override_settings(
+        STORAGES=IN_MEMORY_STORAGES, AUDIO_OUTPUT_FORMAT="wav",
+        TRANSCRIBE_LONG_AUDIO_SECONDS=3, TRANSCRIBE_SEGMENT_SECONDS=2,
+    )
+    def test_long_recording_is_transcribed_and_translated_in_segments(self):
+        wav = audio.write_wav(speech_with_pauses([1.5, 0.5, 1.5, 0.5, 1.5]), 16000)
+        fake = FakeSpitch()
+        fake.speech.transcribe = lambda content, language, **kw: (
+            fake._enter("transcribe") or SimpleNamespace(text=f"part {audio.read_wav(content)[0].size // 8000}")
+        )
+        upload = SimpleUploadedFile("briefing.wav", wav, content_type="audio/wav")
+        with mock.patch("core.pipeline.spitch", fake):
+            response = APIClient().post(
+                "/api/transcribe/", {"audio": upload, "languages": '["yo", "ha"]'}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(fake.calls.count("transcribe"), 3)
+        # Segments were translated; the joined text wasn't translated again.
+        self.assertEqual(fake.calls.count("translate"), 6)
+        self.assertEqual(fake.calls.count("generate"), 2)
+        self.assertEqual(response.data["text"], "part 3 part 4 part 3")
+        self.assertEqual(response.data["translations"]["yo"], "[yo] part 3 [yo] part 4 [yo] part 3")
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class OutputEncodingTests(TestCase):
+    def setUp(self):
+        announcement_cache.memory.clear()
+        # These tests swap encoders in and out.
+        pipeline.usable_format.cache_clear()
+        self.addCleanup(pipeline.usable_format.cache_clear)
+
+    def padded_tone(self, rate=24000):
+        silence = np.zeros(rate // 2, dtype=np.float32)
+        samples, _ = audio.read_wav(tone_wav(1.0, rate=rate))
+        return np.concatenate([silence, samples, silence])
+
+    def post_announcement(self):
+        with mock.patch("core.pipeline.spitch", FakeSpitch()):
+            return APIClient().post(
+                "/api/announce/", {"text": "Flight 220 is now boarding", "languages": ["yo"]}, format="json"
+            )
+
+    def test_trim_silence_keeps_padding(self):
+        trimmed = audio.trim_silence(self.padded_tone(), 24000, pad_ms=80)
+
+        self.assertAlmostEqual(trimmed.size, 24000 + 2 * 1920, delta=240)
+        silence = np.zeros(2400, dtype=np.float32)
+        self.assertIs(audio.trim_silence(silence, 24000), silence)
+
+    @skipUnless(audio.encoder_available("mp3") and audio.encoder_available("ogg"), "no mp3/ogg encoder")
+    def test_compressed_formats_are_much_smaller(self):
+        samples = self.padded_tone()
+        wav = audio.write_wav(samples, 24000)
+        for fmt in ("mp3", "ogg"):
+            encoded = audio.encode(samples, 24000, fmt, "32k")
+            self.assertLess(len(encoded), len(wav) / 4)
+
+    @override_settings(AUDIO_OUTPUT_FORMAT="mp3")
+    def test_falls_back_to_wav_without_encoder(self):
+        with mock.patch("core.audio.encoder_available", return_value=False), \
+                self.assertLogs("core.pipeline", "WARNING") as logs:
+            response = self.post_announcement()
+            self.post_announcement()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["audio_format"], "wav")
+        self.assertEqual(response.data["audio_mime_type"], "audio/wav")
+        self.assertTrue(response.data["audio_files"]["yo"].endswith(".wav"))
+        self.assertEqual(sum("No encoder available" in line for line in logs.output), 1)
+
+    def test_ffmpeg_without_the_encoder_is_not_enough(self):
+        with mock.patch("core.audio.soundfile", None), \
+                mock.patch("core.audio.ffmpeg_encoders", return_value=frozenset({"aac", "libopus"})):
+            self.assertFalse(audio.encoder_available("mp3"))
+            self.assertTrue(audio.encoder_available("ogg"))
+
+    @override_settings(AUDIO_OUTPUT_FORMAT="mp3")
+    def test_audio_that_failed_to_encode_is_labelled_wav(self):
+        with mock.patch("core.audio.encoder_available", return_value=True), \
+                mock.patch("core.audio.encode", side_effect=audio.AudioFormatError("no lame")):
+            response = self.post_announcement()
+
+        self.assertEqual(response.data["audio_format"], "wav")
+        self.assertTrue(response.data["audio_files"]["yo"].endswith(".wav"))
+        self.assertEqual(AnnouncementLanguage.objects.get().audio_format, "wav")
+        # Cached as what it is, so it isn't served again as mp3.
+        self.assertEqual(CachedTranslation.objects.get().audio_format, "wav")
+
+    def test_soundfile_errors_are_format_errors(self):
+        fake = mock.Mock()
+        fake.available_subtypes.return_value = {"OPUS": "Opus"}
+        fake.write.side_effect = RuntimeError("Error opening <_io.BytesIO>: Unsupported sample rate")
+        with mock.patch("core.audio.soundfile", fake), self.assertRaises(audio.AudioFormatError):
+            audio.encode(self.padded_tone(), 22050, "ogg")
+
+    @skipUnless(audio.encoder_available("mp3"), "no mp3 encoder")
+    @override_settings(AUDIO_OUTPUT_FORMAT="mp3")
+    def test_announcement_audio_is_stored_as_mp3(self):
+        response = self.post_announcement()
+
+        self.assertEqual(response.data["audio_mime_type"], "audio/mpeg")
+        self.assertTrue(response.data["audio_files"]["yo"].endswith(".mp3"))
+        self.assertEqual(CachedTranslation.objects.get().audio_format, "mp3")
+
+    def test_cached_audio_in_another_format_is_regenerated(self):
+        with override_settings(AUDIO_OUTPUT_FORMAT="wav"):
+            self.post_announcement()
+        announcement_cache.memory.clear()
+        with mock.patch("core.audio.encoder_available", return_value=True), \
+                mock.patch("core.audio.encode", return_value=b"ID3mp3"), \
+                override_settings(AUDIO_OUTPUT_FORMAT="mp3"):
+            fake = FakeSpitch()
+            with mock.patch("core.pipeline.spitch", fake):
+                response = APIClient().post(
+                    "/api/announce/", {"text": "Flight 220 is now boarding", "languages": ["yo"]}, format="json"
+                )
+
+        self.assertEqual(fake.calls, ["generate"])
+        self.assertTrue(response.data["audio_files"]["yo"].endswith(".mp3"))
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, AUDIO_OUTPUT_FORMAT="wav")
+class BroadcastTrackTests(TestCase):
+    def setUp(self):
+        announcement_cache.memory.clear()
+
+    def post_announcement(self, fake):
+        with mock.patch("core.pipeline.spitch", fake):
+            return APIClient().post(
+                "/api/announce/",
+                {"text": "Flight 220 is now boarding", "languages": ["ig", "yo"], "broadcast": True},
+                format="json",
+            )
+
+    def read_track(self, url):
+        name = StoredAudio.objects.get(url=url, language="broadcast").name
+        with default_storage.open(name) as f:
+            return audio.read_wav(f.read())
+
+    @override_settings(BROADCAST_CHIME=False, BROADCAST_GAP_MS=100)
+    def test_render_joins_segments_at_one_loudness(self):
+        rate = 24000
+        quiet, _ = audio.read_wav(tone_wav(0.5, rate=rate, amplitude=0.05))
+        loud, _ = audio.read_wav(tone_wav(0.5, rate=rate, amplitude=0.8))
+
+        track, track_rate = audio.read_wav(broadcast.render([quiet, loud], rate))
+
+        self.assertEqual(track_rate, rate)
+        self.assertEqual(track.size, rate + rate // 10)
+        first, second = track[:rate // 2], track[-(rate // 2):]
+        self.assertAlmostEqual(audio.rms_dbfs(first), audio.rms_dbfs(second), delta=0.5)
+
+    def test_announcement_gets_one_track_with_every_language(self):
+        response = self.post_announcement(FakeSpitch())
+
+        self.assertEqual(response.status_code, 201)
+        samples, rate = self.read_track(response.data["broadcast_url"])
+        speech = sum(audio.read_wav(tone_wav(0.05 + 0.01 * len(f"[{lang}] Flight 220 is now boarding")))[0].size
+                     for lang in ("ig", "yo"))
+        self.assertGreater(samples.size, speech + int(rate * broadcast.CHIME_SECONDS))
+
+    def test_cached_languages_are_read_back_from_storage(self):
+        self.post_announcement(FakeSpitch())
+        announcement_cache.memory.clear()
+        fake = FakeSpitch()
+        response = self.post_announcement(fake)
+
+        self.assertEqual(fake.calls, [])
+        self.assertTrue(response.data["broadcast_url"])
+        self.read_track(response.data["broadcast_url"])
+
+
+class ResilientSpitchTests(TestCase):
+    def setUp(self):
+        self.server = FakeSpitchServer()
+        self.addCleanup(self.server.close)
+        self.delays = []
+        self.client = ResilientSpitch(
+            api_key="test", base_url=self.server.url, max_retries=2,
+            breaker_threshold=3, breaker_reset=60, sleep=self.delays.append,
+        )
+
+    def test_retries_transient_errors_over_one_pool(self):
+        self.server.fail("/v1/translate", (503, 0), (429, 0))
+
+        result = self.client.text.translate(text="Boarding", source="en", target="yo")
+
+        self.assertEqual(result.text, "[yo] translated")
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.delays), 2)
+        # Keep-alive: every attempt reused the same connection.
+        self.assertEqual(len({port for _, port in self.server.requests}), 1)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.fail("/v1/translate", (400, 0))
+
+        with self.assertRaises(Exception):
+            self.client.text.translate(text="Boarding", source="en", target="yo")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_slow_call_times_out(self):
+        self.server.fail("/v1/speech", (200, 0.5), (200, 0.5), (200, 0.5))
+        client = ResilientSpitch(
+            api_key="test", base_url=self.server.url, timeouts={"generate": 0.1},
+            max_retries=1, sleep=self.delays.append,
+        )
+
+        started = time.monotonic()
+        with self.assertRaises(Exception):
+            client.speech.generate(text="Boarding", language="yo", voice="femi")
+        self.assertLess(time.monotonic() - started, 0.45)
+
+    def test_breaker_fails_fast_per_language(self):
+        self.server.fail("/v1/speech", *[(500, 0)] * 3)
+        with self.assertRaises(Exception):
+            self.client.speech.generate(text="Boarding", language="yo", voice="femi")
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.speech.generate(text="Boarding", language="yo", voice="femi")
+        self.assertEqual(len(self.server.requests), 3)
+        # Other languages and operations are unaffected.
+        self.client.speech.generate(text="Boarding", language="ha", voice="aliyu")
+        self.client.text.translate(text="Boarding", source="en", target="yo")
+
+    def test_half_open_breaker_lets_one_trial_through(self):
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=1, reset_after=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        now[0] = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class AnnouncementHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(5):
+            lang = "yo" if i % 2 else "ha"
+            announcement = Announcement.objects.create(
+                text=f"Announcement {i}", languages=["yo", "ha"],
+                translations={lang: f"[{lang}] {i}"}, audio_files={},
+            )
+            AnnouncementLanguage.objects.create(
+                announcement=announcement, language=lang, status=AnnouncementLanguage.TRANSLATED,
+            )
+
+    def get_history(self, url="/api/history/", **headers):
+        return self.client.get(url, **headers)
+
+    def test_cursor_pages_through_everything_once(self):
+        seen = []
+        url = "/api/history/?limit=2"
+        while url:
+            response = self.get_history(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [item["id"] for item in response.data]
+            link = response.get("Link")
+            url = link[1:link.index(">")] if link else None
+
+        self.assertEqual(seen, list(Announcement.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+
+    def test_fields_projection_and_filters(self):
+        response = self.get_history("/api/history/?fields=text,audio_mime_type&language=yo")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(set(response.data[0]), {"id", "text", "audio_mime_type"})
+        self.assertEqual(self.get_history("/api/history/?fields=bogus").status_code, 400)
+        self.assertEqual(self.get_history("/api/history/?since=2999-01-01").data, [])
+
+    def test_unchanged_page_is_not_modified(self):
+        first = self.get_history()
+        etag = first["ETag"]
+
+        with mock.patch("core.views.AnnouncementSerializer") as serializer:
+            again = self.get_history(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        serializer.assert_not_called()
+        self.assertEqual(
+            self.get_history(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304
+        )
+
+        announcement = Announcement.objects.order_by("-id").first()
+        announcement.translations = {"ig": "[ig] updated"}
+        announcement.save()
+        self.assertEqual(self.get_history(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleting_an_announcement_moves_last_modified(self):
+        Announcement.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        first = self.get_history("/api/history/?limit=2")
+
+        # The rows left on the page are no newer than the client's copy.
+        Announcement.objects.order_by("-id").first().delete()
+        response = self.get_history("/api/history/?limit=2", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(parse_http_date(response["Last-Modified"]), parse_http_date(first["Last-Modified"]))
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class AnnouncementLanguageTests(TestCase):
+    def setUp(self):
+        announcement_cache.memory.clear()
+
+    def post_announcement(self, fake):
+        with mock.patch("core.pipeline.spitch", fake):
+            return APIClient().post(
+                "/api/announce/",
+                {"text": "Flight 220 is now boarding", "languages": ["yo", "ig", "ha"]},
+                format="json",
+            )
+
+    def test_each_language_gets_a_row(self):
+        response = self.post_announcement(FakeSpitch(fail_languages=["ig"]))
+
+        rows = {row.language: row for row in AnnouncementLanguage.objects.filter(announcement_id=response.data["id"])}
+        self.assertEqual(rows["yo"].status, AnnouncementLanguage.DONE)
+        self.assertEqual(rows["yo"].audio_url, response.data["audio_files"]["yo"])
+        self.assertGreater(rows["yo"].byte_size, 0)
+        self.assertEqual(set(rows["yo"].timings), {"translate_ms", "synthesize_ms", "encode_ms", "upload_ms"})
+        self.assertEqual(rows["ig"].status, AnnouncementLanguage.FAILED)
+        self.assertIn("upstream error", rows["ig"].error)
+        # The JSON fields in the response are unchanged.
+        self.assertEqual(set(response.data["translations"]), {"yo", "ha"})
+
+    def test_cache_hits_are_recorded(self):
+        self.post_announcement(FakeSpitch())
+        response = self.post_announcement(FakeSpitch())
+
+        rows = AnnouncementLanguage.objects.filter(announcement_id=response.data["id"])
+        self.assertTrue(all(row.cached and row.status == AnnouncementLanguage.DONE for row in rows))
+        self.assertTrue(all(row.byte_size > 0 for row in rows))
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class BatchAnnouncementTests(TestCase):
+    def setUp(self):
+        announcement_cache.memory.clear()
+
+    def post_batch(self, fake, items):
+        with mock.patch("core.pipeline.spitch", fake):
+            return APIClient().post("/api/announce/batch/", {"items": items}, format="json")
+
+    def test_identical_work_runs_once(self):
+        fake = FakeSpitch(delay=0.02)
+        response = self.post_batch(fake, [
+            {"text": "Flight 220 is now boarding", "languages": ["yo", "ha"]},
+            {"text": "Flight 220  is now boarding", "languages": ["yo"], "tone": "urgent"},
+            {"text": "Gate 4 is closed", "languages": ["yo"]},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(fake.calls.count("translate"), 3)
+        self.assertEqual(fake.calls.count("generate"), 3)
+        results = response.data["results"]
+        self.assertEqual([r["status"] for r in results], ["created"] * 3)
+        self.assertEqual(results[0]["announcement"]["audio_files"]["yo"], results[1]["announcement"]["audio_files"]["yo"])
+        self.assertEqual(Announcement.objects.count(), 3)
+        self.assertEqual(AnnouncementLanguage.objects.filter(status=AnnouncementLanguage.DONE).count(), 4)
+
+    def test_partial_failures_are_reported_per_item(self):
+        response = self.post_batch(FakeSpitch(fail_languages=["ig"]), [
+            {"text": "Flight 220 is now boarding", "languages": ["yo", "ig"]},
+            {"text": "Gate 4 is closed", "languages": ["ha"]},
+            {"text": "", "languages": ["yo"]},
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        first, second, third = response.data["results"]
+        self.assertEqual((first["status"], first["failed_languages"]), ("partial", ["ig"]))
+        self.assertEqual(second["status"], "created")
+        self.assertEqual(third["status"], "invalid")
+        self.assertEqual(Announcement.objects.count(), 2)
+        row = AnnouncementLanguage.objects.get(language="ig")
+        self.assertIn("upstream error", row.error)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class SingleFlightTests(TestCase):
+    def test_concurrent_identical_work_runs_once(self):
+        fake = FakeSpitch(delay=0.1)
+        announcement = Announcement.objects.create(text="Flight 220 is now boarding", languages=["yo"])
+        key = announcement_cache.cache_key(announcement.text, "en", "yo", "femi", "neutral")
+        results = []
+
+        def console():
+            pipeline = AnnouncementPipeline()
+            results.append(pipeline._process_shared(key, announcement, announcement.text, "yo"))
+
+        with mock.patch("core.pipeline.spitch", fake):
+            threads = [threading.Thread(target=console) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(fake.calls, ["translate", "generate"])
+        self.assertEqual(len({result[1] for result in results}), 1)
+        self.assertEqual(len(singleflight.flights), 0)
+
+    @override_settings(SINGLE_FLIGHT_DB_LOCK=True)
+    def test_db_locks_are_refused_behind_a_transaction_pooler(self):
+        with mock.patch.object(connection, "vendor", "postgresql"):
+            self.assertTrue(singleflight.db_locks_enabled())
+            with mock.patch.dict(connection.settings_dict, DISABLE_SERVER_SIDE_CURSORS=True), \
+                    self.assertLogs("core.singleflight", "WARNING"):
+                self.assertFalse(singleflight.db_locks_enabled())
+
+    def test_followers_retry_when_leader_fails(self):
+        registry = singleflight.SingleFlight()
+        started = threading.Event()
+        calls = []
+
+        def failing():
+            calls.append("leader")
+            started.set()
+            time.sleep(0.05)
+            raise RuntimeError("upstream error")
+
+        def leader():
+            with self.assertRaises(RuntimeError):
+                registry.run("key", failing)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        started.wait()
+        result, shared = registry.run("key", lambda: calls.append("follower") or "ok", timeout=1)
+        thread.join()
+
+        self.assertEqual((result, shared), ("ok", False))
+        self.assertEqual(calls, ["leader", "follower"])
+
+
+class AdmissionControlTests(TestCase):
+    def controller(self, rate=20, burst=1, max_queue=10, max_wait=1):
+        bucket = admission.LocalBucket(rate, burst)
+        return admission.AdmissionController({"generate": bucket}, max_queue, max_wait)
+
+    def test_urgent_calls_skip_ahead(self):
+        controller = self.controller()
+        controller.acquire("generate")  # use up the burst
+        order = []
+
+        def call(value, name):
+            controller.acquire("generate", value)
+            order.append(name)
+
+        threads = [threading.Thread(target=call, args=(admission.ROUTINE, f"routine-{i}")) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        while controller.depth("generate") < 3:
+            time.sleep(0.001)
+        urgent = threading.Thread(target=call, args=(admission.URGENT, "urgent"))
+        urgent.start()
+        for thread in [*threads, urgent]:
+            thread.join()
+
+        self.assertIn("urgent", order[:2])
+        self.assertEqual(len(order), 4)
+
+    def test_bucket_is_taken_without_holding_the_queue_lock(self):
+        taking, release = threading.Event(), threading.Event()
+
+        class SlowBucket:
+            rate = 1
+
+            def take(self):
+                # Stands in for DBBucket's select_for_update round-trip.
+                taking.set()
+                release.wait(1)
+                return 0.0
+
+        controller = admission.AdmissionController({"generate": SlowBucket()}, 10, 1)
+        thread = threading.Thread(target=controller.acquire, args=("generate",))
+        thread.start()
+        taking.wait(1)
+        try:
+            self.assertTrue(controller._cond.acquire(timeout=0.5))
+            controller._cond.release()
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(controller.depth("generate"), 0)
+
+    def test_waiting_too_long_is_overloaded(self):
+        controller = self.controller(rate=1, max_wait=0.05)
+        controller.acquire("generate")
+
+        with self.assertRaises(admission.Overloaded) as raised:
+            controller.acquire("generate")
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(controller.depth(), 0)
+
+    @override_settings(STORAGES=IN_MEMORY_STORAGES)
+    def test_full_queue_sheds_routine_requests_with_503(self):
+        controller = self.controller(max_queue=0)
+        payload = {"text": "Flight 220 is now boarding", "languages": ["yo"]}
+        with mock.patch("core.admission.controller", controller), \
+                mock.patch("core.pipeline.spitch", FakeSpitch()):
+            shed = APIClient().post("/api/announce/", payload, format="json")
+            urgent = APIClient().post("/api/announce/", {**payload, "priority": "urgent"}, format="json")
+
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed["Retry-After"], "1")
+        self.assertEqual(urgent.status_code, 201)
+        self.assertEqual(Announcement.objects.get().priority, Announcement.URGENT)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, METRICS_TOKEN="")
+class MetricsTests(TestCase):
+    def setUp(self):
+        for metric in metrics.registry:
+            metric.clear()
+
+    def test_announcement_stages_show_up_in_metrics(self):
+        payload = {"text": "Flight 220 is now boarding", "languages": ["yo"]}
+        with mock.patch("core.pipeline.spitch", FakeSpitch()):
+            APIClient().post("/api/announce/", payload, format="json")
+
+        self.assertEqual(metrics.stage_seconds.count(stage="translate", language="yo"), 1)
+        self.assertEqual(metrics.stage_seconds.count(stage="synthesize", language="yo"), 1)
+        self.assertGreater(metrics.bytes_total.value(kind="stored"), 0)
+
+        body = APIClient().get("/api/metrics/").content.decode()
+        self.assertIn('voicebridge_stage_seconds_count{stage="translate",language="yo"} 1', body)
+        self.assertIn('voicebridge_cache_lookups_total{cache="announcement",result="miss"} 1', body)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(APIClient().get("/api/metrics/").status_code, 401)
+        response = APIClient().get("/api/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    def test_json_log_lines_carry_extra_fields(self):
+        record = logging.LogRecord("core", logging.INFO, __file__, 1, "done %s", ("yo",), None)
+        record.announcement = 7
+        line = json.loads(JsonFormatter().format(record))
+        self.assertEqual(line["message"], "done yo")
+        self.assertEqual(line["announcement"], 7)
+
+    def test_queued_handler_writes_from_forked_workers(self):
+        handler = QueuedStreamHandler()
+        self.addCleanup(handler.stop)
+        out = tempfile.TemporaryFile("w+")
+        self.addCleanup(out.close)
+        handler.stream.setStream(out)
+        logger = logging.getLogger("core.tests.forked")
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        worker = multiprocessing.get_context("fork").Process(target=logger.warning, args=("from the worker",))
+        worker.start()
+        worker.join()
+
+        out.seek(0)
+        self.assertIn("from the worker", out.read())
+
+
+class BenchLoadTests(TestCase):
+    def test_compare_flags_only_changes_beyond_tolerance(self):
+        def report(p95, rps, upstream):
+            return {"scenarios": {"announce": {
+                "p50_ms": 100, "p95_ms": p95, "rps": rps, "upstream_calls_per_request": upstream,
+            }}}
+
+        baseline = report(p95=200, rps=40, upstream=1.0)
+        self.assertEqual(compare(report(p95=240, rps=35, upstream=1.1), baseline, 0.25), [])
+        self.assertEqual(
+            compare(report(p95=300, rps=20, upstream=2.0), baseline, 0.25),
+            ["announce p95_ms: 200 -> 300", "announce rps: 40 -> 20", "announce upstream_calls_per_request: 1.0 -> 2.0"],
+        )
+
+    def test_fake_spitch_error_rate(self):
+        server = FakeSpitchServer(error_rate=1.0)
+        self.addCleanup(server.close)
+        client = ResilientSpitch(api_key="test", base_url=server.url, max_retries=0, sleep=lambda _: None)
+
+        with self.assertRaises(Exception):
+            client.text.translate(text="Boarding", source="en", target="yo")
+        self.assertEqual(len(server.requests), 1)
+
+
+class AsyncFakeSpitch(FakeSpitch):
+    """``FakeSpitch`` with coroutine methods, like ``AsyncResilientSpitch``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.text = SimpleNamespace(translate=self.atranslate)
+        self.speech = SimpleNamespace(generate=self.agenerate, transcribe=self.atranscribe)
+
+    async def _aenter(self, name):
+        self.calls.append(name)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+
+    async def atranslate(self, text, source, target, **kwargs):
+        await self._aenter("translate")
+        if target in self.fail_languages:
+            raise RuntimeError("upstream error")
+        return SimpleNamespace(text=f"[{target}] {text}")
+
+    async def agenerate(self, text, language, voice, **kwargs):
+        await self._aenter("generate")
+        return SimpleNamespace(http_response=SimpleNamespace(content=tone_wav(0.05 + 0.01 * len(text))))
+
+    async def atranscribe(self, content, language, **kwargs):
+        await self._aenter("transcribe")
+        return SimpleNamespace(text="Flight 220 is now boarding")
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class AsyncViewTests(TestCase):
+    factory = AsyncRequestFactory()
+
+    async def post_announcement(self, fake, **data):
+        payload = {"text": "Flight 220 is now boarding", "languages": ["yo", "ig", "ha"], **data}
+        request = self.factory.post("/api/announce/", payload, content_type="application/json")
+        with mock.patch("core.async_pipeline.async_spitch", return_value=fake):
+            response = await CreateAnnouncementAsyncView.as_view()(request)
+        return response, json.loads(response.content)
+
+    async def test_languages_run_concurrently_on_the_event_loop(self):
+        fake = AsyncFakeSpitch(delay=0.05)
+        response, data = await self.post_announcement(fake)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(data["translations"]), ["yo", "ig", "ha"])
+        self.assertEqual(list(data["audio_files"]), ["yo", "ig", "ha"])
+        self.assertGreater(fake.max_active, 1)
+        done = AnnouncementLanguage.objects.filter(status=AnnouncementLanguage.DONE)
+        self.assertEqual(await done.acount(), 3)
+
+    async def test_failure_is_isolated_and_repeats_hit_the_cache(self):
+        _, data = await self.post_announcement(AsyncFakeSpitch(fail_languages=["ig"]))
+        self.assertEqual(set(data["audio_files"]), {"yo", "ha"})
+        failed = await AnnouncementLanguage.objects.aget(language="ig")
+        self.assertEqual(failed.status, AnnouncementLanguage.FAILED)
+        self.assertIn("upstream error", failed.error)
+
+        fake = AsyncFakeSpitch()
+        _, again = await self.post_announcement(fake, languages=["yo", "ha"])
+        self.assertEqual(fake.calls, [])
+        self.assertEqual(again["audio_files"], data["audio_files"])
+
+    @override_settings(ANNOUNCEMENT_LANGUAGE_TIMEOUT=0.05)
+    async def test_slow_language_is_cancelled(self):
+        fake = AsyncFakeSpitch(delay=0.5)
+        started = time.monotonic()
+        response, data = await self.post_announcement(fake, languages=["yo"])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(data["translations"], {})
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(fake.active, 0)
+
+    async def test_transcribe(self):
+        upload = SimpleUploadedFile("clip.wav", tone_wav(1.0, rate=48000), content_type="audio/wav")
+        request = self.factory.post("/api/transcribe/", {"audio": upload, "languages": '["yo"]'})
+        fake = AsyncFakeSpitch()
+        with mock.patch("core.async_pipeline.async_spitch", return_value=fake):
+            response = await TranscribeAnnouncementAsyncView.as_view()(request)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content)["text"], "Flight 220 is now boarding")
+        self.assertEqual(fake.calls, ["transcribe", "translate", "generate"])
+
+    @override_settings(TRANSCRIBE_LONG_AUDIO_SECONDS=3, TRANSCRIBE_SEGMENT_SECONDS=2, AUDIO_OUTPUT_FORMAT="wav")
+    async def test_long_transcription_runs_segments_as_tasks(self):
+        wav = audio.write_wav(speech_with_pauses([1.5, 0.5, 1.5, 0.5, 1.5]), 16000)
+        upload = SimpleUploadedFile("briefing.wav", wav, content_type="audio/wav")
+        request = self.factory.post("/api/transcribe/", {"audio": upload, "languages": '["yo"]'})
+        fake = AsyncFakeSpitch(delay=0.02)
+        with mock.patch("core.async_pipeline.async_spitch", return_value=fake):
+            response = await TranscribeAnnouncementAsyncView.as_view()(request)
+
+        data = json.loads(response.content)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(fake.calls), ["generate"] + ["transcribe"] * 3 + ["translate"] * 3)
+        self.assertEqual(data["translations"]["yo"], " ".join(["[yo] Flight 220 is now boarding"] * 3))
+        self.assertGreater(fake.max_active, 1)
+
+    async def test_invalid_requests_match_the_sync_view(self):
+        bodies = [
+            {"text": "Boarding"},
+            {"text": "Boarding", "languages": "yo"},
+            {"text": "Boarding", "languages": ["yo"], "scheduled_for": "tomorrow"},
+            {"template": "Flight {flight} is boarding", "languages": ["yo"], "slots": []},
+        ]
+        for body in bodies:
+            sync_response = await sync_to_async(APIClient().post)("/api/announce/", body, format="json")
+            request = self.factory.post("/api/announce/", body, content_type="application/json")
+            response = await CreateAnnouncementAsyncView.as_view()(request)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(json.loads(response.content), sync_response.json())
+
+    async def test_history_matches_the_sync_view(self):
+        for i in range(3):
+            await Announcement.objects.acreate(text=f"Announcement {i}", languages=["yo"], translations={}, audio_files={})
+        sync_response = await sync_to_async(APIClient().get)("/api/history/?limit=2&fields=id,text")
+
+        view = AnnouncementHistoryAsyncView.as_view()
+        response = await view(self.factory.get("/api/history/?limit=2&fields=id,text"))
+        self.assertEqual(json.loads(response.content), sync_response.json())
+        self.assertEqual(response["ETag"], sync_response["ETag"])
+        self.assertEqual(response["Link"], sync_response["Link"])
+
+        cached = await view(self.factory.get("/api/history/?limit=2&fields=id,text", headers={"If-None-Match": response["ETag"]}))
+        self.assertEqual(cached.status_code, 304)
+
+    def test_async_client_retries_against_the_api(self):
+        server = FakeSpitchServer()
+        self.addCleanup(server.close)
+        server.fail("/v1/speech", (503, 0))
+
+        async def generate():
+            client = AsyncResilientSpitch(api_key="test", base_url=server.url, sleep=lambda _: asyncio.sleep(0))
+            return await client.speech.generate(text="Boarding", language="yo", voice="femi")
+
+        response = asyncio.run(generate())
+        self.assertEqual(response.http_response.content[:4], b"RIFF")
+        self.assertEqual(len(server.requests), 2)
+
+    @skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+    def test_ffmpeg_conversion_runs_as_an_async_subprocess(self):
+        webm = encode_webm(tone_wav(1.0, rate=48000))
+        pcm = asyncio.run(transcription.convert_to_pcm_async(webm, timeout=10))
+        # About a second of 16 kHz s16le.
+        self.assertAlmostEqual(len(pcm) / 2 / transcription.SAMPLE_RATE, 1.0, delta=0.1)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, AUDIO_OUTPUT_FORMAT="wav")
+class AudioCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        announcement_cache.memory.clear()
+        for metric in metrics.registry:
+            metric.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.disk = audio_cache.DiskAudioCache(tmp.name, 10 ** 6)
+        patcher = mock.patch("core.audio_cache.disk", self.disk)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self):
+        with mock.patch("core.pipeline.spitch", FakeSpitch()):
+            data = self.client.post(
+                "/api/announce/", {"text": "Flight 220 is now boarding", "languages": ["yo"]}, format="json"
+            ).data
+        name = StoredAudio.objects.get(url=data["audio_files"]["yo"]).name
+        with default_storage.open(name) as f:
+            return data["id"], name, f.read()
+
+    def test_new_audio_is_served_from_the_local_copy(self):
+        pk, name, stored = self.create()
+        self.assertIsNotNone(self.disk.get(name))
+
+        response = self.client.get(f"/api/announce/{pk}/audio/yo/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), stored)
+        self.assertEqual(response["Content-Type"], "audio/wav")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(metrics.cache_lookups.value(cache="audio", result="miss"), 0)
+
+    def test_range_and_conditional_requests(self):
+        pk, _, stored = self.create()
+        url = f"/api/announce/{pk}/audio/yo/"
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(stored)}")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response.getvalue(), stored[10:20])
+
+        self.assertEqual(self.client.get(url, headers={"Range": "bytes=-4"}).getvalue(), stored[-4:])
+        self.assertEqual(self.client.get(url, headers={"Range": "bytes=100-"}).getvalue(), stored[100:])
+        unsatisfiable = self.client.get(url, headers={"Range": f"bytes={len(stored)}-"})
+        self.assertEqual(unsatisfiable.status_code, 416)
+        self.assertEqual(unsatisfiable["Content-Range"], f"bytes */{len(stored)}")
+        # An invalid range is ignored (RFC 9110 14.1.2): the whole file, 200.
+        for header in ("bytes=19-10", "bytes=x-4", "bytes=-"):
+            invalid = self.client.get(url, headers={"Range": header})
+            self.assertEqual((invalid.status_code, invalid.getvalue()), (200, stored))
+
+        stale = self.client.get(url, headers={"Range": "bytes=10-19", "If-Range": '"other"'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+
+    def test_miss_is_filled_from_storage(self):
+        pk, name, stored = self.create()
+        self.disk.clear()
+
+        for _ in range(2):
+            response = self.client.get(f"/api/announce/{pk}/audio/yo/")
+            self.assertEqual(response.getvalue(), stored)
+        self.assertEqual(metrics.cache_lookups.value(cache="audio", result="miss"), 1)
+        self.assertEqual(metrics.cache_lookups.value(cache="audio", result="hit"), 1)
+
+    def test_least_recently_used_files_are_evicted(self):
+        disk = audio_cache.DiskAudioCache(self.disk.directory, 10)
+        for name in ("a.wav", "b.wav"):
+            disk.put(name, b"1234")
+        disk.get("a.wav")
+        disk.put("c.wav", b"1234")
+
+        self.assertIsNone(disk.get("b.wav"))
+        self.assertEqual(sorted(os.listdir(disk.directory)), sorted(disk.filename(n) for n in ("a.wav", "c.wav")))
+        # A fresh process picks the directory back up.
+        reloaded = audio_cache.DiskAudioCache(disk.directory, 10)
+        self.assertIsNotNone(reloaded.get("c.wav"))
+        self.assertEqual(reloaded.size, 8)
+
+    def test_released_audio_leaves_the_cache(self):
+        _, name, _ = self.create()
+        storage.delete_files([name])
+        self.assertIsNone(self.disk.get(name))
+
+    def test_unknown_audio_redirects_to_storage(self):
+        announcement = Announcement.objects.create(
+            text="Legacy", languages=["yo"], translations={}, audio_files={"yo": "https://cdn.example/legacy.mp3"},
+        )
+        response = self.client.get(f"/api/announce/{announcement.id}/audio/yo/")
+        self.assertRedirects(response, "https://cdn.example/legacy.mp3", fetch_redirect_response=False)
+        self.assertEqual(self.client.get(f"/api/announce/{announcement.id}/audio/ha/").status_code, 404)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, AUDIO_OUTPUT_FORMAT="wav", AUDIO_CACHE_ENABLED=False)
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        announcement_cache.memory.clear()
+        # The storage instance outlives each test under a class-level override.
+        for name in default_storage.listdir("")[1]:
+            default_storage.delete(name)
+
+    def create(self, text="Flight 220 is now boarding", languages=("yo",)):
+        with mock.patch("core.pipeline.spitch", FakeSpitch()):
+            return self.client.post("/api/announce/", {"text": text, "languages": list(languages)}, format="json")
+
+    def sweep(self, later=timedelta(hours=2), **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = retention.sweep(now=timezone.now() + later, **kwargs)
+        storage.wait_for_cleanup()
+        return report
+
+    def stored_files(self):
+        return sorted(default_storage.listdir("")[1])
+
+    def test_audio_of_failed_announcements_is_swept_after_the_grace_period(self):
+        with mock.patch.object(AnnouncementPipeline, "render_broadcast", side_effect=RuntimeError("disk full")):
+            response = self.create(languages=["yo", "ha"])
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Announcement.objects.exists())
+        # The run failed after uploading; its files are still tracked.
+        self.assertEqual(StoredAudio.objects.filter(announcement=None).count(), 2)
+        self.assertEqual(len(self.stored_files()), 2)
+
+        self.assertEqual(self.sweep(later=timedelta(0))[retention.ORPHANED], (0, 0))
+        files, size = self.sweep(batch_size=1)[retention.ORPHANED]
+        self.assertEqual(files, 2)
+        self.assertGreater(size, 0)
+        self.assertFalse(StoredAudio.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_audio_in_use_is_kept(self):
+        self.create()
+        self.assertEqual(self.sweep(), {retention.ORPHANED: (0, 0), retention.EXPIRED: (0, 0), retention.OVER_QUOTA: (0, 0)})
+        self.assertEqual(len(self.stored_files()), 1)
+
+    @override_settings(ANNOUNCEMENT_LANGUAGE_TIMEOUT=0.05)
+    def test_uploads_after_a_timeout_are_deleted(self):
+        fake = FakeSpitch(delay=0.1)
+        with mock.patch("core.pipeline.spitch", fake):
+            response = self.client.post("/api/announce/", {"text": "Gate change", "languages": ["yo"]}, format="json")
+            deadline = time.monotonic() + 5
+            while len(singleflight.flights) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(response.data["audio_files"], {})
+        self.assertIn("generate", fake.calls)
+        self.assertEqual(self.stored_files(), [])
+
+    @override_settings(RETENTION_MAX_AGE_DAYS=30)
+    def test_expired_audio_is_detached_and_deleted(self):
+        created = self.create(languages=["yo", "ha"]).data
+        self.assertEqual(self.sweep(later=timedelta(days=29))[retention.EXPIRED], (0, 0))
+
+        self.assertEqual(self.sweep(later=timedelta(days=31))[retention.EXPIRED][0], 2)
+        announcement = Announcement.objects.get(id=created["id"])
+        self.assertEqual(announcement.audio_files, {})
+        self.assertEqual(announcement.translations, created["translations"])
+        self.assertFalse(announcement.results.exclude(audio_url="").exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_oldest_audio_goes_first_over_the_quota(self):
+        first = self.create("Flight 220 is now boarding").data
+        second = self.create("Flight 221 is now boarding").data
+        sizes = dict(StoredAudio.objects.values_list("announcement_id", "size"))
+
+        with override_settings(RETENTION_MAX_BYTES=sizes[second["id"]]):
+            self.assertEqual(self.sweep(later=timedelta(0))[retention.OVER_QUOTA], (1, sizes[first["id"]]))
+        self.assertEqual(Announcement.objects.get(id=first["id"]).audio_files, {})
+        self.assertEqual(Announcement.objects.get(id=second["id"]).audio_files, second["audio_files"])
+
+    def test_dry_run_report_deletes_nothing(self):
+        with mock.patch.object(AnnouncementPipeline, "render_broadcast", side_effect=RuntimeError("disk full")):
+            self.create()
+        out = StringIO()
+        with override_settings(RETENTION_ORPHAN_GRACE_SECONDS=0):
+            call_command("sweep_storage", "--dry-run", stdout=out)
+        self.assertIn("Would delete orphaned: 1 files", out.getvalue())
+        self.assertEqual(StoredAudio.objects.count(), 1)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    @override_settings(RETENTION_ORPHAN_GRACE_SECONDS=0)
+    def test_untracked_files_are_adopted_and_swept(self):
+        in_use = self.create().data
+        StoredAudio.objects.all().delete()
+        default_storage.save("announcement_999_yo_0123abcd.wav", ContentFile(tone_wav()))
+
+        out = StringIO()
+        call_command("sweep_storage", "--untracked", "--dry-run", stdout=out)
+        self.assertIn("untracked: 2 files", out.getvalue())
+
+        time.sleep(0.01)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("sweep_storage", "--untracked", "--once", stdout=StringIO())
+        storage.wait_for_cleanup()
+        remaining = self.stored_files()
+        self.assertEqual(len(remaining), 1)
+        self.assertIn(os.path.splitext(remaining[0])[0], in_use["audio_files"]["yo"])
+
+
+class SentenceSegmenterTests(TestCase):
+    def test_cuts_sentences_at_pauses_as_audio_arrives(self):
+        stream = speech_with_pauses([1.0, 0.8, 1.5, 0.8, 0.6])
+        segmenter = live.SentenceSegmenter(16000, pause_ms=500, max_seconds=10)
+        sentences = []
+        for start in range(0, stream.shape[0], 1600):
+            sentences += segmenter.feed(stream[start:start + 1600])
+
+        # Each sentence keeps 200 ms of the pause after it; the last one is
+        # still open until flushed.
+        self.assertEqual([round(s.shape[0] / 16000, 1) for s in sentences], [1.2, 1.9])
+        self.assertAlmostEqual(segmenter.flush().shape[0] / 16000, 0.8, delta=0.05)
+        self.assertIsNone(segmenter.flush())
+
+    def test_long_speech_is_cut_at_the_maximum_length(self):
+        segmenter = live.SentenceSegmenter(16000, pause_ms=500, max_seconds=2)
+        sentences = segmenter.feed(speech_with_pauses([5.0]))
+        self.assertEqual([s.shape[0] / 16000 for s in sentences], [2.0, 2.0])
+
+    def test_silence_and_clicks_are_not_sentences(self):
+        segmenter = live.SentenceSegmenter(16000, pause_ms=500, max_seconds=10)
+        self.assertEqual(segmenter.feed(speech_with_pauses([0.1, 2.0])), [])
+        self.assertIsNone(segmenter.flush())
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, LIVE_PAUSE_MS=400, AUDIO_OUTPUT_FORMAT="wav")
+class LiveInterpretationTests(TestCase):
+    async def interpret(self, fake, messages, path=live.PATH, headers=(), before_stop=None):
+        """Run a session over ``messages``, returning what the server sent."""
+        sent = []
+        inbox = iter([{"type": "websocket.connect"}, *messages])
+
+        async def receive():
+            message = next(inbox)
+            if before_stop and message.get("text") == '{"type": "stop"}':
+                await before_stop(sent)
+            return message
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "websocket", "path": path, "headers": [(b"host", b"testserver"), *headers]}
+        with mock.patch("core.async_pipeline.async_spitch", return_value=fake):
+            await live.application(scope, receive, send)
+        return sent
+
+    def events(self, sent):
+        return [json.loads(message["text"]) for message in sent if message["type"] == "websocket.send"]
+
+    def pcm_chunks(self, samples, size=3200):
+        pcm = audio.to_pcm16(samples)
+        # Odd sizes: frames don't have to split on sample boundaries.
+        return [{"type": "websocket.receive", "bytes": pcm[i:i + size + 1]} for i in range(0, len(pcm), size + 1)]
+
+    def start(self, **config):
+        return {"type": "websocket.receive", "text": json.dumps({"type": "start", "languages": ["yo", "ha"], **config})}
+
+    stop = {"type": "websocket.receive", "text": json.dumps({"type": "stop"})}
+
+    async def test_sentences_are_interpreted_while_audio_streams(self):
+        fake = AsyncFakeSpitch()
+        stream = speech_with_pauses([1.0, 0.8, 1.2, 0.2]).astype(np.float32)
+
+        async def first_sentence_done(sent):
+            # The first sentence is back before the client stops talking.
+            for _ in range(200):
+                if any(event["type"] == "sentence" for event in self.events(sent)):
+                    return
+                await asyncio.sleep(0.01)
+            self.fail("No sentence was interpreted before the stream ended")
+
+        sent = await self.interpret(
+            fake, [self.start(sample_rate=16000), *self.pcm_chunks(stream), self.stop],
+            before_stop=first_sentence_done,
+        )
+
+        events = self.events(sent)
+        self.assertEqual(events[0], {"type": "ready", "sample_rate": 16000})
+        self.assertEqual(events[-1], {"type": "done", "sentences": 2})
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": 1000})
+        sentences = [event for event in events if event["type"] == "sentence"]
+        self.assertEqual([event["sentence"] for event in sentences], [1, 2])
+        self.assertEqual(sentences[0]["translations"]["yo"], "[yo] Flight 220 is now boarding")
+        self.assertTrue(sentences[0]["audio_files"]["ha"].startswith("http://testserver/"))
+        # The second sentence says the same thing, so it comes from the
+        # cache without per-language events.
+        audio_events = {(e["sentence"], e["language"]) for e in events if e["type"] == "audio"}
+        self.assertEqual(audio_events, {(1, "yo"), (1, "ha")})
+        self.assertEqual(sentences[1]["audio_files"], sentences[0]["audio_files"])
+        self.assertEqual(fake.calls.count("transcribe"), 2)
+        self.assertEqual(await Announcement.objects.acount(), 2)
+
+    async def test_resamples_client_audio(self):
+        fake = AsyncFakeSpitch()
+        transcribed = []
+        original = transcription.transcribe_wav_async
+
+        async def capture(wav):
+            transcribed.append(audio.read_wav(wav)[1])
+            return await original(wav)
+
+        stream = audio.resample(speech_with_pauses([1.0, 0.5]), 16000, 48000)
+        with mock.patch("core.transcription.transcribe_wav_async", capture):
+            sent = await self.interpret(fake, [self.start(sample_rate=48000), *self.pcm_chunks(stream), self.stop])
+        self.assertEqual(self.events(sent)[-1]["sentences"], 1)
+        self.assertEqual(transcribed, [16000])
+
+    async def test_rejects_foreign_origins_and_unknown_paths(self):
+        fake = AsyncFakeSpitch()
+        sent = await self.interpret(fake, [], headers=[(b"origin", b"https://evil.example")])
+        self.assertEqual(sent, [{"type": "websocket.close", "code": 4403}])
+        sent = await self.interpret(fake, [], path="/ws/other/")
+        self.assertEqual(sent, [{"type": "websocket.close", "code": 4404}])
+
+        sent = await self.interpret(fake, [self.stop], headers=[(b"origin", b"http://localhost:5173")])
+        self.assertEqual(sent[0], {"type": "websocket.accept"})
+
+    async def test_protocol_errors_close_the_socket(self):
+        fake = AsyncFakeSpitch()
+        sent = await self.interpret(fake, [{"type": "websocket.receive", "bytes": b"\x00\x00"}])
+        self.assertEqual(self.events(sent), [{"type": "error", "error": "Send a start message before audio."}])
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": 1008})
+
+        sent = await self.interpret(fake, [self.start(languages="yo")])
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": 1008})
+
+    async def test_sheds_sessions_when_overloaded(self):
+        fake = AsyncFakeSpitch()
+        with mock.patch.object(admission.controller, "check", side_effect=admission.Overloaded("Too many", 3)):
+            sent = await self.interpret(fake, [self.start()])
+        self.assertEqual(self.events(sent)[0]["retry_after"], 3)
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": 1013})
+
+    async def test_disconnect_finishes_sentences_in_flight(self):
+        fake = AsyncFakeSpitch(delay=0.05)
+        stream = speech_with_pauses([1.0, 0.6]).astype(np.float32)
+        sent = await self.interpret(
+            fake, [self.start(), *self.pcm_chunks(stream), {"type": "websocket.disconnect", "code": 1001}],
+        )
+        self.assertNotIn("websocket.close", [message["type"] for message in sent])
+        self.assertEqual(await Announcement.objects.acount(), 1)
+
+    @skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+    async def test_webm_chunks_are_decoded_as_they_arrive(self):
+        fake = AsyncFakeSpitch()
+        webm = encode_webm(audio.write_wav(speech_with_pauses([1.0, 0.8, 1.0, 0.3]), 16000))
+        chunks = [{"type": "websocket.receive", "bytes": webm[i:i + 2000]} for i in range(0, len(webm), 2000)]
+        sent = await self.interpret(fake, [self.start(encoding="webm"), *chunks, self.stop])
+        self.assertEqual(self.events(sent)[-1], {"type": "done", "sentences": 2})
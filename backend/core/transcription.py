@@ -0,0 +1,533 @@
+"""Turning recorded microphone audio into announcement text."""
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.db import connections
+
+from . import admission, async_pipeline, audio, metrics, pipeline
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Roughly how much bigger 16 kHz s16le PCM is than a compressed WebM/Opus
+# upload; used to size the output buffer up front.
+PCM_EXPANSION = 8
+
+# ffmpeg: any input on stdin -> 16 kHz mono s16le PCM on stdout.
+FFMPEG_PCM_COMMAND = [
+    'ffmpeg', '-hide_banner', '-loglevel', 'error',
+    '-i', 'pipe:0',
+    '-ac', '1',        # Mono channel
+    '-ar', str(SAMPLE_RATE),
+    '-acodec', 'pcm_s16le',
+    '-f', 's16le',
+    'pipe:1',
+]
+
+
+def transcribe_upload(chunks, name="upload.webm", languages=(), translations=None):
+    """Convert an uploaded recording (an iterable of byte chunks) to WAV
+    and transcribe it with Spitch. Returns the transcribed text; see
+    ``transcribe`` for ``languages`` and ``translations``."""
+    data = b"".join(chunks)
+    metrics.bytes_total.inc(len(data), kind="upload")
+
+    # Common formats are converted in-process; ffmpeg is the last resort.
+    try:
+        with metrics.timer("convert_native"):
+            audio_content = native_audio_conversion(data)
+    except audio.AudioFormatError as e:
+        logger.info("In-process conversion unavailable (%s), using ffmpeg", e)
+    else:
+        logger.info("Converted audio in-process: %d bytes, format: WAV", len(audio_content))
+        return transcribe(audio_content, languages, translations)
+
+    # Save uploaded file temporarily
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_webm:
+        temp_webm.write(data)
+        webm_path = temp_webm.name
+
+    # Convert WebM to WAV (supported by Spitch)
+    with metrics.timer("convert_ffmpeg"):
+        wav_path = convert_webm_to_wav(webm_path)
+
+    try:
+        # Read the converted WAV file
+        with open(wav_path, "rb") as f:
+            audio_content = f.read()
+
+        logger.info("Converted audio size: %d bytes, format: WAV", len(audio_content))
+        return transcribe(audio_content, languages, translations)
+
+    finally:
+        # Clean up temporary files
+        os.unlink(webm_path)
+        if os.path.exists(wav_path):
+            os.unlink(wav_path)
+
+
+def transcribe_file(audio_file, languages=(), translations=None):
+    """Transcribe an uploaded file, using the PCM that
+    ``StreamingConversionUploadHandler`` already produced when available."""
+    pcm = getattr(audio_file, "pcm", None)
+    if pcm is not None:
+        logger.info("Streamed conversion produced %d bytes of PCM", len(pcm))
+        return transcribe(audio.pcm16_to_wav(pcm, SAMPLE_RATE), languages, translations)
+    return transcribe_upload(audio_file.chunks(), audio_file.name, languages, translations)
+
+
+def transcribe(audio_content, languages=(), translations=None):
+    """Transcribe WAV audio with Spitch and return the text.
+
+    Recordings longer than ``TRANSCRIBE_LONG_AUDIO_SECONDS`` go through
+    ``transcribe_long``, which also translates into ``languages`` as it
+    goes and puts the results in the ``translations`` dict.
+    """
+    recording = long_recording(audio_content)
+    if recording is not None:
+        return transcribe_long(*recording, languages=languages, translations=translations)
+    return transcribe_wav(audio_content)
+
+
+def long_recording(audio_content):
+    """``(samples, sample_rate)`` if ``audio_content`` is a WAV longer than
+    ``TRANSCRIBE_LONG_AUDIO_SECONDS``, else ``None``."""
+    if bytes(audio_content[:4]) != b"RIFF":
+        return None
+    try:
+        samples, rate = audio.read_wav(audio_content)
+    except audio.AudioFormatError:
+        return None
+    if samples.shape[0] <= rate * settings.TRANSCRIBE_LONG_AUDIO_SECONDS:
+        return None
+    return audio.to_mono(samples), rate
+
+
+def transcribe_long(samples, rate, languages=(), translations=None):
+    """Transcribe a long recording in segments and stitch the text back in
+    order.
+
+    The recording is split at pauses into segments of at most
+    ``TRANSCRIBE_SEGMENT_SECONDS``, transcribed up to
+    ``TRANSCRIBE_MAX_CONCURRENCY`` at a time. Each segment's text is sent
+    for translation into ``languages`` as soon as it arrives, so translation
+    overlaps with transcribing the later segments; the joined translations
+    go in ``translations``. A language with a failed segment is left out
+    and the pipeline translates the full text instead.
+    """
+    bounds = audio.split_at_silences(
+        samples, rate, settings.TRANSCRIBE_SEGMENT_SECONDS, settings.TRANSCRIBE_SILENCE_DBFS
+    )
+    logger.info("Long recording: %.1fs in %d segments", samples.shape[0] / rate, len(bounds))
+    priority = admission.current_priority()
+
+    def run(fn, *args):
+        # Pool threads: keep the request's admission priority, and close the
+        # connection the DB-backed admission buckets may have opened.
+        try:
+            with admission.priority(priority):
+                return fn(*args)
+        finally:
+            connections.close_all()
+
+    texts = [""] * len(bounds)
+    pieces = {lang: [""] * len(bounds) for lang in dict.fromkeys(languages)}
+    failed = set()
+    transcribers = ThreadPoolExecutor(settings.TRANSCRIBE_MAX_CONCURRENCY, thread_name_prefix="transcribe")
+    translators = ThreadPoolExecutor(settings.ANNOUNCEMENT_MAX_CONCURRENCY, thread_name_prefix="translate")
+    try:
+        with metrics.timer("transcribe_long"):
+            segments = {
+                transcribers.submit(run, transcribe_wav, audio.write_wav(samples[start:end], rate)): index
+                for index, (start, end) in enumerate(bounds)
+            }
+            translating = {}
+            for future in as_completed(segments):
+                index = segments[future]
+                texts[index] = future.result().strip()
+                if texts[index]:
+                    for lang in pieces:
+                        translating[translators.submit(run, translate_segment, texts[index], lang)] = (lang, index)
+
+            for future, (lang, index) in translating.items():
+                try:
+                    pieces[lang][index] = future.result().strip()
+                except Exception as e:
+                    logger.warning("Segment translation to %s failed, translating the full text instead: %s", lang, e)
+                    failed.add(lang)
+    finally:
+        transcribers.shutdown(wait=False, cancel_futures=True)
+        translators.shutdown(wait=False, cancel_futures=True)
+    return _join_segments(texts, pieces, failed, translations)
+
+
+def _join_segments(texts, pieces, failed, translations):
+    if translations is not None:
+        for lang, parts in pieces.items():
+            translated_text = " ".join(part for part in parts if part)
+            if lang not in failed and translated_text:
+                translations[lang] = translated_text
+    text = " ".join(part for part in texts if part)
+    logger.info("Transcription successful: %s", text)
+    return text
+
+
+def translate_segment(text, lang):
+    with metrics.timer("translate", lang):
+        return pipeline.spitch.text.translate(text=text, source="en", target=lang).text
+
+
+def transcribe_wav(audio_content):
+    metrics.bytes_total.inc(len(audio_content), kind="pcm")
+    # Transcribe using Spitch
+    with metrics.timer("transcribe", "en"):
+        resp = pipeline.spitch.speech.transcribe(
+            content=audio_content,
+            language="en"  # Source language for transcription
+        )
+
+    text = resp.text
+    logger.info("Transcription successful: %s", text)
+    return text
+
+
+async def transcribe_upload_async(data, languages=(), translations=None):
+    """``transcribe_upload`` for async views. In-process decoding runs in a
+    worker thread and ffmpeg as a subprocess the event loop waits on, so
+    neither blocks other requests."""
+    metrics.bytes_total.inc(len(data), kind="upload")
+    try:
+        with metrics.timer("convert_native"):
+            audio_content = await asyncio.to_thread(native_audio_conversion, data)
+    except audio.AudioFormatError as e:
+        if not shutil.which("ffmpeg"):
+            logger.warning("No converter for this upload (%s), sending it as-is", e)
+            return await transcribe_wav_async(data)
+        logger.info("In-process conversion unavailable (%s), using ffmpeg", e)
+        with metrics.timer("convert_ffmpeg"):
+            pcm = await convert_to_pcm_async(data, timeout=settings.ANNOUNCEMENT_LANGUAGE_TIMEOUT)
+        audio_content = audio.pcm16_to_wav(pcm, SAMPLE_RATE)
+    logger.info("Converted audio size: %d bytes, format: WAV", len(audio_content))
+    return await transcribe_async(audio_content, languages, translations)
+
+
+async def transcribe_async(audio_content, languages=(), translations=None):
+    """``transcribe`` for coroutines."""
+    recording = await asyncio.to_thread(long_recording, audio_content)
+    if recording is not None:
+        return await transcribe_long_async(*recording, languages=languages, translations=translations)
+    return await transcribe_wav_async(audio_content)
+
+
+async def transcribe_long_async(samples, rate, languages=(), translations=None):
+    """``transcribe_long`` as tasks on the event loop, bounded by
+    semaphores instead of thread pools."""
+    bounds = await asyncio.to_thread(
+        audio.split_at_silences, samples, rate, settings.TRANSCRIBE_SEGMENT_SECONDS, settings.TRANSCRIBE_SILENCE_DBFS
+    )
+    logger.info("Long recording: %.1fs in %d segments", samples.shape[0] / rate, len(bounds))
+    client = async_pipeline.async_spitch()
+    transcribing = asyncio.Semaphore(settings.TRANSCRIBE_MAX_CONCURRENCY)
+    translating = asyncio.Semaphore(settings.ANNOUNCEMENT_MAX_CONCURRENCY)
+    texts = [""] * len(bounds)
+    pieces = {lang: [""] * len(bounds) for lang in dict.fromkeys(languages)}
+    failed = set()
+
+    async def translate(index, lang):
+        async with translating:
+            try:
+                with metrics.timer("translate", lang):
+                    translation = await client.text.translate(text=texts[index], source="en", target=lang)
+                pieces[lang][index] = translation.text.strip()
+            except Exception as e:
+                logger.warning("Segment translation to %s failed, translating the full text instead: %s", lang, e)
+                failed.add(lang)
+
+    async def segment(index, start, end):
+        async with transcribing:
+            texts[index] = (await transcribe_wav_async(audio.write_wav(samples[start:end], rate))).strip()
+        if texts[index]:
+            await asyncio.gather(*(translate(index, lang) for lang in pieces))
+
+    tasks = [asyncio.create_task(segment(index, start, end)) for index, (start, end) in enumerate(bounds)]
+    try:
+        with metrics.timer("transcribe_long"):
+            await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return _join_segments(texts, pieces, failed, translations)
+
+
+async def transcribe_wav_async(audio_content):
+    metrics.bytes_total.inc(len(audio_content), kind="pcm")
+    with metrics.timer("transcribe", "en"):
+        resp = await async_pipeline.async_spitch().speech.transcribe(
+            content=audio_content,
+            language="en",
+        )
+
+    text = resp.text
+    logger.info("Transcription successful: %s", text)
+    return text
+
+
+async def convert_to_pcm_async(data, timeout=None):
+    """Pipe encoded audio through ffmpeg with ``asyncio.create_subprocess_exec``
+    and return 16 kHz mono s16le PCM."""
+    proc = await asyncio.create_subprocess_exec(
+        *FFMPEG_PCM_COMMAND,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        pcm, stderr = await asyncio.wait_for(proc.communicate(data), timeout)
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise Exception(f"FFmpeg conversion failed: {stderr.decode(errors='replace')}")
+    return pcm
+
+
+def convert_webm_to_wav(webm_path):
+    """Convert WebM audio to WAV format using ffmpeg"""
+    wav_path = webm_path.replace('.webm', '.wav')
+
+    try:
+        # Use ffmpeg to convert WebM to WAV
+        cmd = [
+            'ffmpeg',
+            '-i', webm_path,
+            '-ac', '1',        # Mono channel
+            '-ar', '16000',    # 16kHz sample rate
+            '-acodec', 'pcm_s16le',  # 16-bit PCM
+            '-y',              # Overwrite output file
+            wav_path
+        ]
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg conversion failed: {result.stderr}")
+
+        logger.info("Audio converted successfully: %s -> %s", webm_path, wav_path)
+        return wav_path
+
+    except Exception as e:
+        logger.warning("FFmpeg conversion failed: %s", e)
+        return fallback_audio_conversion(webm_path)
+
+
+def native_audio_conversion(data):
+    """Decode, downmix and resample to a 16 kHz mono s16le WAV in-process.
+
+    Raises ``audio.AudioFormatError`` for formats without an in-process
+    decoder.
+    """
+    samples, rate = audio.decode(data)
+    return audio.pcm16_to_wav(audio.to_speech_pcm(samples, rate, SAMPLE_RATE), SAMPLE_RATE)
+
+
+def fallback_audio_conversion(webm_path):
+    """Fallback conversion method without ffmpeg"""
+    with open(webm_path, "rb") as f:
+        data = f.read()
+    try:
+        wav_content = native_audio_conversion(data)
+    except audio.AudioFormatError as e:
+        logger.warning("Using fallback conversion - trying direct upload (%s)", e)
+        return webm_path
+
+    wav_path = webm_path.replace('.webm', '.wav')
+    with open(wav_path, "wb") as f:
+        f.write(wav_content)
+    logger.info("Audio converted in-process: %s -> %s", webm_path, wav_path)
+    return wav_path
+
+
+def streaming_conversion_available():
+    return settings.TRANSCRIBE_STREAMING_CONVERSION
+
+
+class PCMStreamConverter:
+    """Pipe encoded audio through ffmpeg entirely in memory.
+
+    Chunks are written to ffmpeg's stdin as they are fed in, while a reader
+    thread collects 16 kHz mono s16le PCM from its stdout into a buffer
+    preallocated from ``size_hint``. No temp files are involved, and decoding
+    runs while the rest of the input is still arriving.
+    """
+
+    def __init__(self, size_hint=0):
+        self.proc = subprocess.Popen(
+            FFMPEG_PCM_COMMAND,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._buffer = bytearray(max((size_hint or 0) * PCM_EXPANSION, 64 * 1024))
+        self._length = 0
+        self._stderr = b""
+        self._stdin_closed = False
+        self._readers = [
+            threading.Thread(target=self._read_stdout, daemon=True),
+            threading.Thread(target=self._read_stderr, daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def feed(self, chunk):
+        if self._stdin_closed:
+            return
+        try:
+            self.proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            # ffmpeg gave up; finish() reports why.
+            self._stdin_closed = True
+
+    def finish(self, timeout=None):
+        """Close the input and return the decoded PCM as a memoryview."""
+        self._close_stdin()
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.abort()
+            raise Exception("FFmpeg conversion timed out")
+        for reader in self._readers:
+            reader.join()
+        if self.proc.returncode != 0:
+            raise Exception(f"FFmpeg conversion failed: {self._stderr.decode(errors='replace')}")
+        return memoryview(self._buffer)[:self._length]
+
+    def abort(self):
+        self._close_stdin()
+        self.proc.kill()
+        self.proc.wait()
+
+    def _close_stdin(self):
+        if not self._stdin_closed:
+            self._stdin_closed = True
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def _read_stdout(self):
+        stdout = self.proc.stdout
+        while True:
+            if self._length == len(self._buffer):
+                self._buffer.extend(bytes(len(self._buffer)))
+            view = memoryview(self._buffer)[self._length:]
+            try:
+                read = stdout.readinto1(view)
+            finally:
+                view.release()
+            if not read:
+                break
+            self._length += read
+
+    def _read_stderr(self):
+        self._stderr = self.proc.stderr.read()
+
+
+def convert_stream_to_pcm(chunks, size_hint=0):
+    """Convert an iterable of encoded chunks to 16 kHz mono s16le PCM."""
+    converter = PCMStreamConverter(size_hint)
+    try:
+        for chunk in chunks:
+            converter.feed(chunk)
+    except BaseException:
+        converter.abort()
+        raise
+    return converter.finish()
+
+
+class StreamedUpload(UploadedFile):
+    """An uploaded recording that was decoded while it was being received.
+
+    ``pcm`` holds the converted audio (or ``None`` if conversion failed),
+    and the original bytes are still readable from ``file`` for the regular
+    conversion path.
+    """
+
+    def __init__(self, file, pcm, name, content_type, size, charset=None, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.pcm = pcm
+
+
+class StreamingConversionUploadHandler(FileUploadHandler):
+    """Upload handler that converts the ``audio`` field as it arrives.
+
+    Formats ``audio.decode`` understands are decoded in-process once the
+    upload completes. Anything else is fed straight into ffmpeg as the
+    request body arrives, when ffmpeg is available. The raw bytes are kept
+    for the fallback path in a file that stays in memory up to
+    ``FILE_UPLOAD_MAX_MEMORY_SIZE`` and spills to disk past it.
+    """
+
+    field_name = "audio"
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_length = content_length
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name == self.field_name
+        if self.active:
+            self.raw = tempfile.SpooledTemporaryFile(
+                max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, dir=settings.FILE_UPLOAD_TEMP_DIR,
+            )
+            self.converter = None
+            # Keep the default handlers from storing it a second time.
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if start == 0 and not audio.can_decode(raw_data) and shutil.which("ffmpeg"):
+            self.converter = PCMStreamConverter(getattr(self, "request_length", 0))
+        self.raw.write(raw_data)
+        if self.converter is not None:
+            self.converter.feed(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.raw.seek(0)
+        try:
+            if self.converter is not None:
+                with metrics.timer("convert_stream"):
+                    pcm = self.converter.finish(timeout=settings.ANNOUNCEMENT_LANGUAGE_TIMEOUT)
+            else:
+                with metrics.timer("convert_native"):
+                    samples, rate = audio.decode(self.raw.read())
+                    pcm = audio.to_speech_pcm(samples, rate, SAMPLE_RATE)
+        except Exception as e:
+            logger.warning("Streamed conversion failed, falling back: %s", e)
+            pcm = None
+        self.raw.seek(0)
+        return StreamedUpload(
+            self.raw, pcm, self.file_name, self.content_type, file_size,
+            self.charset, self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if getattr(self, "converter", None) is not None:
+            self.converter.abort()
+        if getattr(self, "raw", None) is not None:
+            self.raw.close()
@@ -1,8 +1,41 @@
+from django.conf import settings
 from django.urls import path
-from .views import CreateAnnouncementView, AnnouncementHistoryView, TranscribeAnnouncementView
+from .views import (
+    AnnouncementAudioView,
+    AnnouncementDetailView,
+    AnnouncementHistoryView,
+    AnnouncementStatusView,
+    BatchAnnouncementView,
+    CreateAnnouncementView,
+    MetricsView,
+    StreamAnnouncementView,
+    StreamTranscribeAnnouncementView,
+    TranscribeAnnouncementView,
+)
+
+announce_view, transcribe_view, history_view = (
+    CreateAnnouncementView, TranscribeAnnouncementView, AnnouncementHistoryView
+)
+if settings.ASYNC_VIEWS:
+    from .async_views import (
+        AnnouncementHistoryAsyncView,
+        CreateAnnouncementAsyncView,
+        TranscribeAnnouncementAsyncView,
+    )
+
+    announce_view, transcribe_view, history_view = (
+        CreateAnnouncementAsyncView, TranscribeAnnouncementAsyncView, AnnouncementHistoryAsyncView
+    )
 
 urlpatterns = [
-    path("announce/", CreateAnnouncementView.as_view(), name="announce"),
-    path("transcribe/", TranscribeAnnouncementView.as_view(), name="transcribe"),
-    path("history/", AnnouncementHistoryView.as_view(), name="history"),
+    path("announce/", announce_view.as_view(), name="announce"),
+    path("announce/batch/", BatchAnnouncementView.as_view(), name="announce-batch"),
+    path("announce/<int:pk>/", AnnouncementDetailView.as_view(), name="announce-detail"),
+    path("announce/<int:pk>/audio/<str:language>/", AnnouncementAudioView.as_view(), name="announce-audio"),
+    path("announce/<int:pk>/status/", AnnouncementStatusView.as_view(), name="announce-status"),
+    path("announce/stream/", StreamAnnouncementView.as_view(), name="announce-stream"),
+    path("transcribe/", transcribe_view.as_view(), name="transcribe"),
+    path("transcribe/stream/", StreamTranscribeAnnouncementView.as_view(), name="transcribe-stream"),
+    path("history/", history_view.as_view(), name="history"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
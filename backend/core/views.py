@@ -1,135 +1,110 @@
-from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-from spitch import Spitch
-from .models import Announcement
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from .models import Announcement, AnnouncementJob, StoredAudio
 from .serializers import AnnouncementSerializer
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
-import os
-import uuid
+from .pipeline import AnnouncementPipeline
+from . import admission, api, audio_cache, history, jobs, metrics, storage, transcription
+from .api import flag, request_priority, scheduled_time
+from .audio import MIME_TYPES
 import json
-import tempfile
-import subprocess
+import logging
+import os
+import re
 
-# Init Spitch client
-spitch = Spitch(api_key=settings.SPITCH_API_KEY)
+logger = logging.getLogger(__name__)
+
+
+def overloaded(e):
+    body, headers = api.shed(e)
+    return Response(body, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
 
 
 class CreateAnnouncementView(APIView):
     def post(self, request):
-        text = request.data.get("text")
-        languages = request.data.get("languages", [])
-        tone = request.data.get("tone", "neutral")
-
-        print(f"CreateAnnouncementView received - text: {text[:100] if text else 'None'}, languages: {languages}")
+        logger.info(
+            "CreateAnnouncementView received - text: %.100s, languages: %s",
+            request.data.get("text"), request.data.get("languages", []),
+        )
+        try:
+            parsed = api.parse_announcement(request.data)
+        except api.InvalidRequest as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._handle(request, parsed)
 
-        if not text or not languages:
-            return Response(
-                {"error": "Text and languages are required."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    def _handle(self, request, parsed):
+        if parsed.queued:
+            return self._enqueue_announcement(request, parsed)
 
-        return self._process_announcement(request, text, languages, tone)
+        try:
+            admission.controller.check(parsed.priority)
+        except admission.Overloaded as e:
+            return overloaded(e)
+
+        if parsed.template:
+            return self._process_template(request, parsed)
+        return self._process_announcement(request, parsed)
+
+    def _enqueue_announcement(self, request, parsed, audio=None, audio_name=""):
+        """Async mode: store the announcement, queue it for the job workers
+        (or, if it's scheduled, for ``run_scheduler``) and return 202
+        straight away."""
+        announcement = Announcement.objects.create(**parsed.create_kwargs())
+        job = jobs.enqueue(announcement, audio=audio, audio_name=audio_name, params=parsed.job_params())
+        logger.info("Announcement %s queued as job %s", announcement.id, job.id)
+
+        data, status_url = api.queued(request, announcement, job)
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={"Location": status_url})
+
+    def _process_announcement(self, request, parsed, translations=None):
+        logger.info(
+            "Processing announcement: text=%.100r, languages=%s, tone=%s", parsed.text, parsed.languages, parsed.tone
+        )
 
-    def _process_announcement(self, request, text, languages, tone):
-        translations = {}
-        audio_files = {}
+        # Create announcement first to get ID
+        announcement = Announcement.objects.create(**parsed.create_kwargs())
 
-        print(f"Processing announcement: text='{text[:100]}...', languages={languages}, tone={tone}")
+        try:
+            AnnouncementPipeline(request.build_absolute_uri).process(announcement, translations=translations)
+            logger.info("Announcement completed successfully with ID: %s", announcement.id)
 
-        # Validate languages is a list
-        if not isinstance(languages, list):
+        except Exception as e:
+            # If something goes wrong, delete the partially created announcement
+            announcement.delete()
+            error_msg = f"Announcement processing failed: {str(e)}"
+            logger.error(error_msg)
             return Response(
-                {"error": "Languages must be a list."},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"error": error_msg},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        # Create announcement first to get ID
-        announcement = Announcement.objects.create(
-            text=text,
-            languages=languages,
-            translations={},
-            tone=tone,
-            audio_files={},
+        return Response(
+            AnnouncementSerializer(announcement).data,
+            status=status.HTTP_201_CREATED,
         )
 
+    def _process_template(self, request, parsed):
+        logger.info(
+            "Processing template announcement: text=%.100r, languages=%s, tone=%s",
+            parsed.text, parsed.languages, parsed.tone,
+        )
+
+        announcement = Announcement.objects.create(**parsed.create_kwargs())
+
         try:
-            for lang in languages:
-                # 1. Translate
-                try:
-                    print(f"Translating to {lang}...")
-                    translation = spitch.text.translate(
-                        text=text,
-                        source="en",
-                        target=lang
-                    )
-                    translated_text = translation.text
-                    translations[lang] = translated_text
-                    print(f"Translation for {lang} successful: {translated_text[:100]}...")
-                except Exception as e:
-                    error_msg = f"Translation failed for {lang}: {str(e)}"
-                    print(error_msg)
-                    continue
-
-                # 2. TTS (generate audio bytes)
-                try:
-                    voice_map = {
-                        "yo": "femi",
-                        "ig": "obinna",
-                        "ha": "aliyu",
-                        "en": "john",
-                    }
-                    voice = voice_map.get(lang, "john")
-                    print(f"Generating TTS for {lang} with voice {voice}...")
-
-                    resp = spitch.speech.generate(
-                        text=translated_text,
-                        language=lang,
-                        voice=voice
-                    )
-
-                    audio_bytes = resp.http_response.content
-                    print(f"TTS generated for {lang}, audio size: {len(audio_bytes)} bytes")
-
-                    # Generate unique filename for Cloudinary
-                    filename = f"announcement_{announcement.id}_{lang}_{uuid.uuid4().hex}.wav"
-                    
-                    # Save using Django's file storage (should upload to Cloudinary)
-                    content_file = ContentFile(audio_bytes)
-                    saved_path = default_storage.save(filename, content_file)
-                    
-                    # Get the FULL Cloudinary URL
-                    audio_url = default_storage.url(saved_path)
-                    
-                    # Ensure it's a full URL (not relative path)
-                    if not audio_url.startswith(('http://', 'https://')):
-                        # If it's a relative path, construct full URL
-                        from django.urls import reverse
-                        audio_url = request.build_absolute_uri(audio_url)
-                    
-                    audio_files[lang] = audio_url
-                    print(f"Audio uploaded to Cloudinary for {lang}: {audio_url}")
-
-                except Exception as e:
-                    error_msg = f"TTS failed for {lang}: {str(e)}"
-                    print(error_msg)
-                    # Continue with other languages
-
-            # Update the announcement with translations and audio files
-            announcement.translations = translations
-            announcement.audio_files = audio_files
-            announcement.save()
-
-            print(f"Announcement completed successfully with ID: {announcement.id}")
+            AnnouncementPipeline(request.build_absolute_uri).process_template(announcement, parsed.parts, parsed.slots)
+            logger.info("Template announcement completed successfully with ID: %s", announcement.id)
 
         except Exception as e:
-            # If something goes wrong, delete the partially created announcement
             announcement.delete()
             error_msg = f"Announcement processing failed: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
             return Response(
                 {"error": error_msg},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -141,132 +116,477 @@ class CreateAnnouncementView(APIView):
         )
 
 
-class TranscribeAnnouncementView(CreateAnnouncementView):
-    parser_classes = [MultiPartParser, FormParser]
-
-    def post(self, request):
-        audio_file = request.FILES.get("audio")
-        languages_str = request.data.get("languages", "[]")
-        tone = request.data.get("tone", "neutral")
+class BatchAnnouncementView(APIView):
+    """Create many announcements in one request.
 
-        print(f"TranscribeAnnouncementView received - audio_file: {audio_file}, languages_str: {languages_str}")
+    Takes ``{"items": [{"text", "languages", "tone"}, ...]}``. Identical
+    (text, language) work across the batch runs once under the pipeline's
+    concurrency limit. The response has one result per item, in order:
+    ``created``, ``partial`` (some languages failed) or ``invalid``, with
+    a 207 status when not every item fully succeeded.
+    """
 
-        if not audio_file:
+    def post(self, request):
+        items = request.data.get("items") if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
             return Response(
-                {"error": "Audio file is required."},
+                {"error": "items must be a non-empty list."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        # Parse languages from JSON string to list
+        if len(items) > settings.ANNOUNCEMENT_BATCH_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.ANNOUNCEMENT_BATCH_MAX_ITEMS} items per batch."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        priority = request_priority(request.data) if isinstance(request.data, dict) else Announcement.ROUTINE
         try:
-            languages = json.loads(languages_str)
-            if not isinstance(languages, list):
+            admission.controller.check(priority)
+        except admission.Overloaded as e:
+            return overloaded(e)
+
+        logger.info("BatchAnnouncementView received %d items", len(items))
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            error = self._validate(item)
+            if error:
+                results[index] = {"index": index, "status": "invalid", "error": error}
+            else:
+                valid.append(index)
+
+        announcements = []
+        if valid:
+            announcements = Announcement.objects.bulk_create([
+                Announcement(
+                    text=items[index]["text"],
+                    languages=items[index]["languages"],
+                    translations={},
+                    tone=items[index].get("tone", "neutral"),
+                    audio_files={},
+                    priority=priority,
+                    broadcast=flag(items[index], "broadcast"),
+                )
+                for index in valid
+            ])
+            try:
+                AnnouncementPipeline(request.build_absolute_uri).process_batch(announcements)
+            except Exception as e:
+                Announcement.objects.filter(id__in=[a.id for a in announcements]).delete()
+                error_msg = f"Batch processing failed: {str(e)}"
+                logger.error(error_msg)
                 return Response(
-                    {"error": "Languages must be a JSON array."},
-                    status=status.HTTP_400_BAD_REQUEST,
+                    {"error": error_msg},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
+
+        for index, announcement in zip(valid, announcements):
+            failed = [lang for lang in dict.fromkeys(announcement.languages) if lang not in announcement.audio_files]
+            results[index] = {
+                "index": index,
+                "status": "partial" if failed else "created",
+                "failed_languages": failed,
+                "announcement": AnnouncementSerializer(announcement).data,
+            }
+
+        all_created = all(result["status"] == "created" for result in results)
+        logger.info(
+            "Batch completed: %d/%d fully created",
+            sum(r["status"] == "created" for r in results), len(results),
+        )
+        return Response(
+            {"results": results},
+            status=status.HTTP_201_CREATED if all_created else status.HTTP_207_MULTI_STATUS,
+        )
+
+    def _validate(self, item):
+        if not isinstance(item, dict):
+            return "Each item must be an object."
+        text, languages = item.get("text"), item.get("languages")
+        if not text or not isinstance(text, str) or not languages:
+            return "Text and languages are required."
+        if not isinstance(languages, list) or not all(isinstance(lang, str) for lang in languages):
+            return "Languages must be a list."
+        if not isinstance(item.get("tone", "neutral"), str):
+            return "Tone must be a string."
+        return None
+
+
+class TranscribeAnnouncementView(CreateAnnouncementView):
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        if transcription.streaming_conversion_available():
+            # Convert the recording as it uploads instead of spooling it to
+            # disk; must happen before the body is parsed.
+            request.upload_handlers.insert(0, transcription.StreamingConversionUploadHandler(request._request))
+
+        # Parsing the body is where the upload is received (and, with the
+        # streaming handler, converted).
+        with metrics.timer("upload_receive"):
+            audio_file = request.FILES.get("audio")
+
+        logger.info(
+            "TranscribeAnnouncementView received - audio_file: %s, languages_str: %s",
+            audio_file, request.data.get("languages", "[]"),
+        )
+        try:
+            parsed = api.parse_transcription(request.data, audio_file)
+        except api.InvalidRequest as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if parsed.queued:
+            # The worker transcribes; keep the raw upload on the job until then.
+            audio = b"".join(audio_file.chunks())
+            return self._enqueue_announcement(request, parsed, audio=audio, audio_name=audio_file.name)
+
+        try:
+            admission.controller.check(parsed.priority)
+        except admission.Overloaded as e:
+            return overloaded(e)
+
+        # 1. Transcribe (long recordings are translated segment by segment
+        # along the way)
+        translations = {}
+        try:
+            logger.info(
+                "Transcribing audio file: %s, size: %s bytes, type: %s",
+                audio_file.name, audio_file.size, audio_file.content_type,
+            )
+            with admission.priority(parsed.priority):
+                parsed.text = transcription.transcribe_file(audio_file, parsed.languages, translations)
+
+        except admission.Overloaded as e:
+            return overloaded(e)
+        except Exception as e:
+            error_msg = f"Transcription failed: {str(e)}"
+            logger.error(error_msg)
             return Response(
-                {"error": "Invalid JSON format for languages."},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"error": error_msg},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        if not languages:
+        # 2. Reuse pipeline
+        return self._process_announcement(request, parsed, translations)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStreamMixin:
+    """Stream per-language results as Server-Sent Events instead of one
+    response at the end.
+
+    Emits ``created`` with the announcement id, then ``translated`` and
+    ``audio`` for each language as soon as that stage finishes (``failed``
+    if it doesn't), and finally ``complete`` with the full serialized
+    announcement once it has been saved.
+    """
+
+    def _process_announcement(self, request, parsed, translations=None):
+        return self._stream(request, parsed, lambda pipeline, announcement: (
+            pipeline.iter_process(announcement, translations=translations)
+        ))
+
+    def _process_template(self, request, parsed):
+        return self._stream(request, parsed, lambda pipeline, announcement: (
+            pipeline.iter_process_template(announcement, parsed.parts, parsed.slots)
+        ))
+
+    def _stream(self, request, parsed, run):
+        announcement = Announcement.objects.create(**parsed.create_kwargs())
+        pipeline = AnnouncementPipeline(request.build_absolute_uri)
+
+        def events():
+            yield sse_event("created", {"id": announcement.id, "text": parsed.text, "languages": parsed.languages})
+            try:
+                for lang, stage, data in run(pipeline, announcement):
+                    yield sse_event(stage, {"language": lang, **data})
+            except Exception as e:
+                announcement.delete()
+                error_msg = f"Announcement processing failed: {str(e)}"
+                logger.error(error_msg)
+                yield sse_event("error", {"error": error_msg})
+                return
+            logger.info("Streamed announcement completed with ID: %s", announcement.id)
+            yield sse_event("complete", AnnouncementSerializer(announcement).data)
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stop nginx and friends from buffering the stream.
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class StreamAnnouncementView(EventStreamMixin, CreateAnnouncementView):
+    pass
+
+
+class StreamTranscribeAnnouncementView(EventStreamMixin, TranscribeAnnouncementView):
+    pass
+
+
+class AnnouncementDetailView(APIView):
+    def get(self, request, pk):
+        announcement = get_object_or_404(Announcement, pk=pk)
+        return Response(AnnouncementSerializer(announcement).data)
+
+    def patch(self, request, pk):
+        """Edit ``text``, ``languages``, ``tone``, ``scheduled_for`` or
+        ``broadcast``.
+
+        Only the languages the edit made stale are regenerated, and audio it
+        superseded is deleted from storage in the background. An
+        announcement whose job hasn't run yet is just updated in place.
+        """
+        announcement = get_object_or_404(Announcement, pk=pk)
+        job = AnnouncementJob.objects.filter(announcement=announcement).first()
+        text = request.data.get("text", announcement.text)
+        languages = request.data.get("languages", announcement.languages)
+        tone = request.data.get("tone", announcement.tone)
+
+        # A queued transcription has no text until the worker runs.
+        transcribing = job is not None and job.state == AnnouncementJob.PENDING and job.audio is not None
+        if (not text and not transcribing) or not isinstance(languages, list) or not languages:
             return Response(
-                {"error": "At least one language is required."},
+                {"error": "Text and a non-empty list of languages are required."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        # 1. Transcribe
+        scheduled_for = announcement.scheduled_for
         try:
-            print(f"Transcribing audio file: {audio_file.name}, size: {audio_file.size} bytes, type: {audio_file.content_type}")
+            if "scheduled_for" in request.data:
+                scheduled_for = scheduled_time(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_webm:
-                for chunk in audio_file.chunks():
-                    temp_webm.write(chunk)
-                webm_path = temp_webm.name
+        if "broadcast" in request.data:
+            announcement.broadcast = flag(request.data, "broadcast")
 
-            # Convert WebM to WAV (supported by Spitch)
-            wav_path = self.convert_webm_to_wav(webm_path)
-            
-            try:
-                # Read the converted WAV file
-                with open(wav_path, "rb") as f:
-                    audio_content = f.read()
-                
-                print(f"Converted audio size: {len(audio_content)} bytes, format: WAV")
-
-                # Transcribe using Spitch
-                resp = spitch.speech.transcribe(
-                    content=audio_content,
-                    language="en"  # Source language for transcription
-                )
-                
-                text = resp.text
-                print(f"Transcription successful: {text}")
+        if job is not None and job.state == AnnouncementJob.PENDING:
+            return self._update_pending(request, announcement, job, text, languages, tone, scheduled_for)
+        if job is not None and job.state == AnnouncementJob.RUNNING:
+            return Response(
+                {"error": "Announcement is still being processed; retry once it has finished."},
+                status=status.HTTP_409_CONFLICT,
+            )
 
-            finally:
-                # Clean up temporary files
-                os.unlink(webm_path)
-                if os.path.exists(wav_path):
-                    os.unlink(wav_path)
+        try:
+            admission.controller.check(announcement.priority)
+        except admission.Overloaded as e:
+            return overloaded(e)
 
+        old_urls = {*announcement.audio_files.values(), announcement.broadcast_url} - {""}
+        announcement.scheduled_for = scheduled_for
+        try:
+            AnnouncementPipeline(request.build_absolute_uri).update(announcement, text, languages, tone)
         except Exception as e:
-            error_msg = f"Transcription failed: {str(e)}"
-            print(error_msg)
+            error_msg = f"Announcement update failed: {str(e)}"
+            logger.error(error_msg)
             return Response(
                 {"error": error_msg},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+        storage.release(old_urls - {*announcement.audio_files.values(), announcement.broadcast_url})
+        return Response(AnnouncementSerializer(announcement).data)
+
+    def _update_pending(self, request, announcement, job, text, languages, tone, scheduled_for):
+        """Nothing has been generated yet: change what the job will generate."""
+        changes = {"progress": {lang: jobs.PENDING for lang in dict.fromkeys(languages)}}
+        if text != announcement.text:
+            # The new text replaces the recording or template the job had.
+            changes.update(audio=None, audio_name="", params={})
+        # Conditional, so a worker claiming the job meanwhile wins.
+        if not AnnouncementJob.objects.filter(pk=job.pk, state=AnnouncementJob.PENDING).update(**changes):
+            return Response(
+                {"error": "Announcement is already being processed; retry once it has finished."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        announcement.text, announcement.languages, announcement.tone = text, languages, tone
+        announcement.scheduled_for = scheduled_for
+        announcement.save(update_fields=["text", "languages", "tone", "scheduled_for", "broadcast", "updated_at"])
 
-        # 2. Reuse pipeline
-        return self._process_announcement(request, text, languages, tone)
+        status_url = request.build_absolute_uri(reverse("announce-status", args=[announcement.id]))
+        return Response(
+            {"id": announcement.id, "state": job.state, "status_url": status_url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": status_url},
+        )
+
+
+class AnnouncementStatusView(APIView):
+    def get(self, request, pk):
+        announcement = get_object_or_404(Announcement, pk=pk)
+        job = AnnouncementJob.objects.filter(announcement=announcement).first()
+
+        if job is None:
+            # Created synchronously: it was complete before the response went out.
+            state = AnnouncementJob.DONE
+            progress = {
+                lang: "audio" if lang in announcement.audio_files else "failed"
+                for lang in dict.fromkeys(announcement.languages)
+            }
+            error = ""
+        else:
+            state, progress, error = job.state, job.progress, job.error
+
+        data = {"id": announcement.id, "state": state, "languages": progress, "error": error}
+        if announcement.scheduled_for:
+            data["scheduled_for"] = announcement.scheduled_for
+        if state == AnnouncementJob.DONE:
+            data["announcement"] = AnnouncementSerializer(announcement).data
+        return Response(data)
+
+
+def byte_range(header, size):
+    """``(start, end)`` of a single ``Range: bytes=`` range, or ``None`` to
+    send the whole file (no header, one we don't handle, or an invalid one,
+    which RFC 9110 says to ignore). Raises ``ValueError`` when the range is
+    valid but can't be satisfied."""
+    if not header or not header.startswith("bytes="):
+        return None
+    match = re.fullmatch(r"(\d*)-(\d*)", header[len("bytes="):].strip())
+    if match is None or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        return None  # e.g. bytes=5-3
+    if first:
+        start, end = int(first), int(last) + 1 if last else size
+    else:
+        start, end = max(0, size - int(last)), size
+    if start >= size or end <= start:
+        raise ValueError(f"Range not satisfiable for {size} bytes.")
+    return start, min(end, size)
+
+
+class AnnouncementAudioView(APIView):
+    """One language's audio, or ``broadcast`` for the combined track.
+
+    Served from the local audio cache (``core/audio_cache.py``), filled from
+    storage on a miss, with ``ETag`` revalidation and ``Range`` requests so
+    players can seek. Audio the cache doesn't know about is redirected to
+    its storage URL.
+    """
+
+    def get(self, request, pk, language):
+        announcement = get_object_or_404(Announcement.objects.only("audio_files", "broadcast_url"), pk=pk)
+        url = announcement.broadcast_url if language == "broadcast" else announcement.audio_files.get(language)
+        if not url:
+            raise Http404
+        name = StoredAudio.objects.filter(url=url).values_list("name", flat=True).first()
+        if name is None or not settings.AUDIO_CACHE_ENABLED:
+            return HttpResponseRedirect(url)
+
+        # A stored name is never reused, so it identifies the content; PATCH
+        # changes the name and with it the ETag.
+        etag = f'"{audio_cache.disk.filename(name)}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
 
-    def convert_webm_to_wav(self, webm_path):
-        """Convert WebM audio to WAV format using ffmpeg"""
-        wav_path = webm_path.replace('.webm', '.wav')
-        
         try:
-            # Use ffmpeg to convert WebM to WAV
-            cmd = [
-                'ffmpeg',
-                '-i', webm_path,
-                '-ac', '1',        # Mono channel
-                '-ar', '16000',    # 16kHz sample rate
-                '-acodec', 'pcm_s16le',  # 16-bit PCM
-                '-y',              # Overwrite output file
-                wav_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg conversion failed: {result.stderr}")
-            
-            print(f"Audio converted successfully: {webm_path} -> {wav_path}")
-            return wav_path
-            
+            audio_file = self.open_local(name)
+        except FileNotFoundError:
+            raise Http404
         except Exception as e:
-            print(f"FFmpeg conversion failed: {e}")
-            return self.fallback_audio_conversion(webm_path)
-
-    def fallback_audio_conversion(self, webm_path):
-        """Fallback conversion method without ffmpeg"""
-        print("Using fallback conversion - trying direct upload")
-        return webm_path
+            logger.warning("Could not cache audio %s locally, redirecting: %s", name, e)
+            return HttpResponseRedirect(url)
+        if audio_file is None:
+            return HttpResponseRedirect(url)
+
+        size = audio_file.end
+        response_range = None
+        if request.headers.get("If-Range", etag) == etag:
+            try:
+                response_range = byte_range(request.headers.get("Range"), size)
+            except ValueError as e:
+                audio_file.close()
+                response = HttpResponse(str(e), status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                                        content_type="text/plain")
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+        if response_range is not None:
+            start, end = response_range
+            audio_file.select(start, end)
+
+        extension = os.path.splitext(name)[1].lstrip(".").lower()
+        response = FileResponse(audio_file, content_type=MIME_TYPES.get(extension, "application/octet-stream"))
+        if response_range is not None:
+            response.status_code = status.HTTP_206_PARTIAL_CONTENT
+            response["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        response["Accept-Ranges"] = "bytes"
+        response["ETag"] = etag
+        # The URL's audio changes on PATCH: cache, but revalidate.
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    def open_local(self, name):
+        """The cached file as a ``MappedFile``, or ``None`` if it is too big
+        to cache. Raises ``FileNotFoundError`` if storage doesn't have it."""
+        for attempt in range(2):
+            path = audio_cache.disk.local(name)
+            if path is None:
+                return None
+            try:
+                return audio_cache.MappedFile(path)
+            except FileNotFoundError:
+                # Evicted between lookup and open: fetch it again.
+                if attempt:
+                    raise
 
 
 class AnnouncementHistoryView(APIView):
+    """Newest-first announcement history.
+
+    Query parameters: ``limit`` (default 20, max 100), ``cursor`` (from the
+    ``Link: rel="next"`` header of the previous page), ``fields`` (comma
+    separated, e.g. ``id,text,created_at`` to skip the JSON columns),
+    ``language`` (announcements with a result in that language) and
+    ``since``/``until`` (ISO dates or datetimes).
+
+    The body stays a plain list. Responses carry ETag and Last-Modified, and
+    a matching ``If-None-Match``/``If-Modified-Since`` gets a 304 before any
+    row is loaded or serialized.
+    """
+
     def get(self, request):
+        params = request.query_params
         try:
-            announcements = Announcement.objects.order_by("-created_at")[:20]
-            print(f"Retrieved {len(announcements)} announcements from history")
-            return Response(AnnouncementSerializer(announcements, many=True).data)
+            queryset, cursor, limit, fields = api.history_query(params)
+            rows, has_next = history.page_keys(queryset, cursor, limit)
+            deleted_at = history.last_deletion()
+        except history.HistoryQueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            etag, timestamp, not_modified = api.history_not_modified(request, rows, fields, params, deleted_at)
+            if not_modified is not None:
+                return not_modified
+
+            announcements = history.load(rows, fields)
+            logger.debug("Retrieved %d announcements from history", len(announcements))
+            response = Response(AnnouncementSerializer(announcements, many=True, fields=fields).data)
         except Exception as e:
             error_msg = f"Failed to retrieve history: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
             return Response(
                 {"error": error_msg},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
\ No newline at end of file
+            )
+
+        return api.history_headers(request, response, etag, timestamp, announcements if has_next else None)
+
+
+class MetricsView(APIView):
+    """Prometheus scrape endpoint. Requires ``Authorization: Bearer
+    <METRICS_TOKEN>`` when a token is configured."""
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            raise Http404
+        if settings.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+            return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,27 @@
+"""Gunicorn settings for serving the ASGI app on uvicorn workers.
+
+    gunicorn -c gunicorn_asgi.conf.py
+
+Each worker runs one event loop and, with ASYNC_VIEWS on, serves the
+announcement, transcription and history views as coroutines, so a single
+process keeps hundreds of announcements in flight while they wait on Spitch,
+storage and the database. Keep DATABASES' connection limit in mind: every
+in-flight request may hold a connection. The same workers serve the live
+interpretation WebSocket at /ws/interpret/ (core/live.py).
+
+Deliberately not named gunicorn.conf.py, which gunicorn would also pick up
+for the WSGI app.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "backend.asgi:application"
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# A slow announcement keeps its request open, not the worker; this only
+# catches a worker whose event loop has stopped responding.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+raw_env = [f"ASYNC_VIEWS={os.getenv('ASYNC_VIEWS', 'true')}"]